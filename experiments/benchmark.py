@@ -0,0 +1,159 @@
+# Benchmark suite for the JSE engine. Runs a fixed, seeded RandJS corpus and the
+# examples/ programs in plain, --writecache and --diff mode, repeating each run,
+# and compares paths/sec and peak RSS with a stored baseline.
+# Usage: python3 experiments/benchmark.py [--update-baseline] [--repeats=N]
+#        [--baseline=path] [--no-build]
+# Exits with status 1 if a benchmark regressed beyond the thresholds below.
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+
+from results_reader import count_results
+from worker_pool import JseWorker
+
+SEED = 1
+NUM_PROGRAMS = 20
+REPEATS = 5
+TIMEOUT = 120
+BENCH_DIR = "bench"
+BASELINE = "experiments/benchmark_baseline.json"
+RESULTS = "experiments/benchmark_results.json"
+# Allowed regression against the baseline, relative to the baseline's median.
+PATHS_PER_SEC_THRESHOLD = 0.10
+PEAK_RSS_THRESHOLD = 0.20
+
+
+def prepare_corpus():
+    corpus = os.path.join(BENCH_DIR, "randjs")
+    subprocess.run(["node", "build/randJS.js", "--count={}".format(NUM_PROGRAMS), "--seed={}".format(SEED), "--outDir=" + corpus], check=True, stdout=subprocess.DEVNULL)
+    for i in range(1, NUM_PROGRAMS + 1):
+        base = os.path.join(corpus, str(i))
+        subprocess.run(["node", "build/createDiffAST.js", "--a={}.jse.js".format(base), "--b={}.jse.diff.js".format(base), "--resultFilePath={}.diff".format(base)], check=True, stdout=subprocess.DEVNULL)
+    return corpus
+
+
+def benchmarks(corpus):
+    # (name, request) pairs, in the order they must run: a --diff benchmark reads
+    # the cache written by the --writecache benchmark of the same program.
+    programs = [("randjs/{}".format(i), os.path.join(corpus, "{}.jse.js".format(i)), os.path.join(corpus, "{}.diff".format(i))) for i in range(1, NUM_PROGRAMS + 1)]
+    programs.append(("nestedConditionals", "examples/nestedConditionals.js", None))
+    programs.append(("diff1", "examples/diff1/a.js", "examples/diff1/a-b.diff"))
+    programs.append(("diff2", "examples/diff2/a.js", "examples/diff2/a-b.diff"))
+    for name, file, diff in programs:
+        out = os.path.join(BENCH_DIR, "results", name.replace("/", "_"))
+        yield name + ":plain", {"file": file, "outDir": out + "-plain"}
+        yield name + ":writecache", {"file": file, "writeCache": True, "outDir": out + "-cache"}
+        if diff:
+            yield name + ":diff", {"cache": out + "-cache/cache", "diffFile": diff, "outDir": out + "-diff"}
+
+
+def percentile(values, p):
+    # Nearest-rank percentile.
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def peak_rss_kb(pid):
+    # High-water mark of the process's resident set, from /proc (Linux only).
+    try:
+        with open("/proc/{}/status".format(pid), "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_benchmark(name, request, repeats):
+    # Each benchmark gets a fresh worker, so its peak RSS is its own and the
+    # measured time is analysis time, without Node and Z3 start-up.
+    worker = JseWorker()
+    times, paths, error = [], None, None
+    try:
+        for _ in range(repeats):
+            result = worker.run(request, TIMEOUT)
+            if result is None or result["status"] != "ok":
+                error = "timed out" if result is None else result["error"]
+                break
+            times.append(result["time"])
+            paths = count_results(result["writeDir"])
+        rss = peak_rss_kb(worker.proc.pid)
+    finally:
+        worker.close()
+    record = {"name": name, "repeats": len(times), "paths": paths, "peak_rss_kb": rss}
+    if error:
+        record["error"] = error
+        return record
+    record.update({
+        "time_median": percentile(times, 50),
+        "time_p10": percentile(times, 10),
+        "time_p90": percentile(times, 90),
+        "paths_per_sec_median": paths / max(percentile(times, 50), 1e-9),
+    })
+    return record
+
+
+def compare(results, baseline):
+    # Regressions of results against baseline, as printable strings.
+    regressions = []
+    previous = {record["name"]: record for record in baseline}
+    for record in results:
+        base = previous.get(record["name"])
+        if not base or "error" in base:
+            continue
+        if "error" in record:
+            regressions.append("{}: {}".format(record["name"], record["error"]))
+            continue
+        if record["paths"] != base["paths"]:
+            print("{}: {} paths, baseline had {}".format(record["name"], record["paths"], base["paths"]))
+        if record["paths_per_sec_median"] < base["paths_per_sec_median"] * (1 - PATHS_PER_SEC_THRESHOLD):
+            regressions.append("{}: {:.1f} paths/sec, baseline {:.1f}".format(record["name"], record["paths_per_sec_median"], base["paths_per_sec_median"]))
+        if record["peak_rss_kb"] and base["peak_rss_kb"] and record["peak_rss_kb"] > base["peak_rss_kb"] * (1 + PEAK_RSS_THRESHOLD):
+            regressions.append("{}: peak RSS {} kB, baseline {} kB".format(record["name"], record["peak_rss_kb"], base["peak_rss_kb"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--no-build", action="store_true")
+    args = parser.parse_args()
+
+    if not args.no_build:
+        subprocess.run(["npx", "tsc"], check=True)
+    corpus = prepare_corpus()
+    results = []
+    for name, request in benchmarks(corpus):
+        record = run_benchmark(name, request, args.repeats)
+        results.append(record)
+        if "error" in record:
+            print("{:32} {}".format(name, record["error"]))
+        else:
+            print("{:32} {:8} paths {:10.1f} paths/sec  median {:.3f}s  p90 {:.3f}s  peak RSS {} kB".format(name, record["paths"], record["paths_per_sec_median"], record["time_median"], record["time_p90"], record["peak_rss_kb"]))
+    with open(RESULTS, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("baseline written to " + args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline at {}, run with --update-baseline to create one".format(args.baseline))
+        return 0
+    with open(args.baseline, "r") as f:
+        regressions = compare(results, json.load(f))
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# Reader for the branch cache written by `--writecache` (results/JSE<id>/cache).
+# Usage: python3 experiments/cache_reader.py results/JSE1/cache [more caches...]
+
+import json
+import os
+import sys
+
+CACHE_FORMAT = "jse-cache"
+CACHE_VERSION = 4
+
+
+def read_cache(path):
+    # Returns the cache as {"nodes": {id: test}, "constraints": {id: constraint},
+    # "states": [state, ...], "replaced": {state id: replace record id}} plus
+    # the number of bytes taken by each record kind.
+    cache = {"nodes": {}, "constraints": {}, "states": [], "replaced": {}, "bytes": {"node": 0, "constraint": 0, "state": 0, "replace": 0}}
+    with open(path, "r") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != CACHE_FORMAT or header.get("version") != CACHE_VERSION:
+            raise ValueError("{} is not a version {} JSE cache".format(path, CACHE_VERSION))
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            cache["bytes"][record["kind"]] += len(line)
+            if record["kind"] == "node":
+                cache["nodes"][record["id"]] = record["test"]
+            elif record["kind"] == "constraint":
+                cache["constraints"][record["id"]] = record
+            elif record["kind"] == "replace":
+                cache["replaced"][record["state"]] = record["id"]
+            else:
+                cache["states"].append(record)
+    return cache
+
+
+def resolve(cache, state):
+    # Full constraint (ids) and symbolic (names) stores of a state.
+    states = {s["id"]: s for s in cache["states"]}
+    lineage = []
+    while state is not None:
+        lineage.append(state)
+        state = states.get(state["parent"])
+    cstore, sstore = {}, []
+    for s in reversed(lineage):
+        for i in s["del"]:
+            cstore.pop(i, None)
+        for i in s["add"]:
+            cstore[i] = True
+        sstore += s["vars"]
+    return list(cstore), sstore
+
+
+def stale_states(cache):
+    # Ids of the states a patch replaced: children a state had before its last
+    # replace record, and everything below them.
+    stale = set()
+    for state in cache["states"]:
+        parent = state["parent"]
+        if parent in stale or cache["replaced"].get(parent, -1) > state["id"]:
+            stale.add(state["id"])
+    return stale
+
+
+def cache_stats(path):
+    cache = read_cache(path)
+    depths = {}
+    for state in cache["states"]:
+        depths[state["id"]] = 0 if state["parent"] is None else depths[state["parent"]] + 1
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "nodes": len(cache["nodes"]),
+        "constraints": len(cache["constraints"]),
+        "states": len(cache["states"]),
+        "stale_states": len(stale_states(cache)),
+        "max_depth": max(depths.values(), default=0),
+        "total_path_length": sum(depths.values()),
+        "node_bytes": cache["bytes"]["node"],
+        "constraint_bytes": cache["bytes"]["constraint"],
+        "state_bytes": cache["bytes"]["state"],
+        "replace_bytes": cache["bytes"]["replace"],
+    }
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(json.dumps(cache_stats(path)))
@@ -0,0 +1,136 @@
+# Cost model for scheduling experiment sweeps. Fits the run time of a program
+# to its RandJS stats (<id>.stats.json) from the run records of past sweeps, so
+# run_jobs can start the jobs predicted to take longest first (longest
+# processing time first, which keeps one large program from running alone at
+# the end of a sweep) and give each job a timeout that grows with its predicted
+# cost instead of a flat one.
+# Usage: python3 experiments/cost_model.py <programs dir> <records> [more records...]
+#        (fit a model and print it)
+
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from runner import TIMEOUT_RETURN_CODE, load_results
+
+# Stats the log of the run time is fitted to. The number of paths, and so the
+# run time, grows exponentially with the conditionals on them. NUM_BRANCHES is
+# left out: RandJS always writes it as twice NUM_CONDITIONALS.
+FEATURES = ("NUM_CONDITIONALS", "AVE_AST_DEPTH", "AVE_CONDITIONALS_PER_BRANCH", "NUM_SYMBOLIC_VARS")
+# Records needed before the model is used.
+MIN_RECORDS = 4 * (len(FEATURES) + 1)
+# A job's timeout is its predicted time this many standard deviations (of the
+# log time) above the fit, but never shorter than the sweep's flat timeout and
+# at most MAX_TIMEOUT_FACTOR times it.
+TIMEOUT_SIGMAS = 3
+MAX_TIMEOUT_FACTOR = 20
+
+
+class CostModel:
+    def __init__(self, programs_dir, records_paths):
+        self.programs_dir = programs_dir
+        self.stats = {}
+        self.coefficients = None
+        self.sigma = None
+        self.records = 0
+        self.fit(records_paths)
+
+    def program_stats(self, id):
+        if id not in self.stats:
+            path = os.path.join(self.programs_dir, "{}.stats.json".format(id))
+            self.stats[id] = None
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    self.stats[id] = json.loads(f.readline())
+        return self.stats[id]
+
+    def features(self, id):
+        stats = self.program_stats(id)
+        if stats is None:
+            return None
+        return [1.0] + [float(stats.get(feature, 0)) for feature in FEATURES]
+
+    def fit(self, records_paths):
+        # Least squares fit of log(time). A run that timed out only says the
+        # program takes at least its timeout, and is fitted at that time, so the
+        # model errs towards shorter times for the largest programs. Budgeted
+        # runs take their budget and failed runs say nothing about the cost.
+        rows, times = [], []
+        for path in records_paths:
+            for record in load_results(path):
+                if record.get("budget") is not None or "time" not in record:
+                    continue
+                if record.get("return_code") not in (0, TIMEOUT_RETURN_CODE):
+                    continue
+                row = self.features(record["id"])
+                if row is None:
+                    continue
+                rows.append(row)
+                times.append(math.log(max(record["time"], 1e-3)))
+        self.records = len(rows)
+        if self.records < MIN_RECORDS:
+            return
+        x, y = np.array(rows), np.array(times)
+        self.coefficients = np.linalg.lstsq(x, y, rcond=None)[0]
+        residuals = y - x @ self.coefficients
+        # A feature that is constant or a combination of others in these
+        # programs adds no parameter, so the degrees of freedom left for the
+        # residuals follow the rank of the design rather than its width.
+        dof = max(1, self.records - np.linalg.matrix_rank(x))
+        self.sigma = float(np.sqrt(np.sum(residuals ** 2) / dof))
+
+    def predict(self, id):
+        # Predicted run time in seconds, or None without a fit or stats.
+        row = self.features(id)
+        if self.coefficients is None or row is None:
+            return None
+        return math.exp(float(np.dot(row, self.coefficients)))
+
+    def timeout(self, id, default):
+        predicted = self.predict(id)
+        if predicted is None or default is None:
+            return default
+        timeout = predicted * math.exp(TIMEOUT_SIGMAS * self.sigma)
+        return min(max(timeout, default), default * MAX_TIMEOUT_FACTOR)
+
+    def priority(self, id):
+        # Without a fit, jobs are ordered by the number of conditionals.
+        predicted = self.predict(id)
+        if predicted is not None:
+            return predicted
+        stats = self.program_stats(id)
+        return None if stats is None else stats.get("NUM_CONDITIONALS", 0)
+
+    def schedule(self, jobs):
+        # Jobs in the order to run them, most expensive first, with their
+        # timeouts set from the model. Jobs of programs without stats could be
+        # as long as any, so they go first, in their original order.
+        scheduled = []
+        for job in jobs:
+            job = dict(job)
+            predicted = self.predict(job["id"])
+            if predicted is not None:
+                job["predicted_time"] = predicted
+            if "timeout" in job:
+                job["timeout"] = self.timeout(job["id"], job["timeout"])
+            scheduled.append((self.priority(job["id"]), job))
+        unknown = [job for priority, job in scheduled if priority is None]
+        known = [(priority, job) for priority, job in scheduled if priority is not None]
+        known.sort(key=lambda item: -item[0])
+        return unknown + [job for _, job in known]
+
+    def describe(self):
+        if self.coefficients is None:
+            return "{} records, fewer than the {} needed for a fit".format(self.records, MIN_RECORDS)
+        terms = " ".join("{:+.3g}*{}".format(c, f) for c, f in zip(self.coefficients[1:], FEATURES))
+        return "{} records: log(time) = {:.3g} {} (sigma {:.3g})".format(self.records, self.coefficients[0], terms, self.sigma)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: python3 experiments/cost_model.py <programs dir> <records> [more records...]")
+        sys.exit(1)
+    print(CostModel(sys.argv[1], sys.argv[2:]).describe())
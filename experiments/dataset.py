@@ -0,0 +1,204 @@
+# Id-indexed, columnar dataset of an experiment, shared by the plotting scripts.
+# One ingestion step joins the run records, the RandJS stats of every program,
+# Jazzer coverage and cache sizes into one row per program id, stored as NumPy
+# arrays in experiments/datasets/<name>.npz. The manifest next to it records how
+# far each source has been read, so a refresh only reads what was appended since
+# (new records, new ids) instead of re-reading everything.
+# Usage: python3 experiments/dataset.py [exp1 exp2 ...]  (refresh and summarise)
+
+import json
+import os
+import sys
+
+import numpy as np
+
+DATASET_DIR = "experiments/datasets"
+
+# Sources of each dataset:
+#   runs:     (prefix, path) JSONL run records; numeric fields become
+#             <prefix>_<field>, or <prefix>_<budget>_<field> for budgeted jobs
+#   coverage: (column, path) files with one coverage value per line, line i
+#             belonging to id i+1, written by sweeps from before Jazzer runs
+#             had records of their own; run records of the same column win
+#   programs: directory holding <id>.stats.json and <id>.jse.js
+#   caches:   path of the cache written by the base run of an id
+# Every source of a dataset is named for its experiment (e.g. randjs-exp1 and
+# experiments/*_exp1 for exp1), as the experiment scripts write them.
+DATASETS = {
+    "exp1": {
+        "runs": [
+            ("jse", "experiments/jse_results_exp1"),
+            ("jazzer", "experiments/jazzer_campaigns_exp1"),
+            ("hybrid", "experiments/hybrid_campaigns_exp1"),
+        ],
+        "coverage": [
+            ("jazzer_0.1_coverage", "experiments/jazzer_cov_0.1_exp1"),
+            ("jazzer_0.5_coverage", "experiments/jazzer_cov_0.5_exp1"),
+            ("jazzer_1_coverage", "experiments/jazzer_cov_1_exp1"),
+        ],
+        "programs": "randjs-exp1",
+    },
+    "exp2": {
+        "runs": [
+            ("base", "experiments/jse_base"),
+            ("diff", "experiments/jse_diff_analysis"),
+        ],
+        "coverage": [],
+        "programs": "randjs",
+        "caches": "results/JSE{}/cache",
+    },
+}
+
+
+class Dataset:
+    def __init__(self, name):
+        self.name = name
+        self.spec = DATASETS[name]
+        self.data_path = os.path.join(DATASET_DIR, name + ".npz")
+        self.manifest_path = os.path.join(DATASET_DIR, name + ".json")
+        self.columns = {"id": []}
+        self.rows = {}
+        self.manifest = {"offsets": {}}
+        self.touched = set()
+
+    def open(self):
+        if not (os.path.exists(self.data_path) and os.path.exists(self.manifest_path)):
+            return
+        with open(self.manifest_path, "r") as f:
+            self.manifest = json.load(f)
+        with np.load(self.data_path) as data:
+            self.columns = {name: data[name].tolist() for name in data.files}
+        self.rows = {int(id): row for row, id in enumerate(self.columns["id"])}
+
+    def row(self, id):
+        # Row of id, added (with every column missing) if the id is new.
+        id = int(id)
+        if id not in self.rows:
+            self.rows[id] = len(self.columns["id"])
+            for values in self.columns.values():
+                values.append(np.nan)
+            self.columns["id"][-1] = id
+        self.touched.add(id)
+        return self.rows[id]
+
+    def set(self, id, column, value):
+        row = self.row(id)
+        if column not in self.columns:
+            self.columns[column] = [np.nan] * len(self.columns["id"])
+        self.columns[column][row] = float(value)
+
+    def new_lines(self, path):
+        # Complete lines appended to path since the last refresh, with the
+        # number of lines read before them.
+        offsets = self.manifest["offsets"]
+        start, count = offsets.get(path, [0, 0])
+        if os.path.getsize(path) < start:
+            raise RuntimeError("{} was truncated, rebuild the dataset".format(path))
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        offsets[path] = [start + end, count + len(lines)]
+        return count, lines
+
+    def ingest_runs(self, prefix, path):
+        _, lines = self.new_lines(path)
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            column_prefix = prefix if record.get("budget") is None else "{}_{}".format(prefix, record["budget"])
+            for field, value in record.items():
+                if field in ("id", "budget") or not isinstance(value, (int, float)):
+                    continue
+                self.set(record["id"], "{}_{}".format(column_prefix, field), value)
+
+    def ingest_coverage(self, column, path):
+        count, lines = self.new_lines(path)
+        for i, line in enumerate(lines):
+            if line.strip():
+                self.set(count + i + 1, column, int(line))
+
+    def ingest_programs(self, directory):
+        # Stats never change once written, so they are only read for ids that
+        # do not have them yet. Program sizes are read along with them.
+        have_stats = self.columns.get("has_stats")
+        for id, row in list(self.rows.items()):
+            if have_stats is not None and have_stats[row] == 1:
+                continue
+            path = os.path.join(directory, "{}.stats.json".format(id))
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                stat = json.loads(f.readline())
+            for field, value in stat.items():
+                if isinstance(value, (int, float)):
+                    self.set(id, field, value)
+            program = os.path.join(directory, "{}.jse.js".format(id))
+            if os.path.exists(program):
+                with open(program, "r") as f:
+                    self.set(id, "lines", sum(1 for _ in f))
+            self.set(id, "has_stats", 1)
+            have_stats = self.columns["has_stats"]
+
+    def ingest_caches(self, pattern):
+        # A cache is rewritten when its base run is, so sizes are re-read for
+        # the ids with new records.
+        for id in self.touched:
+            path = pattern.format(id)
+            if os.path.exists(path):
+                self.set(id, "cache_size", os.path.getsize(path))
+
+    def refresh(self):
+        self.open()
+        for column, path in self.spec["coverage"]:
+            if os.path.exists(path):
+                self.ingest_coverage(column, path)
+        for prefix, path in self.spec["runs"]:
+            if os.path.exists(path):
+                self.ingest_runs(prefix, path)
+        if self.spec.get("programs"):
+            self.ingest_programs(self.spec["programs"])
+        if self.spec.get("caches"):
+            self.ingest_caches(self.spec["caches"])
+        self.save()
+
+    def save(self):
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        # Written to temporary files first so an interrupted save leaves the
+        # previous dataset intact.
+        np.savez(self.data_path + ".tmp.npz", **{name: np.array(values, dtype=float) for name, values in self.columns.items()})
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(self.data_path + ".tmp.npz", self.data_path)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def frame(self):
+        import pandas as pd
+
+        df = pd.DataFrame({name: np.array(values, dtype=float) for name, values in self.columns.items()})
+        df["id"] = df["id"].astype(int)
+        return df.set_index("id").sort_index()
+
+
+def load(name):
+    # Refresh the dataset with whatever was appended to its sources, and return
+    # it as a DataFrame indexed by program id. Missing values are NaN.
+    dataset = Dataset(name)
+    try:
+        dataset.refresh()
+    except RuntimeError:
+        for path in (dataset.data_path, dataset.manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+        dataset = Dataset(name)
+        dataset.refresh()
+    return dataset.frame()
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or DATASETS:
+        df = load(name)
+        print("{}: {} ids, columns: {}".format(name, len(df), ", ".join(df.columns)))
@@ -2,36 +2,141 @@
 ### Experiment 1 - JSE Performance Comparison with Dynamic Fuzz Testing - Jazzer ###
 ####################################################################################
 
-import os
-import time
 import json
+import os
+import shutil
+
+from cost_model import CostModel
+from jazzer_runner import available_cpus, campaign_runner, jazzer_cmd
+from jazzer_seeds import write_seed_corpus
+from results_reader import RESULTS_FILE
+from runner import build_engine, inputs_hash, run_jobs
+from worker_pool import JseWorkerPool
 
 NUM_FILES = 1000
 JAZZER_TIMES = [0.1, 0.5, 1]
+WORKERS = os.cpu_count()
+JSE_TIMEOUT = 5
+
+# Everything experiment 1 reads and writes is named for it, the names
+# dataset.py reads the exp1 dataset from, so its sweeps never mix with
+# experiment 2's, which runs on randjs/ and writes results/.
+PROGRAMS = "randjs-exp1"
+RESULTS = "results-exp1"
+JSE_RECORDS = "experiments/jse_results_exp1"
+JAZZER_RECORDS = "experiments/jazzer_campaigns_exp1"
+HYBRID_RECORDS = "experiments/hybrid_campaigns_exp1"
+
+# Build the engine once for the whole sweep and run node build/*.js directly.
+# JSE jobs record the hash of the build and of their program as "inputs", so
+# re-running the sweep only re-runs the jobs whose engine or program changed.
+engine = build_engine()
 
 # Create JS files with RandJS, noting down the parameters used.
 # ranjsOutDir = "randJSOut"
-# if not os.path.exists("../"+ranjsOutDir): 
+# if not os.path.exists("../"+ranjsOutDir):
 #     os.makedirs("../"+ranjsOutDir)
-# for i in range(NUM_FILES):
-#     os.system('npm run randJS -- --writeToFile="{}"'.format(i+1))
+# os.system('node build/randJS.js --count={} --seed=1 --outDir={}'.format(NUM_FILES, PROGRAMS))
 
 # Run JSE on the JS files, timing the executution. (coverage will always be 100% at the moment)
-jse_results = []
+# Results are appended to JSE_RECORDS as each job finishes; ids that
+# already have a result for the same inputs are skipped when the experiment is
+# restarted. Jobs run on a pool of long-lived workers, so, as in experiment 2,
+# the recorded analysis_time excludes Node and Z3 start-up.
+pool = JseWorkerPool(WORKERS)
+jse_jobs = []
 for i in range(NUM_FILES):
-    start = time.time()
-    code = os.system('gtimeout 5s node --max-old-space-size=34359 build/driver.js --file="randjs/{}.jse.js"'.format(i+1))
-    end = time.time()
-    print("elapsed time: {}".format(end-start))
-    jse_results.append(json.dumps({"id": i+1, "time": end-start, "return_code": code}))
-
-# output results to a file
-with open("experiments/jse_results", "w") as f:
-    for line in jse_results:
-        f.write(line + "\n")
-
-# Run Jazzer on the JS files, varying the execution time and measuring coverage.
-os.system("rm experiments/jazzer_cov")
+    jse_jobs.append({
+        "id": i+1,
+        "inputs": inputs_hash(engine, "{}/{}.jse.js".format(PROGRAMS, i+1)),
+        "cmd": ["node", "--max-old-space-size=34359", "build/driver.js", "--file={}/{}.jse.js".format(PROGRAMS, i+1), "--outDir={}/JSE{}".format(RESULTS, i+1)],
+        "request": {"id": i+1, "file": "{}/{}.jse.js".format(PROGRAMS, i+1), "outDir": "{}/JSE{}".format(RESULTS, i+1)},
+        "timeout": JSE_TIMEOUT,
+    })
+run_jobs(jse_jobs, JSE_RECORDS, workers=WORKERS, run=pool.run, cost_model=CostModel(PROGRAMS, [JSE_RECORDS]))
+pool.close()
+
+
+# Run JSE again with each of Jazzer's time budgets, exploring uncovered branches
+# first, so both tools are compared on what they reach in the same time.
+# "coverage" is the most branches entered on one path, which is what Jazzer's
+# "branch: N" output counts.
+def jse_coverage_parser(out_dir):
+    def parse(out):
+        path = os.path.join(out_dir, "coverage.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            coverage = json.load(f)
+        return {"coverage": coverage["maxBranches"], "branches_covered": coverage["covered"], "branches_total": coverage["total"], "complete": coverage["complete"]}
+    return parse
+
+
+jse_budget_jobs = []
 for i in range(NUM_FILES):
     for t in JAZZER_TIMES:
-        os.system('npx jazzer randjs/{}.jazzer.js -- -max_total_time=1 -print_final_stats=1 | grep "branch: "| awk -F ": " \'{{print $2}}\' | sort -n | tail -n 1 >> experiments/jazzer_cov_{}'.format(i+1, t))
+        out_dir = "{}/JSE{}-{}".format(RESULTS, i+1, t)
+        jse_budget_jobs.append({
+            "id": i+1,
+            "budget": t,
+            "inputs": inputs_hash(engine, "{}/{}.jse.js".format(PROGRAMS, i+1)),
+            "cmd": ["node", "--max-old-space-size=34359", "build/driver.js", "--file={}/{}.jse.js".format(PROGRAMS, i+1), "--outDir=" + out_dir, "--search=coverage", "--timeBudget={}".format(t)],
+            "timeout": JSE_TIMEOUT,
+            "parse": jse_coverage_parser(out_dir),
+        })
+run_jobs(jse_budget_jobs, JSE_RECORDS, workers=WORKERS)
+
+
+# Run Jazzer on the JS files, varying the time budget and measuring coverage.
+# Campaigns run concurrently, one per CPU, each pinned to its CPU (see
+# jazzer_runner.py), and record libFuzzer's stats and coverage over time.
+JAZZER_WORKERS = len(available_cpus())
+
+jazzer_jobs = []
+for i in range(NUM_FILES):
+    for t in JAZZER_TIMES:
+        jazzer_jobs.append({
+            "id": i+1,
+            "budget": t,
+            "inputs": inputs_hash(None, "{}/{}.jazzer.js".format(PROGRAMS, i+1)),
+            "cmd": jazzer_cmd("{}/{}.jazzer.js".format(PROGRAMS, i+1), t),
+        })
+run_jobs(jazzer_jobs, JAZZER_RECORDS, workers=JAZZER_WORKERS, run=campaign_runner())
+
+
+# Hybrid: Jazzer started from a seed corpus of the inputs JSE solved for every
+# path it reached (RESULTS/corpus/<id>), to compare how fast the combined coverage
+# saturates with either tool alone. Each run writes what it finds to its own
+# directory, so the seed corpus stays the same for every budget.
+# Hybrid jobs' inputs are the harness and JSE's results. When they change, the
+# seed corpus is rebuilt and what earlier runs found is dropped; the inputs the
+# corpus was built from are kept next to it (outside it, as libFuzzer reads
+# every file in a corpus).
+hybrid_jobs = []
+for i in range(NUM_FILES):
+    harness = "{}/{}.jazzer.js".format(PROGRAMS, i+1)
+    jse_dir = "{}/JSE{}".format(RESULTS, i+1)
+    inputs = inputs_hash(None, harness, os.path.join(jse_dir, RESULTS_FILE))
+    seeds = "{}/corpus/{}".format(RESULTS, i+1)
+    found = ["{}/hybrid{}-{}".format(RESULTS, i+1, t) for t in JAZZER_TIMES]
+    built_from = seeds + ".inputs"
+    built = None
+    if os.path.exists(built_from):
+        with open(built_from, "r") as f:
+            built = f.read()
+    if built != inputs:
+        for directory in [seeds] + found:
+            shutil.rmtree(directory, ignore_errors=True)
+        write_seed_corpus(jse_dir, harness, seeds)
+        with open(built_from, "w") as f:
+            f.write(inputs)
+    for t, found_dir in zip(JAZZER_TIMES, found):
+        os.makedirs(found_dir, exist_ok=True)
+        hybrid_jobs.append({
+            "id": i+1,
+            "budget": t,
+            "inputs": inputs,
+            "seeds": len(os.listdir(seeds)),
+            "cmd": jazzer_cmd(harness, t, corpus=(found_dir, seeds)),
+        })
+run_jobs(hybrid_jobs, HYBRID_RECORDS, workers=JAZZER_WORKERS, run=campaign_runner())
@@ -3,43 +3,75 @@
 ##############################################################################
 
 import os
-import time
-import json
+
+from cost_model import CostModel
+from runner import build_engine, inputs_hash, run_command, run_jobs
+from worker_pool import JseWorkerPool
 
 NUM_FILES = 500
+# Seed of the RandJS corpus; the same seed regenerates the same programs.
+SEED = 1
+WORKERS = os.cpu_count()
+JSE_TIMEOUT = 10
+# Run JSE through a pool of long-lived workers, so the recorded analysis_time
+# excludes Node and Z3 start-up.
+USE_WORKERS = True
+# Share solver verdicts between the base and targeted analysis of a program.
+SOLVER_CACHE = "results/solver-cache/{}.ndjson"
 
-# Create JS files with RandJS, noting down the parameters used.
-for i in range(NUM_FILES):
-    os.system('npm run randJS -- --writeToFile="{}"'.format(i+1))
+# Build the engine once for the whole sweep; every step below runs node
+# build/*.js directly. Each job records the hash of the build and of its input
+# files as "inputs", so re-running the sweep only re-runs the jobs whose
+# engine or inputs changed. Solver caches are left out: they only hold
+# verdicts the engine would find anyway.
+engine = build_engine()
+
+# Create JS files with RandJS, noting down the parameters used. All programs are
+# generated by one process, the same programs again for the same seed.
+os.system('node build/randJS.js --count={} --seed={}'.format(NUM_FILES, SEED))
 
 #########################################################################
 ##### Run JSE on base files in preparation, to make the diff files. #####
 #########################################################################
-jse_results = []
+# Each base run writes its cache to results/JSE<id>/cache, which the targeted
+# analysis below reads back.
+pool = JseWorkerPool(WORKERS) if USE_WORKERS else None
+jse_jobs = []
 for i in range(NUM_FILES):
-    start = time.time()
-    code = os.system('gtimeout 10s node --max-old-space-size=34359 build/driver.js --file="randjs/{}.jse.js" --writecache'.format(i+1))
-    end = time.time()
-    print("base: elapsed time: {}".format(end-start))
-    jse_results.append(json.dumps({"id": i+1, "time": end-start, "return_code": code}))
-
-# output results to a file
-with open("experiments/jse_base", "w") as f:
-    for line in jse_results:
-        f.write(line + "\n")
+    jse_jobs.append({
+        "id": i+1,
+        "inputs": inputs_hash(engine, "randjs/{}.jse.js".format(i+1)),
+        "cmd": ["node", "--max-old-space-size=34359", "build/driver.js", "--file=randjs/{}.jse.js".format(i+1), "--writecache", "--outDir=results/JSE{}".format(i+1), "--solverCache=" + SOLVER_CACHE.format(i+1)],
+        "request": {"id": i+1, "file": "randjs/{}.jse.js".format(i+1), "writeCache": True, "outDir": "results/JSE{}".format(i+1), "solverCache": SOLVER_CACHE.format(i+1)},
+        "timeout": JSE_TIMEOUT,
+    })
+run_jobs(jse_jobs, "experiments/jse_base", workers=WORKERS, run=pool.run if pool else run_command, cost_model=CostModel("randjs", ["experiments/jse_base"]))
 
 ###############################################
 ##### Run targeted analysis on the diffs. #####
 ###############################################
-jse_results = []
+# The diff is made just before the targeted run that reads it.
+def run_targeted(job):
+    diff = run_command({"cmd": job["diff_cmd"], "timeout": job["timeout"]})
+    if diff["return_code"] != 0:
+        return diff
+    return pool.run(job)
+
+
+# A targeted run depends on both versions of the program and on the cache its
+# base run wrote.
+jse_jobs = []
 for i in range(NUM_FILES):
-    start = time.time()
-    code = os.system('gtimeout 10s npm run diff -- --a="randjs/{}.jse.js" --b="randjs/{}.jse.diff.js" --resultFilePath="randjs/{}.diff" && npm run jse -- --diff --cache="results/JSE{}/cache" --diffFile="randjs/{}.diff"'.format(i+1, i+1, i+1, i+1, i+1))
-    end = time.time()
-    print("base: elapsed time: {}".format(end-start))
-    jse_results.append(json.dumps({"id": i+1, "time": end-start, "return_code": code}))
-
-# output results to a file
-with open("experiments/jse_diff_analysis", "w") as f:
-    for line in jse_results:
-        f.write(line + "\n")
+    diff_cmd = 'node build/createDiffAST.js --a="randjs/{0}.jse.js" --b="randjs/{0}.jse.diff.js" --resultFilePath="randjs/{0}.diff"'.format(i+1)
+    jse_jobs.append({
+        "id": i+1,
+        "inputs": inputs_hash(engine, "randjs/{}.jse.js".format(i+1), "randjs/{}.jse.diff.js".format(i+1), "results/JSE{}/cache".format(i+1), "results/JSE{}/cache.index".format(i+1)),
+        "cmd": diff_cmd + ' && node build/driver.js --diff --cache="results/JSE{0}/cache" --diffFile="randjs/{0}.diff" --outDir="results/targeted{0}" --solverCache="{1}"'.format(i+1, SOLVER_CACHE.format(i+1)),
+        "diff_cmd": diff_cmd,
+        "request": {"id": i+1, "cache": "results/JSE{}/cache".format(i+1), "diffFile": "randjs/{}.diff".format(i+1), "outDir": "results/targeted{}".format(i+1), "solverCache": SOLVER_CACHE.format(i+1)},
+        "timeout": JSE_TIMEOUT,
+    })
+run_jobs(jse_jobs, "experiments/jse_diff_analysis", workers=WORKERS, run=run_targeted if pool else run_command, cost_model=CostModel("randjs", ["experiments/jse_diff_analysis"]))
+
+if pool:
+    pool.close()
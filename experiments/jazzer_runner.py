@@ -0,0 +1,164 @@
+# Runs Jazzer fuzzing campaigns as run_jobs jobs (see runner.py). Concurrent
+# campaigns are each pinned to a CPU of their own, so they do not compete for
+# cores and every campaign gets its whole time budget of fuzzing.
+#
+# libFuzzer's -max_total_time only takes whole seconds, so a campaign is given
+# its budget rounded up and interrupted here once it has fuzzed for its budget;
+# libFuzzer prints its final stats when interrupted too. A campaign's record
+# holds:
+#   coverage:          the most branches the harness entered on one input (the
+#                      largest N of its "branch: N" output)
+#   <stat>:            libFuzzer's final stats (stat::<stat> lines), e.g.
+#                      number_of_executed_units, average_exec_per_sec
+#   coverage_timeline: [seconds, coverage] each time coverage grew
+#   fuzzer_timeline:   [seconds, executions, cov, ft, corpus size] each time
+#                      libFuzzer's coverage or corpus grew
+#   interrupted:       whether the campaign was stopped here at its budget
+# Seconds count from when libFuzzer starts, as its own time budget does.
+
+import math
+import os
+import queue
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from runner import TIMEOUT_RETURN_CODE
+
+# Seconds allowed for Node and Jazzer to start fuzzing, and for a campaign to
+# exit once interrupted, before it is killed.
+STARTUP_TIMEOUT = 60
+SHUTDOWN_TIMEOUT = 10
+
+STATUS_LINE = re.compile(r"#(\d+)\s+\w+\s+cov: (\d+) ft: (\d+) corp: (\d+)/")
+STAT_LINE = re.compile(r"stat::(\w+):\s+(\d+)")
+
+
+def jazzer_cmd(harness, budget, corpus=()):
+    # libFuzzer writes the inputs it finds to the first corpus directory and
+    # reads all of them.
+    return ["npx", "jazzer", harness, *corpus, "--", "-max_total_time={}".format(max(1, math.ceil(budget))), "-print_final_stats=1"]
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+class Campaign:
+    # Output of one campaign, read as it is written.
+    def __init__(self):
+        self.started = threading.Event()
+        self.start = None
+        self.coverage = 0
+        self.coverage_timeline = []
+        self.fuzzer_timeline = []
+        self.stats = {}
+
+    def elapsed(self):
+        return 0 if self.start is None else round(time.time() - self.start, 3)
+
+    def read_harness(self, stdout):
+        for line in stdout:
+            if not line.startswith("branch: "):
+                continue
+            branches = int(line[len("branch: "):])
+            if branches > self.coverage:
+                self.coverage = branches
+                self.coverage_timeline.append([self.elapsed(), branches])
+
+    def read_fuzzer(self, stderr):
+        for line in stderr:
+            if not self.started.is_set() and (line.startswith("INFO: Seed:") or line.startswith("#")):
+                self.start = time.time()
+                self.started.set()
+            status = STATUS_LINE.match(line)
+            if status:
+                executions, cov, ft, corpus = (int(n) for n in status.groups())
+                last = self.fuzzer_timeline[-1] if self.fuzzer_timeline else None
+                if last is None or last[2:] != [cov, ft, corpus]:
+                    self.fuzzer_timeline.append([self.elapsed(), executions, cov, ft, corpus])
+                continue
+            stat = STAT_LINE.match(line)
+            if stat:
+                self.stats[stat.group(1)] = int(stat.group(2))
+        # Unblock run_campaign if the campaign exits without starting.
+        self.started.set()
+
+
+def run_campaign(job, cpu=None):
+    # Run the campaign job["cmd"] for job["budget"] seconds, on `cpu` if given.
+    def pin():
+        if cpu is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {cpu})
+
+    proc = subprocess.Popen(
+        job["cmd"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+        preexec_fn=pin,
+    )
+    campaign = Campaign()
+    readers = [
+        threading.Thread(target=campaign.read_harness, args=(proc.stdout,), daemon=True),
+        threading.Thread(target=campaign.read_fuzzer, args=(proc.stderr,), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = interrupted = False
+    campaign.started.wait(STARTUP_TIMEOUT)
+    try:
+        # A campaign that did not start has either exited or hung.
+        budget = job["budget"] - campaign.elapsed() if campaign.start else SHUTDOWN_TIMEOUT
+        proc.wait(timeout=max(0, budget))
+    except subprocess.TimeoutExpired:
+        if campaign.start is None:
+            timed_out = True
+        else:
+            interrupted = True
+            os.killpg(proc.pid, signal.SIGINT)
+            try:
+                proc.wait(timeout=SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    if timed_out:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+    for reader in readers:
+        reader.join()
+
+    result = {
+        "return_code": TIMEOUT_RETURN_CODE if timed_out else proc.returncode,
+        "timed_out": timed_out,
+        "interrupted": interrupted,
+        "cpu": cpu,
+        "coverage": campaign.coverage,
+        "coverage_timeline": campaign.coverage_timeline,
+        "fuzzer_timeline": campaign.fuzzer_timeline,
+    }
+    result.update(campaign.stats)
+    return result
+
+
+def campaign_runner(cpus=None):
+    # A `run` function for run_jobs that runs each job as a campaign pinned to
+    # one of `cpus` (by default every CPU this process may use) not used by
+    # another campaign. Run with at most as many workers as CPUs.
+    free = queue.Queue()
+    for cpu in cpus or available_cpus():
+        free.put(cpu)
+
+    def run(job):
+        cpu = free.get()
+        try:
+            return run_campaign(job, cpu)
+        finally:
+            free.put(cpu)
+
+    return run
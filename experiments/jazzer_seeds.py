@@ -0,0 +1,67 @@
+# Turns the inputs JSE solved for a program into a seed corpus for its Jazzer
+# harness. The harness splits its input with splitBuffer(data, n) into n
+# chunks of ceil(len / n) bytes and compares each chunk with numbers, which
+# parses the chunk's text as a number. So an input of n values is their
+# decimals padded with spaces to one width: n chunks, each parsing as its value.
+# Usage: python3 experiments/jazzer_seeds.py <JSE result dir> <harness> <corpus dir>
+
+import hashlib
+import os
+import re
+import sys
+from fractions import Fraction
+
+from results_reader import iter_results
+
+
+def harness_inputs(harness_path):
+    # Names of the values the harness splits its input into, in order.
+    with open(harness_path, "r") as f:
+        match = re.search(r"const \[(.*?)\] = splitBuffer\(data, (\d+)\)", f.read())
+    if not match:
+        raise ValueError("{} does not split its input with splitBuffer".format(harness_path))
+    return [name.strip() for name in match.group(1).split(",")]
+
+
+def to_decimal(value):
+    # Z3 values are integers or fractions ("p/q"). Integers are written exactly
+    # and fractions as the nearest double, which is what the harness compares.
+    number = Fraction(value)
+    if number.denominator == 1:
+        return str(number.numerator)
+    return repr(float(number))
+
+
+def encode(values):
+    # A value the model left out is 0, which is what a blank chunk parses as.
+    decimals = [to_decimal(value) if value is not None else "" for value in values]
+    width = max(1, max(len(decimal) for decimal in decimals))
+    return "".join(decimal.rjust(width) for decimal in decimals).encode("ascii")
+
+
+def seed_inputs(result_dir, names):
+    # One input per JSE result, without duplicates.
+    inputs = {}
+    for result in iter_results(result_dir):
+        values = {svar["name"]: svar["value"] for svar in result["svars"]}
+        data = encode([values.get(name) for name in names])
+        inputs[hashlib.sha1(data).hexdigest()] = data
+    return inputs
+
+
+def write_seed_corpus(result_dir, harness_path, corpus_dir):
+    # Files are named by the SHA-1 of their contents, like libFuzzer's own
+    # corpus files. Returns the number of seeds.
+    inputs = seed_inputs(result_dir, harness_inputs(harness_path))
+    os.makedirs(corpus_dir, exist_ok=True)
+    for name, data in inputs.items():
+        with open(os.path.join(corpus_dir, name), "wb") as f:
+            f.write(data)
+    return len(inputs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("usage: python3 experiments/jazzer_seeds.py <JSE result dir> <harness> <corpus dir>")
+        sys.exit(1)
+    print("{} seeds".format(write_seed_corpus(*sys.argv[1:])))
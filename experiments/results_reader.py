@@ -0,0 +1,31 @@
+# Reader for the results of a JSE run: <result dir>/results.ndjson holds one JSON
+# record per satisfiable path, {"svars": [{"name", "value"}, ...], "finalLine": ...}.
+# Usage: python3 experiments/results_reader.py results/JSE1 [more result dirs...]
+
+import json
+import os
+import sys
+
+RESULTS_FILE = "results.ndjson"
+
+
+def iter_results(result_dir):
+    path = os.path.join(result_dir, RESULTS_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            # A run killed by its timeout can leave a partially written last line.
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+
+def count_results(result_dir):
+    return sum(1 for _ in iter_results(result_dir))
+
+
+if __name__ == "__main__":
+    for result_dir in sys.argv[1:]:
+        print(json.dumps({"dir": result_dir, "results": count_results(result_dir)}))
@@ -0,0 +1,143 @@
+# Parallel, resumable job runner shared by the experiment scripts.
+
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Fields of a job that control how it is run. Every other field of the job is
+# copied into its result record and identifies the job.
+JOB_FIELDS = ("cmd", "diff_cmd", "request", "timeout", "parse")
+# Fields used to decide whether a job already has a result. "inputs" is the
+# hash of what a job's result depends on (see inputs_hash), so a job is run
+# again when its engine build or input files change.
+KEY_FIELDS = ("id", "budget", "inputs")
+# Return code reported for jobs killed by their timeout (same as gtimeout).
+TIMEOUT_RETURN_CODE = 124
+
+
+def hash_paths(paths, digest=None):
+    # SHA-1 of the contents of files, and of every file below directories, with
+    # their paths. A missing path hashes as missing rather than failing, so a
+    # job whose inputs do not exist yet still gets a key.
+    digest = digest or hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                hash_paths([os.path.join(root, name) for name in sorted(files)], digest)
+            continue
+        digest.update(path.encode("utf-8") + b"\0")
+        if not os.path.exists(path):
+            digest.update(b"missing\0")
+            continue
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest
+
+
+def build_engine():
+    # Compile the TypeScript sources into build/ once for a sweep, so jobs can
+    # run node build/*.js directly instead of through the npm scripts, which
+    # recompile on every call. Returns the hash of the build.
+    subprocess.run(["npx", "tsc"], check=True)
+    return hash_paths(["build"]).hexdigest()
+
+
+def inputs_hash(engine, *paths):
+    # Value of a job's "inputs" field: the hash of the engine build (None for
+    # jobs that do not run the engine, e.g. Jazzer campaigns) and of the files
+    # its result depends on.
+    digest = hashlib.sha1((engine or "").encode("utf-8"))
+    return hash_paths(paths, digest).hexdigest()
+
+
+def job_key(record):
+    return tuple(record.get(field) for field in KEY_FIELDS)
+
+
+def load_results(results_path):
+    # Read the JSONL records already written for a sweep, skipping a partially
+    # written last line left behind by a crash.
+    records = []
+    if not os.path.exists(results_path):
+        return records
+    with open(results_path, "r") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def run_command(job):
+    # Run job["cmd"] in its own process group so the whole group (npm, node,
+    # shell pipelines...) can be killed when the timeout expires.
+    capture = "parse" in job
+    proc = subprocess.Popen(
+        job["cmd"],
+        shell=isinstance(job["cmd"], str),
+        stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        out, _ = proc.communicate(timeout=job.get("timeout"))
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        out, _ = proc.communicate()
+        result = {"return_code": TIMEOUT_RETURN_CODE, "timed_out": True}
+    else:
+        result = {"return_code": proc.returncode, "timed_out": False}
+    if capture:
+        result.update(job["parse"](out or ""))
+    return result
+
+
+def run_jobs(jobs, results_path, workers=None, run=run_command, cost_model=None):
+    # Run jobs across a pool of `workers`, appending one JSONL record per job to
+    # results_path as soon as it finishes. Jobs that already have a record in
+    # results_path with the same key are skipped, so an interrupted sweep
+    # resumes where it stopped and a repeated one only runs jobs whose inputs
+    # changed. Readers take the last record of a job as its result.
+    # With a cost_model (see cost_model.py), jobs start most expensive first and
+    # their timeouts are set from their predicted cost.
+    done = set(job_key(record) for record in load_results(results_path))
+    pending = [job for job in jobs if job_key(job) not in done]
+    print("{} jobs, {} already done, {} to run".format(len(jobs), len(jobs) - len(pending), len(pending)))
+    if not pending:
+        return
+    if cost_model:
+        print("cost model: " + cost_model.describe())
+        pending = cost_model.schedule(pending)
+
+    def execute(job):
+        start = time.time()
+        result = run(job)
+        end = time.time()
+        record = {k: v for k, v in job.items() if k not in JOB_FIELDS}
+        record["time"] = end - start
+        record.update(result)
+        return record
+
+    # A killed sweep can leave a partially written last line, which
+    # load_results skips. End it, so the first new record is not glued onto it
+    # and skipped with it.
+    if os.path.exists(results_path) and os.path.getsize(results_path) > 0:
+        with open(results_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    with open(results_path, "a") as f, ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(execute, job) for job in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            print("{}: elapsed time: {}".format(job_key(record), record["time"]))
@@ -0,0 +1,130 @@
+# Aggregates the trace.json files written by traced runs (--trace, or "trace":
+# true in a worker job) into a per-phase breakdown of where the time goes.
+# Phases nest (a solver.check inside explore inside analyse), so each phase has
+# a total time and a self time that excludes the phases inside it.
+# Fine-grained phases (e.g. solver.check, cache.write) are traced as a count and
+# a total time (the <phase>.count and <phase>.ms counters) instead of spans, so
+# they are listed on their own and their time is part of the self time of the
+# phases they ran in.
+# Usage: python3 experiments/trace_report.py [results dir ...] [--rows=path]
+#        [--stacks=path]
+#   --rows   one JSON line per trace: self time per phase, counters and the
+#            RandJS stats of the traced program, for correlating with e.g.
+#            NUM_BRANCHES
+#   --stacks collapsed stacks ("analyse;explore;solver.check <µs>"), the input
+#            format of flamegraph.pl and speedscope
+
+import argparse
+import glob
+import json
+import os
+import re
+
+TRACE_FILE = "trace.json"
+
+
+def find_traces(directories):
+    for directory in directories:
+        if os.path.isfile(directory):
+            yield directory
+            continue
+        yield from sorted(glob.glob(os.path.join(directory, "**", TRACE_FILE), recursive=True))
+
+
+def spans(trace):
+    # Complete events as (stack, duration, self time) in µs. A span's parents
+    # are the spans that contain it; events were recorded by one thread, so
+    # spans either nest or do not overlap.
+    events = sorted((e for e in trace["traceEvents"] if e["ph"] == "X"), key=lambda e: (e["ts"], -e["dur"]))
+    open_spans, result = [], []
+    for event in events:
+        while open_spans and open_spans[-1]["end"] <= event["ts"]:
+            open_spans.pop()
+        record = {"name": event["name"], "end": event["ts"] + event["dur"], "dur": event["dur"], "self": event["dur"]}
+        if open_spans:
+            open_spans[-1]["self"] -= event["dur"]
+            record["stack"] = open_spans[-1]["stack"] + [event["name"]]
+        else:
+            record["stack"] = [event["name"]]
+        open_spans.append(record)
+        result.append(record)
+    return result
+
+
+def program_stats(job):
+    # RandJS stats of the traced program: randjs/<id>.jse.js (or the
+    # randjs/<id>.diff of a targeted run) has them in randjs/<id>.stats.json.
+    source = job.get("file") or job.get("diffFile")
+    if not source:
+        return None, {}
+    match = re.match(r"(\d+)\.", os.path.basename(source))
+    if not match:
+        return None, {}
+    id = int(match.group(1))
+    path = os.path.join(os.path.dirname(source), "{}.stats.json".format(id))
+    if not os.path.exists(path):
+        return id, {}
+    with open(path, "r") as f:
+        return id, json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dirs", nargs="*", default=["results"])
+    parser.add_argument("--rows")
+    parser.add_argument("--stacks")
+    args = parser.parse_args()
+
+    phases, fine_phases, counters, stacks, rows = {}, {}, {}, {}, []
+    for path in find_traces(args.dirs):
+        with open(path, "r") as f:
+            trace = json.load(f)
+        job = trace.get("otherData", {}).get("job", {})
+        id, stats = program_stats(job)
+        row = {"trace": path, "id": id}
+        for span in spans(trace):
+            phase = phases.setdefault(span["name"], {"count": 0, "total": 0, "self": 0})
+            phase["count"] += 1
+            phase["total"] += span["dur"]
+            phase["self"] += span["self"]
+            key = ";".join(span["stack"])
+            stacks[key] = stacks.get(key, 0) + span["self"]
+            row[span["name"] + "_self_ms"] = row.get(span["name"] + "_self_ms", 0) + span["self"] / 1000
+        trace_counters = trace.get("otherData", {}).get("counters", {})
+        for name, value in trace_counters.items():
+            row[name] = value
+            phase_name, _, unit = name.rpartition(".")
+            if unit == "count" and phase_name + ".ms" in trace_counters:
+                phase = fine_phases.setdefault(phase_name, {"count": 0, "total": 0})
+                phase["count"] += value
+                phase["total"] += trace_counters[phase_name + ".ms"] * 1000
+            elif not (unit == "ms" and phase_name + ".count" in trace_counters):
+                counters.setdefault(name, []).append(value)
+        row.update(stats)
+        rows.append(row)
+
+    if not rows:
+        print("no {} found in {}".format(TRACE_FILE, ", ".join(args.dirs)))
+        return
+    total_self = sum(phase["self"] for phase in phases.values()) or 1
+    print("{} traces".format(len(rows)))
+    print("{:16} {:>8} {:>12} {:>12} {:>7}".format("phase", "count", "total ms", "self ms", "self %"))
+    for name, phase in sorted(phases.items(), key=lambda item: -item[1]["self"]):
+        print("{:16} {:8} {:12.1f} {:12.1f} {:6.1f}%".format(name, phase["count"], phase["total"] / 1000, phase["self"] / 1000, 100 * phase["self"] / total_self))
+    for name, phase in sorted(fine_phases.items(), key=lambda item: -item[1]["total"]):
+        print("{:16} {:8} {:12.1f} {:>12} {:>7}".format(name, phase["count"], phase["total"] / 1000, "-", "-"))
+    for name, values in sorted(counters.items()):
+        print("{:16} sum {:12} max {:10}".format(name, sum(values), max(values)))
+
+    if args.rows:
+        with open(args.rows, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+    if args.stacks:
+        with open(args.stacks, "w") as f:
+            for key, value in sorted(stacks.items()):
+                f.write("{} {}\n".format(key, int(round(value))))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,21 @@
 # Create graphs for experiment 1 results. 
-import json
 import matplotlib.pyplot as plt
 import seaborn as sns  # Seaborn for enhanced visualization
 import pandas as pd
 
+import dataset
+
 xyLabelFont = {'size': 14}
 titleFont = {'size': 16, 'weight': 'bold'}
 
-jse_results = []
-with open("experiments/jse_results_exp1", "r") as f:
-    line = f.readline()
-    while line: 
-        jse_results.append(json.loads(line[0:-1]))
-        line = f.readline()
-
-jazzer_cov = []
-with open("experiments/jazzer_cov_0.1_exp1", "r") as f:
-    cov = []
-    line = f.readline()
-    while line:
-        cov.append(int(line))
-        line = f.readline()
-    jazzer_cov.append(cov)
-with open("experiments/jazzer_cov_0.5_exp1", "r") as f:
-    cov = []
-    line = f.readline()
-    while line:
-        cov.append(int(line))
-        line = f.readline()
-    jazzer_cov.append(cov)
-with open("experiments/jazzer_cov_1_exp1", "r") as f:
-    cov = []
-    line = f.readline()
-    while line:
-        cov.append(int(line))
-        line = f.readline()
-    jazzer_cov.append(cov)
-
-
-stats = []
-for result in jse_results:
-    id = result["id"]
-    with open("randjs-exp1/{}.stats.json".format(id), "r") as f:
-        stat = json.loads(f.readline())
-        stat["id"] = id
-        stats.append(stat)
-    
-print(jse_results)
-print(jazzer_cov)
-print(stats)
-
-jse_results = [entry for entry in jse_results if entry['return_code'] == 0]
-stats = [entry for entry in stats if entry['id'] in [item['id'] for item in jse_results]]
-jazzer_cov[0] = [jazzer_cov[0][entry["id"]-1] for entry in jse_results]
-jazzer_cov[1] = [jazzer_cov[1][entry["id"]-1] for entry in jse_results]
-jazzer_cov[2] = [jazzer_cov[2][entry["id"]-1] for entry in jse_results]
-
-# Extract data
-ids = [entry['id'] for entry in stats]
-times = [entry['time'] for entry in jse_results if entry['id'] in ids]
+# One row per program id, joining the JSE run, the RandJS stats of the
+# program and the Jazzer coverage for each time budget.
+df = dataset.load("exp1")
+df = df[(df["jse_return_code"] == 0) & (df["has_stats"] == 1)]
+df = df.rename(columns={"jse_time": "time"})
+print(df)
+
+times = df["time"]
 
 # Plot histogram
 plt.figure(figsize=(8, 5))
@@ -68,12 +25,6 @@ plt.ylabel('Frequency', **xyLabelFont)
 plt.title('Distribution of Execution Times', **titleFont)
 plt.show()
 
-# Merge data into a single DataFrame
-df = pd.merge(pd.DataFrame(jse_results), pd.DataFrame(stats), on='id')
-
-# Set 'id' as index for better visualization
-df.set_index('id', inplace=True)
-
 # Extract data for the selected fields
 selected_fields_set1 = ['AVE_BRANCH_LENGTH']
 selected_fields_set2 = ['AVE_AST_DEPTH', 'NUM_BRANCHES']
@@ -151,51 +102,26 @@ plt.show()
 #         plt.show()
 
 
-for field in ['AVE_BRANCH_LENGTH', 'AVE_CONDITIONALS_PER_BRANCH', 'AVE_AST_DEPTH', 'NUM_BRANCHES']:
-    coverages = []
-    field_values = []
-
-    for i in range(len(jazzer_cov[2])):
-        # Find the corresponding index in stats
-        stat = stats[i]
-
-        stat_value = stat[field] if field == 'AVE_AST_DEPTH' else stat[field]
-        num_branches = stat["NUM_BRANCHES"]
-        coverage = 0 if num_branches == 0 else jazzer_cov[2][i] / (num_branches)
-        coverages.append(coverage)
-        field_values.append(stat_value)
+# Share of the program's branches reached by Jazzer within each time budget.
+for t in ["0.1", "0.5", "1"]:
+    df["jazzer_{}_share".format(t)] = (df["jazzer_{}_coverage".format(t)] / df["NUM_BRANCHES"]).where(df["NUM_BRANCHES"] != 0, 0)
 
+for field in ['AVE_BRANCH_LENGTH', 'AVE_CONDITIONALS_PER_BRANCH', 'AVE_AST_DEPTH', 'NUM_BRANCHES']:
     # Plot coverage against field values in stats
-    plt.scatter(field_values, coverages, color='black', marker='o', alpha=0.7)
+    plt.scatter(df[field], df["jazzer_1_share"], color='black', marker='o', alpha=0.7)
     plt.xlabel(field, fontsize=12)
     plt.ylabel('Coverage', fontsize=12)
     plt.title(f'Coverage vs {field}', fontsize=14)
     plt.show()
 
 
-box1 = []
-box2 = []
-box2Stats = []
-box3 = []
-box3Stats = []
-box4 = []
-box4Stats = []
-for i in range(len(jse_results)):
-    result = jse_results[i]
-    stat = next((stat for stat in stats if stat["id"] == result["id"]), None)
-    box1.append(stat["NUM_BRANCHES"] / result["time"])
-    # print(stat["NUM_BRANCHES"])
-    # print(result["time"])
-
-    box2.append(jazzer_cov[0][i] / 0.1)
-    box2Stats.append(jazzer_cov[0][i] / stat["NUM_BRANCHES"])
-    box3.append(jazzer_cov[1][i] / 0.5)
-    box3Stats.append(jazzer_cov[1][i] / stat["NUM_BRANCHES"])
-    box4.append(jazzer_cov[2][i] / 1)
-    box4Stats.append(jazzer_cov[2][i] / stat["NUM_BRANCHES"])
-    print(jazzer_cov[2][i])
-    print(jazzer_cov[1][i])
-    print(jazzer_cov[0][i])
+box1 = df["NUM_BRANCHES"] / df["time"]
+box2 = df["jazzer_0.1_coverage"] / 0.1
+box2Stats = df["jazzer_0.1_coverage"] / df["NUM_BRANCHES"]
+box3 = df["jazzer_0.5_coverage"] / 0.5
+box3Stats = df["jazzer_0.5_coverage"] / df["NUM_BRANCHES"]
+box4 = df["jazzer_1_coverage"] / 1
+box4Stats = df["jazzer_1_coverage"] / df["NUM_BRANCHES"]
 
 plt.boxplot([box1, box2, box3, box4], labels=['JSE\n100% coverage', 'Jazzer.js 0.1 sec\n{}% coverage'.format(int(sum(box2Stats)/len(box2Stats)*100)), 'Jazzer.js 0.5 sec\n{}% coverage'.format(int(sum(box3Stats)/len(box3Stats)*100)), 'Jazzer.js 1 sec\n{}% coverage'.format(int(sum(box4Stats)/len(box4Stats)*100))])
 # Add labels and title
@@ -203,8 +129,24 @@ plt.ylabel('Number of branches reached (seconds)', **xyLabelFont)
 plt.title('Performance Comparison between JSE and Jazzer.js', **titleFont)
 plt.show()
 
-print(box2Stats)
+print(box2Stats.tolist())
 plt.boxplot([[1], box2Stats, box3Stats, box4Stats], labels=["JSE\n100% coverage", "Jazzer.js 0.1s\naverage = {}%".format(int(sum(box2Stats)/len(box2Stats)*100)), "Jazzer.js 0.5s\naverage = {}%".format(int(sum(box3Stats)/len(box3Stats)*100)), "Jazzer.js 1s\naverage = {}%".format(int(sum(box4Stats)/len(box4Stats)*100))])
 plt.ylabel('Coverage', **xyLabelFont)
 plt.title('Program Coverage Comparison between JSE and Jazzer.js', **titleFont)
 plt.show()
+
+# How fast coverage saturates: mean share of the program's branches reached
+# within each time budget by JSE, by Jazzer, and by Jazzer seeded with JSE's
+# inputs (hybrid). Tools without results for a budget are left out.
+budgets = [0.1, 0.5, 1]
+for tool, label in [("jse", "JSE (coverage-first search)"), ("jazzer", "Jazzer.js"), ("hybrid", "Jazzer.js seeded by JSE")]:
+    columns = ["{}_{}_coverage".format(tool, t) for t in budgets]
+    if not all(column in df for column in columns):
+        continue
+    shares = [(df[column] / df["NUM_BRANCHES"]).where(df["NUM_BRANCHES"] != 0, 0).mean() for column in columns]
+    plt.plot(budgets, shares, marker='o', label=label)
+plt.xlabel('Time budget (seconds)', **xyLabelFont)
+plt.ylabel('Mean coverage', **xyLabelFont)
+plt.title('Coverage Saturation of JSE, Jazzer.js and Both', **titleFont)
+plt.legend()
+plt.show()
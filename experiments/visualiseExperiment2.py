@@ -1,9 +1,9 @@
 # Create graphs for experiment 1 results. 
-import json
 import matplotlib.pyplot as plt
 import seaborn as sns  # Seaborn for enhanced visualization
 import pandas as pd
-import os
+
+import dataset
 
 xyLabelFont = {'size': 14}
 titleFont = {'size': 16, 'weight': 'bold'}
@@ -11,36 +11,18 @@ titleFont = {'size': 16, 'weight': 'bold'}
 #####################################
 ##### READ DATA FIRST           #####
 #####################################
-jse_base = []
-with open("experiments/jse_base", "r") as f:
-    line = f.readline()
-    while line: 
-        jse_base.append(json.loads(line[0:-1]))
-        line = f.readline()
-jse_base = [entry for entry in jse_base if entry['return_code'] == 0]
-
-jse_diff = []
-with open("experiments/jse_diff_analysis", "r") as f:
-    line = f.readline()
-    while line: 
-        jse_diff.append(json.loads(line[0:-1]))
-        line = f.readline()
-jse_diff = [entry for entry in jse_diff if entry['return_code'] == 0]
-
-stats = []
-for result in jse_diff:
-    id = result["id"]
-    with open("randjs/{}.stats.json".format(id), "r") as f:
-        stat = json.loads(f.readline())
-        stat["id"] = id
-        stats.append(stat)
-stats = [entry for entry in stats if entry['id'] in [item['id'] for item in jse_diff]]
+# One row per program id, joining the base and targeted runs, the RandJS
+# stats of the program and the size of its base run's cache.
+df = dataset.load("exp2")
+jse_base = df[df["base_return_code"] == 0]
+df = df[(df["diff_return_code"] == 0) & (df["has_stats"] == 1)]
+df = df.rename(columns={"diff_time": "time"})
 
 #####################################
 ##### execution time comparison #####
 #####################################
 
-plt.boxplot([[i["time"] for i in jse_base], [i["time"] for i in jse_diff]], labels=['JSE without TA', 'JSE with TA'])
+plt.boxplot([jse_base["base_time"], df["time"]], labels=['JSE without TA', 'JSE with TA'])
 # Add labels and title
 plt.ylabel('Time (seconds)', **xyLabelFont)
 plt.title('JSE Performance with and without Targeted Analysis (TA)', **titleFont)
@@ -50,12 +32,6 @@ plt.show()
 ##### execution time against stats #####
 ########################################
 
-# Merge data into a single DataFrame
-df = pd.merge(pd.DataFrame(jse_diff), pd.DataFrame(stats), on='id')
-
-# Set 'id' as index for better visualization
-df.set_index('id', inplace=True)
-
 # Extract data for the selected fields
 selected_fields_set1 = ['AVE_BRANCH_LENGTH', 'AVE_CONDITIONALS_PER_BRANCH']
 selected_fields_set2 = ['AVE_AST_DEPTH', 'NUM_BRANCHES']
@@ -100,21 +76,14 @@ plt.show()
 ##### Cache Size against execution time #####
 #############################################
 
-cacheSizes = []
-for i in [j["id"] for j in jse_diff]:
-    cacheSize = 0
-    path = "results/JSE{}/cache".format(i)
-    if os.path.exists(path):
-        cacheSize = os.path.getsize(path)
-
-    cacheSizes.append(cacheSize/1000000)
+cacheSizes = df["cache_size"].fillna(0) / 1000000
 plt.hist(cacheSizes, bins=30, edgecolor='black')
 plt.xlabel('Cache Size (MB)', **xyLabelFont)
 plt.ylabel('Frequency', **xyLabelFont)
 plt.title('Distribution of Cache Sizes', **titleFont)
 plt.show()
 
-plt.scatter(cacheSizes, [i["time"] for i in jse_diff], color='black', marker='o', alpha=0.7)
+plt.scatter(cacheSizes, df["time"], color='black', marker='o', alpha=0.7)
 plt.xlabel("Cache Size (MB)", **xyLabelFont)
 plt.ylabel('Execution Time (sec)', **xyLabelFont)
 plt.title("JSE Execution Time against Cache Size for Targeted Analysis", **titleFont)
@@ -135,7 +104,7 @@ for i, fields in enumerate([selected_fields_set1, selected_fields_set2]):
     fig, axes = plt.subplots(nrows=2, figsize=(11, 11))
 
     for j, field in enumerate(fields):
-        axes[j].scatter([i[field] for i in stats], cacheSizes, label=field, color='black', alpha=0.7)
+        axes[j].scatter(df[field], cacheSizes, label=field, color='black', alpha=0.7)
         axes[j].set_ylabel("Cache Size (MB)", **xyLabelFont)
         axes[j].grid(True, linestyle='--', alpha=0.7)
     if i == 0:
@@ -0,0 +1,111 @@
+# Client for JSE's long-lived worker mode (node build/driver.js --worker).
+# A pool of workers is kept warm so that per-program latency is analysis time
+# rather than Node and Z3 start-up time.
+
+import json
+import queue
+import subprocess
+import threading
+
+from runner import TIMEOUT_RETURN_CODE
+
+NODE_ARGS = ["--max-old-space-size=34359"]
+READY_TIMEOUT = 60
+
+
+class JseWorker:
+    def __init__(self, node_args=NODE_ARGS):
+        self.node_args = node_args
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            ["node", *self.node_args, "build/driver.js", "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        # stdout is read on a thread so that a job can time out while waiting.
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.proc, self.lines), daemon=True).start()
+        try:
+            ready = self.lines.get(timeout=READY_TIMEOUT)
+        except queue.Empty:
+            ready = None
+        if ready is None or not json.loads(ready).get("ready"):
+            self.proc.kill()
+            self.proc.wait()
+            raise RuntimeError("JSE worker failed to start")
+
+    @staticmethod
+    def _read(proc, lines):
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def restart(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.start()
+
+    def run(self, request, timeout=None):
+        # Send one job and wait for its result line. Returns None if the job
+        # timed out. A worker that times out or dies is replaced, since it may
+        # still be busy with the job. A worker left dead by a failed restart is
+        # started again before the job is sent.
+        if self.proc.poll() is not None:
+            self.restart()
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            self.restart()
+            return None
+        except BrokenPipeError:
+            line = None
+        if line is None:
+            self.restart()
+            return {"status": "error", "error": "worker exited", "time": None}
+        return json.loads(line)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+class JseWorkerPool:
+    def __init__(self, size, node_args=NODE_ARGS):
+        self.workers = queue.Queue()
+        for _ in range(size):
+            self.workers.put(JseWorker(node_args))
+
+    def run(self, job):
+        # Runner-compatible run function: job["request"] is sent to an idle
+        # worker and its result is turned into a result record. A worker that
+        # could not be restarted fails only this job and goes back to the pool.
+        worker = self.workers.get()
+        try:
+            result = worker.run(job["request"], job.get("timeout"))
+        except (RuntimeError, OSError) as e:
+            return {"return_code": 1, "timed_out": False, "error": str(e)}
+        finally:
+            self.workers.put(worker)
+        if result is None:
+            return {"return_code": TIMEOUT_RETURN_CODE, "timed_out": True}
+        record = {"return_code": 0 if result["status"] == "ok" else 1, "timed_out": False, "analysis_time": result["time"]}
+        if "error" in result:
+            record["error"] = result["error"]
+        return record
+
+    def close(self):
+        while not self.workers.empty():
+            self.workers.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
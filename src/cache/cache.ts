@@ -0,0 +1,934 @@
+import { Expression, Statement } from 'estree';
+import { createHash } from 'crypto';
+import * as fs from 'fs';
+import { Constraint } from '../constraint/constraint.js';
+import { Ctx } from '../se.js';
+import { canonicalHash, canonicalJSON } from '../utils/ast.js';
+import { appendToFile } from '../utils/io.js';
+import { ConstraintStore } from '../utils/stores.js';
+
+// The branch cache written by --writecache is newline-delimited JSON. After a
+// header line, it holds three kinds of records, each written once:
+//   node:       the test expression of a conditional that led to a state
+//   constraint: the solver-relevant parts of a constraint
+//   state:      an explored state, as a delta against its parent state
+// A state's constraint store is its parent's store minus `del` plus `add`, and
+// its symbolic store is its parent's plus `vars`, so constraints shared by a
+// prefix of the path are never written again below it. `cond` and `side` are
+// the conditional the state was forked at and the branch it took (0 =
+// consequent, 1 = alternate), so a state can be found by its path.
+//
+// Every record is also indexed in the sidecar <cache>.index as it is written
+// (see CacheIndex), so targeted analysis reads only the records it needs, even
+// from a cache whose run was killed.
+//
+// A targeted analysis run with --writecache patches the cache of the previous
+// version in place: for every changed region it resumes, it appends a
+// replace record for the region's state, then the states it explores below
+// it. A replace record makes the children the state had before it stale, and
+// with them their subtrees, so the cache describes the new version. Once
+// patches have grown a cache enough, it is compacted: rewritten without its
+// stale states.
+export const CACHE_FORMAT = 'jse-cache';
+export const CACHE_VERSION = 4;
+
+// A patched cache is compacted when what patches appended since it was last
+// written whole passes this fraction of it. A patch mostly re-explores the
+// subtrees it makes stale, so this estimates the stale fraction without
+// reading the cache, and compacting costs in proportion to what was patched.
+const COMPACT_FRACTION = 0.5;
+
+// A writer appends the records it has built up, and indexes them, once they
+// pass either size, and when it is closed. A run killed in between loses the
+// records since the last write, as if it had been killed before reaching them.
+const FLUSH_BYTES = 1 << 16;
+const FLUSH_RECORDS = 1024;
+
+export type CachedOperand = { var: string } | { value: any };
+
+export interface CachedConstraint {
+  type: 'boolean' | 'assignment';
+  op: string;
+  lhs: CachedOperand;
+  rhs: CachedOperand;
+  negated: boolean;
+}
+
+export type CacheRecord =
+  | { kind: 'node'; id: number; test: Expression }
+  | ({ kind: 'constraint'; id: number } & CachedConstraint)
+  | {
+      kind: 'state';
+      id: number;
+      parent: number | null;
+      cond: number | null;
+      side: number | null;
+      add: number[];
+      del: number[];
+      vars: string[];
+    }
+  | { kind: 'replace'; id: number; state: number };
+
+// Key of the path to a state: a hash of the tests and sides of the forks on
+// it. The root state is the only one with no fork on its path.
+const ROOT_KEY = hashKey('');
+
+function hashKey(text: string) {
+  return createHash('sha1').update(text).digest('hex');
+}
+
+function stepKey(parentKey: string, testHash: string, side: number) {
+  return hashKey(`${parentKey}/${testHash}:${side}`);
+}
+
+// Key of a state from its parent's key and the canonical hash of the test of
+// the conditional it was forked at, undefined for the root.
+function stateKey(
+  parentKey: string | undefined,
+  testHash: string | undefined,
+  side: number | null,
+) {
+  if (testHash === undefined) return ROOT_KEY;
+  return stepKey(parentKey ?? ROOT_KEY, testHash, side ?? 0);
+}
+
+function pathKey(steps: CacheStep[]) {
+  return steps.reduce(
+    (key, { test, side }) => stepKey(key, canonicalHash(test), side),
+    ROOT_KEY,
+  );
+}
+
+// The index of a cache: a binary file of fixed-width fields, written as the
+// records are, so it is usable even if the run writing the cache was killed,
+// and read with positional reads, so a lookup reads only what it needs.
+//   header:  'JSEI', CACHE_VERSION (u32) and the size of the cache when it
+//            was last written whole (u48, 0 until then)
+//   buckets: BUCKETS heads (u32), each the last state whose path key falls in
+//            the bucket
+//   entries: one per record, by id: the record's offset (u48) and length
+//            (u32), and for a state, the first bytes of its path key, the
+//            state before it in its bucket (u32) and the last replace record
+//            for it (u32)
+// Integers are little-endian and ids are stored plus one, so 0 is none.
+// Finding the state for a path follows the chain of its key's bucket, newest
+// state first.
+const INDEX_MAGIC = 'JSEI';
+const HEADER_SIZE = 16;
+const BUCKETS = 4096;
+const ENTRIES_START = HEADER_SIZE + 4 * BUCKETS;
+const ENTRY_SIZE = 26;
+const KEY_SIZE = 8;
+
+interface IndexEntry {
+  offset: number;
+  length: number;
+  // Path key of a state, all zeros for other records.
+  key: Buffer;
+  prev: number | undefined;
+  replaced: number | undefined;
+}
+
+// A record to index, with the path key of a state.
+interface IndexedRecord {
+  offset: number;
+  length: number;
+  key?: string;
+}
+
+function keyBytes(key: string) {
+  return Buffer.from(key.slice(0, 2 * KEY_SIZE), 'hex');
+}
+
+function bucketOffset(key: Buffer) {
+  return HEADER_SIZE + 4 * (key.readUInt32LE(0) % BUCKETS);
+}
+
+function optionalId(stored: number) {
+  return stored === 0 ? undefined : stored - 1;
+}
+
+class CacheIndex {
+  private fd: number;
+  private heads = new Map<number, number>();
+  // Number of records indexed.
+  public size: number;
+
+  private constructor(fd: number, size: number) {
+    this.fd = fd;
+    this.size = size;
+  }
+
+  // A new, empty index for a cache.
+  public static create(filePath: string) {
+    const fd = fs.openSync(filePath + '.index', 'w+');
+    const header = Buffer.alloc(ENTRIES_START);
+    header.write(INDEX_MAGIC, 0, 'latin1');
+    header.writeUInt32LE(CACHE_VERSION, 4);
+    fs.writeSync(fd, header, 0, header.length, 0);
+    return new CacheIndex(fd, 0);
+  }
+
+  // The index of a cache, if it has one in this format that indexes records
+  // and only records the cache file holds.
+  public static open(filePath: string, writable = false) {
+    const indexPath = filePath + '.index';
+    if (!fs.existsSync(indexPath)) return undefined;
+    const fd = fs.openSync(indexPath, writable ? 'r+' : 'r');
+    const entries = fs.fstatSync(fd).size - ENTRIES_START;
+    // An entry cut short by a killed run is not counted.
+    const index = new CacheIndex(fd, Math.floor(entries / ENTRY_SIZE));
+    const header = index.read(0, HEADER_SIZE);
+    if (
+      entries >= ENTRY_SIZE &&
+      header.toString('latin1', 0, 4) === INDEX_MAGIC &&
+      header.readUInt32LE(4) === CACHE_VERSION &&
+      index.end <= fs.statSync(filePath).size
+    )
+      return index;
+    index.close();
+    return undefined;
+  }
+
+  // End of the last record indexed in the cache file.
+  public get end() {
+    const last = this.entry(this.size - 1);
+    return last.offset + last.length;
+  }
+
+  public entry(id: number): IndexEntry {
+    const entry = this.read(ENTRIES_START + id * ENTRY_SIZE, ENTRY_SIZE);
+    return {
+      offset: entry.readUIntLE(0, 6),
+      length: entry.readUInt32LE(6),
+      key: entry.subarray(10, 10 + KEY_SIZE),
+      prev: optionalId(entry.readUInt32LE(18)),
+      replaced: optionalId(entry.readUInt32LE(22)),
+    };
+  }
+
+  // The last state indexed whose path key is in key's bucket.
+  public head(key: Buffer) {
+    return optionalId(this.storedHead(bucketOffset(key)));
+  }
+
+  // Index the next records, written to the cache file.
+  public append(records: IndexedRecord[]) {
+    const entries = Buffer.alloc(records.length * ENTRY_SIZE);
+    const heads = new Map<number, number>();
+    records.forEach((record, i) => {
+      const at = i * ENTRY_SIZE;
+      entries.writeUIntLE(record.offset, at, 6);
+      entries.writeUInt32LE(record.length, at + 6);
+      if (record.key === undefined) return;
+      const key = keyBytes(record.key);
+      key.copy(entries, at + 10);
+      const bucket = bucketOffset(key);
+      entries.writeUInt32LE(
+        heads.get(bucket) ?? this.storedHead(bucket),
+        at + 18,
+      );
+      heads.set(bucket, this.size + i + 1);
+    });
+    this.write(entries, ENTRIES_START + this.size * ENTRY_SIZE);
+    this.size += records.length;
+    // The heads are moved once the entries they lead to are written.
+    heads.forEach((head, bucket) => {
+      const stored = Buffer.alloc(4);
+      stored.writeUInt32LE(head, 0);
+      this.write(stored, bucket);
+      this.heads.set(bucket, head);
+    });
+  }
+
+  // Size of the cache file when it was last written whole, by a run that
+  // finished or by compactCache.
+  public get compactedSize() {
+    return this.read(8, 6).readUIntLE(0, 6);
+  }
+
+  public set compactedSize(size: number) {
+    const stored = Buffer.alloc(6);
+    stored.writeUIntLE(size, 0, 6);
+    this.write(stored, 8);
+  }
+
+  public setReplaced(state: number, replace: number) {
+    const stored = Buffer.alloc(4);
+    stored.writeUInt32LE(replace + 1, 0);
+    this.write(stored, ENTRIES_START + state * ENTRY_SIZE + 22);
+  }
+
+  public close() {
+    fs.closeSync(this.fd);
+  }
+
+  private storedHead(bucket: number) {
+    if (!this.heads.has(bucket))
+      this.heads.set(bucket, this.read(bucket, 4).readUInt32LE(0));
+    return this.heads.get(bucket)!;
+  }
+
+  private read(position: number, length: number) {
+    const buffer = Buffer.alloc(length);
+    fs.readSync(this.fd, buffer, 0, length, position);
+    return buffer;
+  }
+
+  private write(buffer: Buffer, position: number) {
+    fs.writeSync(this.fd, buffer, 0, buffer.length, position);
+  }
+}
+
+// What a child state needs to know about the state it was forked from.
+export interface CacheParent {
+  id: number;
+  // Path key of the state.
+  key: string;
+  cstore: ConstraintStore;
+  sstoreSize: number;
+}
+
+export class CacheWriter {
+  private filePath: string;
+  // Whether an existing cache is being patched. Only states below the ones
+  // it already has can be added to it.
+  private patching: boolean;
+  private nodeIds = new Map<Statement, number>();
+  // Constraints are identified by their cached form rather than by object, so
+  // the constraints of a state the engine rebuilt after spilling it map to the
+  // records written for the originals. Equal constraints are on the same
+  // variable and so are always deleted together.
+  private constraintIds = new Map<string, number>();
+  private constraintKeys = new WeakMap<Constraint, string | null>();
+  private nodeHashes = new Map<number, string>();
+  private nextId = 0;
+  private pending = '';
+  private pendingRecords: IndexedRecord[] = [];
+  // States replaced by pending replace records, with the id of the record.
+  private pendingReplaced: [number, number][] = [];
+  private position = 0;
+  private index: CacheIndex;
+
+  // A writer for a new cache, or one appending to the cache indexed by base.
+  constructor(filePath: string, base?: CacheIndex) {
+    this.filePath = filePath;
+    this.patching = base !== undefined;
+    if (base) {
+      this.index = base;
+      this.nextId = base.size;
+      // Drop whatever a killed run wrote after the last record it indexed.
+      this.position = base.size > 0 ? base.end : fs.statSync(filePath).size;
+      fs.truncateSync(filePath, this.position);
+      return;
+    }
+    const header =
+      JSON.stringify({ format: CACHE_FORMAT, version: CACHE_VERSION }) + '\n';
+    appendToFile(header, this.filePath);
+    this.position = Buffer.byteLength(header);
+    this.index = CacheIndex.create(filePath);
+  }
+
+  // Bytes written to the cache file so far.
+  public get size() {
+    return this.position;
+  }
+
+  // Close the index. A cache that was written whole is marked as compact; a
+  // patched one is compacted once its stale states are likely to make up more
+  // than COMPACT_FRACTION of it.
+  public close() {
+    this.flush();
+    if (!this.patching) this.index.compactedSize = this.position;
+    const patched = this.position - this.index.compactedSize;
+    this.index.close();
+    if (this.patching && patched > COMPACT_FRACTION * this.position)
+      compactCache(this.filePath);
+  }
+
+  private emit(record: CacheRecord, key?: string) {
+    const line = JSON.stringify(record) + '\n';
+    const length = Buffer.byteLength(line);
+    this.pendingRecords.push({ offset: this.position, length, key });
+    this.position += length;
+    this.pending += line;
+    if (
+      this.position - this.pendingRecords[0].offset >= FLUSH_BYTES ||
+      this.pendingRecords.length >= FLUSH_RECORDS
+    )
+      this.flush();
+  }
+
+  // Write the records emitted, then index them, then mark the states they
+  // replace, so the index only ever points at records in the cache file.
+  private flush() {
+    if (this.pendingRecords.length === 0) return;
+    appendToFile(this.pending, this.filePath);
+    this.index.append(this.pendingRecords);
+    for (const [state, replace] of this.pendingReplaced)
+      this.index.setReplaced(state, replace);
+    this.pending = '';
+    this.pendingRecords = [];
+    this.pendingReplaced = [];
+  }
+
+  // Key of a constraint's cached form, or null if it has none.
+  private constraintKey(constraint: Constraint) {
+    let key = this.constraintKeys.get(constraint);
+    if (key === undefined) {
+      const cached = constraint.constraint && constraint.toCached();
+      key = cached ? cachedKey(cached) : null;
+      this.constraintKeys.set(constraint, key);
+    }
+    return key;
+  }
+
+  // Start writing the subtree of a state of the cache being patched again:
+  // ctx is the state, rebuilt from its cached stores. Its children so far
+  // become stale. Returns the state as the parent of the new children.
+  public replaceState(ctx: Ctx, stores: CachedStores): CacheParent {
+    const ids = new Map<string, number>();
+    stores.cstore.forEach((cached, i) =>
+      ids.set(cachedKey(cached), stores.constraintIds[i]),
+    );
+    // The records of the state's constraints, so children deleting them say
+    // so.
+    for (const constraint of ctx.cstore) {
+      const key = this.constraintKey(constraint);
+      const id = key === null ? undefined : ids.get(key);
+      if (id !== undefined) this.constraintIds.set(key!, id);
+    }
+    const record: CacheRecord = {
+      kind: 'replace',
+      id: this.nextId++,
+      state: stores.state,
+    };
+    this.pendingReplaced.push([stores.state, record.id]);
+    this.emit(record);
+    return {
+      id: stores.state,
+      key: stores.key,
+      cstore: ctx.cstore.fork(),
+      sstoreSize: ctx.sstore.size,
+    };
+  }
+
+  // Save a state, unless it cannot be reached in the cache: when patching,
+  // a state without a parent (e.g. in a region the cache had no state for).
+  public saveState(
+    ctx: Ctx,
+    lastConditional: Statement | undefined,
+    side: number | undefined,
+    parent: CacheParent | undefined,
+  ): CacheParent | undefined {
+    if (this.patching && !parent) return undefined;
+    let cond: number | null = null;
+    if (lastConditional && lastConditional.type === 'IfStatement') {
+      if (!this.nodeIds.has(lastConditional)) {
+        const record: CacheRecord = {
+          kind: 'node',
+          id: this.nextId++,
+          test: lastConditional.test,
+        };
+        this.nodeIds.set(lastConditional, record.id);
+        this.nodeHashes.set(record.id, canonicalHash(record.test));
+        this.emit(record);
+      }
+      cond = this.nodeIds.get(lastConditional)!;
+    }
+    const add: number[] = [];
+    for (const constraint of ctx.cstore) {
+      if (parent && parent.cstore.has(constraint)) continue;
+      const key = this.constraintKey(constraint);
+      if (key === null) continue;
+      if (!this.constraintIds.has(key)) {
+        const record: CacheRecord = {
+          kind: 'constraint',
+          id: this.nextId++,
+          ...constraint.toCached()!,
+        };
+        this.constraintIds.set(key, record.id);
+        this.emit(record);
+      }
+      add.push(this.constraintIds.get(key)!);
+    }
+    const del: number[] = [];
+    if (parent) {
+      for (const constraint of parent.cstore) {
+        if (ctx.cstore.has(constraint)) continue;
+        const key = this.constraintKey(constraint);
+        const id = key === null ? undefined : this.constraintIds.get(key);
+        if (id !== undefined) del.push(id);
+      }
+    }
+    // The symbolic store only grows.
+    const vars = ctx.sstore
+      .newest(ctx.sstore.size - (parent?.sstoreSize ?? 0))
+      .map((svar) => svar.name);
+    const state: CacheRecord = {
+      kind: 'state',
+      id: this.nextId++,
+      parent: parent?.id ?? null,
+      cond,
+      side: side ?? null,
+      add,
+      del,
+      vars,
+    };
+    const key = stateKey(
+      parent?.key,
+      cond === null ? undefined : this.nodeHashes.get(cond),
+      state.side,
+    );
+    this.emit(state, key);
+    return {
+      id: state.id,
+      key,
+      cstore: ctx.cstore.fork(),
+      sstoreSize: ctx.sstore.size,
+    };
+  }
+}
+
+export interface CachedState {
+  id: number;
+  parent: number | null;
+  lastConditional: { test: Expression } | undefined;
+  side: number | null;
+  add: number[];
+  del: number[];
+  vars: string[];
+}
+
+export interface CachedStores {
+  // Id of the state record.
+  state: number;
+  // Path key of the state.
+  key: string;
+  cstore: CachedConstraint[];
+  // Ids of the constraint records of cstore, in the same order.
+  constraintIds: number[];
+  sstore: string[];
+}
+
+// One fork on the path to a state: the test of the conditional and the branch
+// taken (0 = consequent, 1 = alternate).
+export interface CacheStep {
+  test: Expression;
+  side: number;
+}
+
+// A cache that can be searched for the state reached through a path.
+export interface CacheLookup {
+  // Stores of the state reached from the start of the program through steps,
+  // or undefined if the run that wrote the cache did not reach it (e.g. it was
+  // pruned as infeasible or the run was stopped early).
+  find(steps: CacheStep[]): CachedStores | undefined;
+  close(): void;
+}
+
+// Whether the lineage of a state (root first), described by the canonical
+// JSON of each state's conditional test and its side, is the path of steps.
+function isPath(
+  lineage: { test: string | undefined; side: number | null }[],
+  steps: { test: string; side: number }[],
+) {
+  if (lineage.length !== steps.length + 1 || lineage[0].test !== undefined)
+    return false;
+  return steps.every(
+    (step, i) =>
+      lineage[i + 1].test === step.test && lineage[i + 1].side === step.side,
+  );
+}
+
+// Whether no state in a lineage (root first) was made stale by a replace
+// record for its parent written after it.
+function isCurrent(
+  lineage: { id: number }[],
+  replaced: (state: number) => number | undefined,
+) {
+  return lineage.every((state, i) => {
+    if (i === 0) return true;
+    const replacedAt = replaced(lineage[i - 1].id);
+    return replacedAt === undefined || replacedAt < state.id;
+  });
+}
+
+// Key of a constraint's cached form, the same however its fields are ordered.
+function cachedKey(cached: CachedConstraint) {
+  const { type, op, lhs, rhs, negated } = cached;
+  return JSON.stringify([type, op, lhs, rhs, negated]);
+}
+
+function canonicalSteps(steps: CacheStep[]) {
+  return steps.map(({ test, side }) => ({ test: canonicalJSON(test), side }));
+}
+
+// Rebuild the full constraint and symbolic stores of a state from the deltas
+// of its lineage (root first).
+function applyDeltas(
+  lineage: { id: number; add: number[]; del: number[]; vars: string[] }[],
+  getConstraint: (id: number) => CachedConstraint,
+): Omit<CachedStores, 'key'> {
+  const cstore = new Set<number>();
+  const sstore: string[] = [];
+  for (const s of lineage) {
+    s.del.forEach((id) => cstore.delete(id));
+    s.add.forEach((id) => cstore.add(id));
+    sstore.push(...s.vars);
+  }
+  const constraintIds = Array.from(cstore);
+  return {
+    state: lineage[lineage.length - 1].id,
+    cstore: constraintIds.map(getConstraint),
+    constraintIds,
+    sstore,
+  };
+}
+
+// A fully loaded cache.
+export class CacheFile implements CacheLookup {
+  public nodes = new Map<number, Expression>();
+  public constraints = new Map<number, CachedConstraint>();
+  public states: CachedState[] = [];
+  private stateIndex = new Map<number, CachedState>();
+  private replaced = new Map<number, number>();
+
+  public addRecord(record: CacheRecord) {
+    if (record.kind === 'node') this.nodes.set(record.id, record.test);
+    else if (record.kind === 'replace')
+      this.replaced.set(record.state, record.id);
+    else if (record.kind === 'constraint') {
+      const { kind, id, ...constraint } = record;
+      this.constraints.set(id, constraint);
+    } else {
+      const state: CachedState = {
+        id: record.id,
+        parent: record.parent,
+        lastConditional:
+          record.cond === null
+            ? undefined
+            : { test: this.nodes.get(record.cond)! },
+        side: record.side,
+        add: record.add,
+        del: record.del,
+        vars: record.vars,
+      };
+      this.states.push(state);
+      this.stateIndex.set(state.id, state);
+    }
+  }
+
+  public find(steps: CacheStep[]) {
+    const path = canonicalSteps(steps);
+    const last = path[path.length - 1];
+    const describe = (state: CachedState) => ({
+      test: state.lastConditional && canonicalJSON(state.lastConditional.test),
+      side: state.side,
+    });
+    for (const state of this.states) {
+      const { test, side } = describe(state);
+      if (side !== (last?.side ?? null) || test !== last?.test) continue;
+      const lineage = this.lineage(state);
+      const described = lineage.map(describe);
+      if (
+        isPath(described, path) &&
+        isCurrent(lineage, (id) => this.replaced.get(id))
+      )
+        return {
+          ...applyDeltas(lineage, (id) => this.constraints.get(id)!),
+          key: pathKey(steps),
+        };
+    }
+    return undefined;
+  }
+
+  // The states no replace record made stale, in the order they were written.
+  public currentStates() {
+    const stale = new Set<number>();
+    return this.states.filter((state) => {
+      const parent = state.parent;
+      if (
+        parent !== null &&
+        (stale.has(parent) || (this.replaced.get(parent) ?? -1) > state.id)
+      ) {
+        stale.add(state.id);
+        return false;
+      }
+      return true;
+    });
+  }
+
+  public resolve(state: CachedState) {
+    return applyDeltas(
+      this.lineage(state),
+      (id) => this.constraints.get(id)!,
+    );
+  }
+
+  private lineage(state: CachedState) {
+    const lineage: CachedState[] = [];
+    for (
+      let s: CachedState | undefined = state;
+      s;
+      s = s.parent === null ? undefined : this.stateIndex.get(s.parent)
+    )
+      lineage.unshift(s);
+    return lineage;
+  }
+
+  public close() {}
+}
+
+// A cache read through its index: only the records on the paths to the
+// requested states are read from disk, with positional reads, and each of them
+// once however many of the paths share it.
+export class IndexedCache implements CacheLookup {
+  private fd: number;
+  private index: CacheIndex;
+  private records = new Map<number, CacheRecord>();
+  // Canonical JSON of the tests of the node records read.
+  private tests = new Map<number, string>();
+
+  constructor(filePath: string, index: CacheIndex) {
+    this.index = index;
+    this.fd = fs.openSync(filePath, 'r');
+  }
+
+  public find(steps: CacheStep[]) {
+    const path = canonicalSteps(steps);
+    const key = pathKey(steps);
+    const bytes = keyBytes(key);
+    for (let id = this.index.head(bytes); id !== undefined; ) {
+      const entry = this.index.entry(id);
+      if (entry.key.equals(bytes)) {
+        const lineage = this.lineage(
+          this.readRecord(id) as CacheRecord & { kind: 'state' },
+        );
+        // Comparing the tests also guards against hash collisions.
+        const described = lineage.map((s) => ({
+          test: s.cond === null ? undefined : this.test(s.cond),
+          side: s.side,
+        }));
+        if (
+          isPath(described, path) &&
+          isCurrent(lineage, (state) => this.index.entry(state).replaced)
+        )
+          return { ...this.resolve(lineage), key };
+      }
+      id = entry.prev;
+    }
+    return undefined;
+  }
+
+  public close() {
+    fs.closeSync(this.fd);
+    this.index.close();
+  }
+
+  private lineage(state: CacheRecord & { kind: 'state' }) {
+    const lineage = [state];
+    while (lineage[0].parent !== null) {
+      lineage.unshift(
+        this.readRecord(lineage[0].parent) as CacheRecord & { kind: 'state' },
+      );
+    }
+    return lineage;
+  }
+
+  private resolve(lineage: (CacheRecord & { kind: 'state' })[]) {
+    return applyDeltas(lineage, (id) => {
+      const { kind, id: _, ...constraint } = this.readRecord(
+        id,
+      ) as CacheRecord & { kind: 'constraint' };
+      return constraint;
+    });
+  }
+
+  private test(nodeId: number) {
+    if (!this.tests.has(nodeId)) {
+      const node = this.readRecord(nodeId);
+      this.tests.set(
+        nodeId,
+        node.kind === 'node' ? canonicalJSON(node.test) : '',
+      );
+    }
+    return this.tests.get(nodeId)!;
+  }
+
+  private readRecord(id: number): CacheRecord {
+    let record = this.records.get(id);
+    if (record) return record;
+    const { offset, length } = this.index.entry(id);
+    const buffer = Buffer.alloc(length);
+    fs.readSync(this.fd, buffer, 0, length, offset);
+    record = JSON.parse(buffer.toString('utf-8')) as CacheRecord;
+    this.records.set(id, record);
+    return record;
+  }
+}
+
+export function readCache(filePath: string) {
+  const lines = fs.readFileSync(filePath, 'utf-8').split(/\r?\n/);
+  const cache = new CacheFile();
+  try {
+    const header = JSON.parse(lines[0]);
+    if (header.format !== CACHE_FORMAT || header.version !== CACHE_VERSION)
+      throw Error(
+        'unsupported cache format, rerun the base program with --writecache',
+      );
+    for (const line of lines.slice(1)) {
+      if (!line) continue;
+      cache.addRecord(JSON.parse(line) as CacheRecord);
+    }
+  } catch (e: any) {
+    throw Error('cache file could not be read: ' + e);
+  }
+  return cache;
+}
+
+// Index a cache by reading all of it.
+function indexCache(filePath: string) {
+  const data = fs.readFileSync(filePath);
+  const records: IndexedRecord[] = [];
+  const replaced: (CacheRecord & { kind: 'replace' })[] = [];
+  const nodeHashes = new Map<number, string>();
+  const keys = new Map<number, string>();
+  let position = data.indexOf('\n') + 1;
+  // A patch starts with a replace record, so the cache was written whole up
+  // to the first one.
+  let compactedSize: number | undefined;
+  try {
+    const header = JSON.parse(data.toString('utf-8', 0, position));
+    if (header.format !== CACHE_FORMAT || header.version !== CACHE_VERSION)
+      throw Error(
+        'unsupported cache format, rerun the base program with --writecache',
+      );
+    // A last line without a newline is a record a killed run was writing.
+    for (
+      let end = data.indexOf('\n', position);
+      end !== -1;
+      end = data.indexOf('\n', position)
+    ) {
+      const line = data.toString('utf-8', position, end + 1);
+      const record = JSON.parse(line) as CacheRecord;
+      let key: string | undefined;
+      if (record.kind === 'node')
+        nodeHashes.set(record.id, canonicalHash(record.test));
+      else if (record.kind === 'replace') {
+        compactedSize = compactedSize ?? position;
+        replaced.push(record);
+      }
+      else if (record.kind === 'state') {
+        key = stateKey(
+          record.parent === null ? undefined : keys.get(record.parent),
+          record.cond === null ? undefined : nodeHashes.get(record.cond),
+          record.side,
+        );
+        keys.set(record.id, key);
+      }
+      records.push({ offset: position, length: end + 1 - position, key });
+      position = end + 1;
+    }
+  } catch (e: any) {
+    throw Error('cache file could not be read: ' + e);
+  }
+  const index = CacheIndex.create(filePath);
+  index.append(records);
+  index.compactedSize = compactedSize ?? position;
+  replaced.forEach((record) => index.setReplaced(record.state, record.id));
+  return index;
+}
+
+// Rewrite a patched cache and its index without the stale states, and the
+// records only they used. The records left keep their order and are numbered
+// again from 0.
+export function compactCache(filePath: string) {
+  const cache = readCache(filePath);
+  const compactPath = filePath + '.compact';
+  const header =
+    JSON.stringify({ format: CACHE_FORMAT, version: CACHE_VERSION }) + '\n';
+  const lines = [header];
+  const records: IndexedRecord[] = [];
+  let position = Buffer.byteLength(header);
+  const emit = (record: CacheRecord, key?: string) => {
+    const line = JSON.stringify(record) + '\n';
+    const length = Buffer.byteLength(line);
+    lines.push(line);
+    records.push({ offset: position, length, key });
+    position += length;
+  };
+  const nodeIds = new Map<Expression, number>();
+  const testHashes = new Map<Expression, string>();
+  const constraintIds = new Map<number, number>();
+  const stateIds = new Map<number, number>();
+  const keys = new Map<number, string>();
+  for (const state of cache.currentStates()) {
+    const test = state.lastConditional?.test;
+    if (test && !nodeIds.has(test)) {
+      nodeIds.set(test, records.length);
+      testHashes.set(test, canonicalHash(test));
+      emit({ kind: 'node', id: records.length, test });
+    }
+    const add = state.add.map((id) => {
+      if (!constraintIds.has(id)) {
+        constraintIds.set(id, records.length);
+        emit({
+          kind: 'constraint',
+          id: records.length,
+          ...cache.constraints.get(id)!,
+        });
+      }
+      return constraintIds.get(id)!;
+    });
+    const key = stateKey(
+      state.parent === null ? undefined : keys.get(state.parent),
+      test && testHashes.get(test),
+      state.side,
+    );
+    keys.set(state.id, key);
+    stateIds.set(state.id, records.length);
+    emit(
+      {
+        kind: 'state',
+        id: records.length,
+        parent: state.parent === null ? null : stateIds.get(state.parent)!,
+        cond: test ? nodeIds.get(test)! : null,
+        side: state.side,
+        add,
+        del: state.del
+          .filter((id) => constraintIds.has(id))
+          .map((id) => constraintIds.get(id)!),
+        vars: state.vars,
+      },
+      key,
+    );
+  }
+  fs.writeFileSync(compactPath, lines.join(''));
+  const index = CacheIndex.create(compactPath);
+  index.append(records);
+  index.compactedSize = position;
+  index.close();
+  // A cache without an index is read whole, or indexed again to be patched,
+  // so a run killed in between leaves a cache that can still be used.
+  fs.rmSync(filePath + '.index', { force: true });
+  fs.renameSync(compactPath, filePath);
+  fs.renameSync(compactPath + '.index', filePath + '.index');
+}
+
+// Open a cache for lookups, through its index when it has one, and by loading
+// the whole file otherwise.
+export function openCache(filePath: string): CacheLookup {
+  const index = CacheIndex.open(filePath);
+  return index ? new IndexedCache(filePath, index) : readCache(filePath);
+}
+
+// Open a cache to be patched with the states of a new version of its
+// program (see CacheWriter.replaceState). A cache without an index is indexed
+// first.
+export function patchCache(filePath: string) {
+  return new CacheWriter(
+    filePath,
+    CacheIndex.open(filePath, true) ?? indexCache(filePath),
+  );
+}
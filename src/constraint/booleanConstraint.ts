@@ -1,7 +1,9 @@
 import { BinaryOperator, Expression } from 'estree';
 import { Arith, Bool } from 'z3-solver';
+import { CachedConstraint, CachedOperand } from '../cache/cache.js';
 import { Ctx, SeEngine } from '../se.js';
 import { SVar } from '../symbolicVars/svars.js';
+import { tracer } from '../utils/trace.js';
 import { Constraint } from './constraint.js';
 
 export class BooleanConstraint extends Constraint {
@@ -9,6 +11,8 @@ export class BooleanConstraint extends Constraint {
   public lhsRaw: Expression | SVar | number | undefined;
   public rhsRaw: Expression | SVar | number | undefined;
   public operator: BinaryOperator | undefined;
+  public operands: { lhs: CachedOperand; rhs: CachedOperand } | undefined;
+  public negated = false;
   constructor(
     engine: SeEngine,
     ctx?: Ctx,
@@ -26,8 +30,10 @@ export class BooleanConstraint extends Constraint {
     if (!ctx || !lhsRaw || !rhsRaw || !operator) {
       return;
     }
+    const start = tracer.begin();
     const lhs = convertToSVarOrValue(lhsRaw, ctx);
     const rhs = convertToSVarOrValue(rhsRaw, ctx);
+    this.operands = { lhs: toCachedOperand(lhs), rhs: toCachedOperand(rhs) };
     if ((lhs as SVar) != undefined || (rhs as SVar) != undefined) {
       const var1 = (lhs as SVar) ?? (rhs as SVar);
       let var2: number | Arith<'main'>;
@@ -54,14 +60,69 @@ export class BooleanConstraint extends Constraint {
         'Neither side of if comparison was a symbolic variable. This branch is not currently implemented!',
       );
     }
+    tracer.accumulate('constraint', start);
+  }
+
+  // Rebuild a constraint read from a cache. Its variables must be in ctx.
+  public static fromCached(
+    engine: SeEngine,
+    ctx: Ctx,
+    cached: CachedConstraint,
+  ) {
+    const constraint = new BooleanConstraint(
+      engine,
+      ctx,
+      fromCachedOperand(cached.lhs, ctx),
+      fromCachedOperand(cached.rhs, ctx),
+      cached.op as BinaryOperator,
+      cached.type,
+    );
+    return cached.negated ? constraint.negate() : constraint;
   }
 
   public negate() {
     let newConstraint = new BooleanConstraint(this.engine);
     const constraint = this.constraint as Bool<'main'>;
     newConstraint.constraint = constraint.not();
+    newConstraint.operator = this.operator;
+    newConstraint.operands = this.operands;
+    newConstraint.negated = !this.negated;
     return newConstraint;
   }
+
+  public toCached(): CachedConstraint | undefined {
+    if (!this.operator || !this.operands) return undefined;
+    return {
+      type: this.type,
+      op: this.operator,
+      lhs: this.operands.lhs,
+      rhs: this.operands.rhs,
+      negated: this.negated,
+    };
+  }
+
+  public variables() {
+    if (!this.operands) return undefined;
+    const { lhs, rhs } = this.operands;
+    const names: string[] = [];
+    if ('var' in lhs) names.push(lhs.var);
+    if ('var' in rhs) names.push(rhs.var);
+    return names;
+  }
+}
+
+function toCachedOperand(operand: SVar | any): CachedOperand {
+  return operand instanceof SVar ? { var: operand.name } : { value: operand };
+}
+
+function fromCachedOperand(operand: CachedOperand, ctx: Ctx) {
+  if ('var' in operand) {
+    const svar = ctx.searchSstore(operand.var);
+    if (!svar) throw Error(`${operand.var} is not in the cached sstore`);
+    return svar;
+  }
+  // As a literal, so a value of 0 is not taken for a missing operand.
+  return { type: 'Literal', value: operand.value } as Expression;
 }
 
 function convertToSVarOrValue(expr: Expression | SVar | number, ctx: Ctx) {
@@ -1,8 +1,12 @@
 import { Bool } from 'z3-solver';
+import { CachedConstraint } from '../cache/cache.js';
 import { SeEngine } from '../se.js';
-import { SVar } from '../symbolicVars/svars.js';
 
 export abstract class Constraint {
+  private static nextId = 0;
+  public id: number;
+  // First symbolic variable of the constraint, see getConstraintSymbolicVar.
+  public symbolicVar: string | undefined;
   public engine: SeEngine;
   public constraint: Bool<'main'> | undefined;
   public type: 'boolean' | 'assignment';
@@ -10,14 +14,21 @@ export abstract class Constraint {
   constructor(engine: SeEngine, type: 'boolean' | 'assignment') {
     this.engine = engine;
     this.type = type;
-  }
-
-  public reconstruct(engine: SeEngine, svars: SVar[]) {
-    this.engine = engine;
-    console.log(this.constraint?.sexpr);
+    this.id = Constraint.nextId++;
   }
 
   public getType() {
     return this.type;
   }
+
+  // The solver-relevant parts of the constraint, as written to the cache.
+  public toCached(): CachedConstraint | undefined {
+    return undefined;
+  }
+
+  // Names of the symbolic variables the constraint relates, or undefined if
+  // they are not known.
+  public variables(): string[] | undefined {
+    return undefined;
+  }
 }
@@ -1,5 +1,5 @@
-import { Directive, IfStatement, ModuleDeclaration, Statement } from 'estree';
-import { ASTBranch, areObjectsEqual, createAST } from './utils/ast.js';
+import { Directive, ModuleDeclaration, Statement } from 'estree';
+import { createAST, structuralHash } from './utils/ast.js';
 import { appendToFile, readFileContents, removeFile } from './utils/io.js';
 
 export interface Diff extends Directive {
@@ -9,18 +9,10 @@ export interface Diff extends Directive {
   ];
 }
 
-function areBranchesEqual(
-  a: Directive | Statement | ModuleDeclaration,
-  b: Directive | Statement | ModuleDeclaration,
-) {
-  if (a.type === 'IfStatement' && b.type == 'IfStatement') {
-    const { consequent: aConsequent, alternate: aAlternate, ...aMod } = a;
-    const { consequent: bConsequent, alternate: bAlternate, ...bMod } = b;
-    return areObjectsEqual(aMod, bMod);
-  } else {
-    return areObjectsEqual(a, b);
-  }
-}
+type Line = Directive | Statement | ModuleDeclaration;
+
+// Stands in for the missing side of a statement that was added or removed.
+const EMPTY: Statement = { type: 'EmptyStatement' };
 
 async function main() {
   /* -------------------------------- */
@@ -57,9 +49,9 @@ async function main() {
   const astB = createAST(fileBContents);
 
   /* ------------------------------------------------------- */
-  /* create a new AST with a Diff object on first difference */
+  /* create a new AST with a Diff object on every difference */
   /* ------------------------------------------------------- */
-  const diff = checkBranchDiff(astA.body, astB.body);
+  const diff = diffBlock(astA.body, astB.body);
   /* ------------------------------------------------*/
   /* write the difference ast json to specified file */
   /* ------------------------------------------------*/
@@ -69,107 +61,108 @@ async function main() {
   }
 }
 
-function checkBranchDiff(
-  branchA: (Directive | Statement | ModuleDeclaration)[],
-  branchB: (Directive | Statement | ModuleDeclaration)[],
-) {
-  for (let i = 0; i < Math.min(branchA.length, branchB.length); i++) {
-    if (!areBranchesEqual(branchA[i], branchB[i])) {
-      branchA[i] = { statements: [branchA[i], branchB[i]] } as Diff;
-      return branchA;
-    } else {
-      // the lines are equal. Check if there is a branch fork.
-      if (branchA[i].type === 'IfStatement') {
-        const lineA = branchA[i] as IfStatement;
-        const lineB = branchB[i] as IfStatement;
-        const linesAfterConditionalBlockA = branchA.slice(
-          branchA.findIndex((l) => l === lineA) + 1,
-        );
-        const linesAfterConditionalBlockB = branchA.slice(
-          branchB.findIndex((l) => l === lineB) + 1,
-        );
-        let astBranchA: ASTBranch = { left: [], right: [] };
-        let astBranchB: ASTBranch = { left: [], right: [] };
-        // populate astBranchA
-        if (lineA.consequent.type === 'BlockStatement')
-          astBranchA.left = (
-            lineA.consequent.body as (
-              | Directive
-              | Statement
-              | ModuleDeclaration
-            )[]
-          ).concat(linesAfterConditionalBlockA);
-        else
-          astBranchA.left = [
-            lineA.consequent as Directive | Statement | ModuleDeclaration,
-          ].concat(linesAfterConditionalBlockA);
-        if (lineA.alternate) {
-          if (lineA.alternate.type === 'BlockStatement')
-            astBranchA.right = (
-              lineA.alternate.body as (
-                | Directive
-                | Statement
-                | ModuleDeclaration
-              )[]
-            ).concat(linesAfterConditionalBlockA);
-          else
-            astBranchA.right = [
-              lineA.alternate as Directive | Statement | ModuleDeclaration,
-            ].concat(linesAfterConditionalBlockA);
-        }
-        // populate astBranchB
-        if (lineB.consequent.type === 'BlockStatement')
-          astBranchB.left = (
-            lineB.consequent.body as (
-              | Directive
-              | Statement
-              | ModuleDeclaration
-            )[]
-          ).concat(linesAfterConditionalBlockB);
-        else
-          astBranchB.left = [
-            lineB.consequent as Directive | Statement | ModuleDeclaration,
-          ].concat(linesAfterConditionalBlockB);
-        if (lineB.alternate) {
-          if (lineB.alternate.type === 'BlockStatement')
-            astBranchB.right = (
-              lineB.alternate.body as (
-                | Directive
-                | Statement
-                | ModuleDeclaration
-              )[]
-            ).concat(linesAfterConditionalBlockB);
-          else
-            astBranchB.right = [
-              lineB.alternate as Directive | Statement | ModuleDeclaration,
-            ].concat(linesAfterConditionalBlockB);
-        }
-        // explore left and right branches
-        if (lineA.consequent.type === 'BlockStatement')
-          lineA.consequent.body = checkBranchDiff(
-            astBranchA.left,
-            astBranchB.left,
-          ) as Statement[];
-        else
-          lineA.consequent = checkBranchDiff(
-            astBranchA.left,
-            astBranchB.left,
-          )[0] as Statement;
-        if (lineA.alternate && lineA.alternate.type === 'BlockStatement')
-          lineA.alternate.body = checkBranchDiff(
-            astBranchA.right,
-            astBranchB.right,
-          ) as Statement[];
-        else
-          lineA.alternate = checkBranchDiff(
-            astBranchA.right,
-            astBranchB.right,
-          )[0] as Statement;
-        break;
-      }
-    }
+// Key statements are aligned by. Conditionals with the same test (and both with
+// or both without an alternate) are aligned even if their branches differ, so
+// the branches are diffed instead of the whole conditional being changed.
+// Subtree hashes are computed once, so comparing a statement is one lookup
+// however deep it is.
+function alignmentKey(line: Line) {
+  return line.type === 'IfStatement'
+    ? `if ${structuralHash(line.test)} ${line.alternate ? 2 : 1}`
+    : structuralHash(line);
+}
+
+// A's lines with every line that differs from B replaced by a Diff, and the
+// branches of aligned conditionals diffed in turn. The blocks are aligned on
+// their longest common subsequence of keys, so a line added to or removed from
+// B only changes that line. Unaligned lines between two aligned ones are
+// paired up in order.
+function diffBlock(a: Line[], b: Line[]): Line[] {
+  if (structuralHash(a) === structuralHash(b)) return a;
+  const keysA = a.map(alignmentKey);
+  const keysB = b.map(alignmentKey);
+  // Lines before the first and after the last difference need no table.
+  let start = 0;
+  while (
+    start < a.length &&
+    start < b.length &&
+    keysA[start] === keysB[start]
+  )
+    start++;
+  let endA = a.length;
+  let endB = b.length;
+  while (endA > start && endB > start && keysA[endA - 1] === keysB[endB - 1]) {
+    endA--;
+    endB--;
+  }
+  // common[i][j]: length of the longest common subsequence of
+  // keysA[start + i..endA) and keysB[start + j..endB).
+  const n = endA - start;
+  const m = endB - start;
+  const common: number[][] = [];
+  for (let i = n; i >= 0; i--) {
+    common[i] = [];
+    for (let j = m; j >= 0; j--)
+      common[i][j] =
+        i === n || j === m
+          ? 0
+          : keysA[start + i] === keysB[start + j]
+            ? common[i + 1][j + 1] + 1
+            : Math.max(common[i + 1][j], common[i][j + 1]);
+  }
+
+  const lines: Line[] = [];
+  for (let i = 0; i < start; i++) lines.push(diffLine(a[i], b[i]));
+  let removed: Line[] = [];
+  let added: Line[] = [];
+  const flush = () => {
+    for (let k = 0; k < Math.max(removed.length, added.length); k++)
+      lines.push({
+        statements: [removed[k] ?? EMPTY, added[k] ?? EMPTY],
+      } as Diff);
+    removed = [];
+    added = [];
+  };
+  for (let i = 0, j = 0; i < n || j < m; ) {
+    if (i < n && j < m && keysA[start + i] === keysB[start + j]) {
+      flush();
+      lines.push(diffLine(a[start + i], b[start + j]));
+      i++;
+      j++;
+    } else if (j === m || (i < n && common[i + 1][j] >= common[i][j + 1]))
+      removed.push(a[start + i++]);
+    else added.push(b[start + j++]);
   }
-  return branchA;
+  flush();
+  for (let i = 0; i < a.length - endA; i++)
+    lines.push(diffLine(a[endA + i], b[endB + i]));
+  return lines;
+}
+
+// Diff of two aligned lines: A's line if they are equal, otherwise two
+// conditionals with the same test, whose branches are diffed.
+function diffLine(a: Line, b: Line): Line {
+  if (structuralHash(a) === structuralHash(b)) return a;
+  if (a.type !== 'IfStatement' || b.type !== 'IfStatement')
+    return { statements: [a, b] } as Diff;
+  return {
+    ...a,
+    consequent: diffBranch(a.consequent, b.consequent),
+    alternate: a.alternate && diffBranch(a.alternate, b.alternate!),
+  };
+}
+
+function diffBranch(a: Statement, b: Statement): Statement {
+  if (structuralHash(a) === structuralHash(b)) return a;
+  const body = diffBlock(blockBody(a), blockBody(b));
+  if (a.type === 'BlockStatement') return { ...a, body: body as Statement[] };
+  if (b.type !== 'BlockStatement' && body.length === 1)
+    return body[0] as Statement;
+  return { type: 'BlockStatement', body: body as Statement[] };
+}
+
+function blockBody(statement: Statement): Line[] {
+  return statement.type === 'BlockStatement' ? statement.body : [statement];
 }
 
 main();
@@ -1,12 +1,65 @@
 import { Directive, IfStatement, ModuleDeclaration, Statement } from 'estree';
+import net from 'net';
+import { performance } from 'perf_hooks';
+import readline from 'readline';
+import { Readable, Writable } from 'stream';
 import { Context, init } from 'z3-solver';
+import { CachedStores, openCache } from './cache/cache.js';
 import { Diff } from './createDiffAST.js';
-import { Ctx, SeEngine } from './se.js';
-import { createAST } from './utils/ast.js';
-import { Cache, readCache, readDiff, readFileContents } from './utils/io.js';
+import { exploreParallel } from './parallel/parallelExplorer.js';
+import { Ctx, Seed, SeEngine } from './se.js';
+import { SEARCH_STRATEGIES, SearchStrategy } from './search/worklist.js';
+import { SolverCache } from './solver/solverCache.js';
+import {
+  createAST,
+  currentLine,
+  Cursor,
+  cursorAt,
+  enterBranch,
+  nextLine,
+} from './utils/ast.js';
+import {
+  readDiff,
+  readFileContents,
+  removeFile,
+  TRACE_FILE,
+} from './utils/io.js';
+import { tracer } from './utils/trace.js';
 
 const delay = (ms: number) => new Promise((res) => setTimeout(res, ms));
 
+// A single analysis: either a whole program (file) or a targeted analysis of a
+// diff against the cache of a previous run (cache + diffFile).
+interface AnalysisJob {
+  id?: string | number;
+  file?: string;
+  cache?: string;
+  diffFile?: string;
+  // Write the cache of the program, or for a targeted analysis, patch the
+  // cache it read so it holds the program after the diff.
+  writeCache?: boolean;
+  outDir?: string;
+  incremental?: boolean;
+  threads?: number;
+  // File of solver verdicts shared between runs, e.g. the base and targeted
+  // analysis of a program, and the number of entries it is bounded to.
+  solverCache?: string;
+  solverCacheSize?: number;
+  // Solve path conditions whole instead of as independent slices.
+  noSlicing?: boolean;
+  // Pending states kept in memory before the oldest are spilled to disk.
+  maxPending?: number;
+  // Search strategy (default dfs), the seed of random-path search, and the
+  // budget after which exploration stops: seconds and/or solver checks.
+  search?: SearchStrategy;
+  seed?: number;
+  timeBudget?: number;
+  solverBudget?: number;
+  // Record where the run spends its time, written to trace.json in its result
+  // directory.
+  trace?: boolean;
+}
+
 async function main() {
   /* -------------------------------- */
   /* Read file contents and creat AST */
@@ -18,100 +71,334 @@ async function main() {
   let cachePath = args.find((arg) => arg.startsWith('--cache='));
   let diffPath = args.find((arg) => arg.startsWith('--diffFile='));
   let writeCacheFlag = args.find((arg) => arg.startsWith('--writecache'));
+  let outDir = args.find((arg) => arg.startsWith('--outDir='));
+  let incrementalFlag = args.find((arg) => arg.startsWith('--incremental'));
+  let threads = args.find((arg) => arg.startsWith('--threads='));
+  let solverCachePath = args.find((arg) => arg.startsWith('--solverCache='));
+  let solverCacheSize = args.find((arg) =>
+    arg.startsWith('--solverCacheSize='),
+  );
+  let noSlicingFlag = args.find((arg) => arg.startsWith('--noSlicing'));
+  let maxPending = args.find((arg) => arg.startsWith('--maxPending='));
+  let search = args.find((arg) => arg.startsWith('--search='));
+  let seed = args.find((arg) => arg.startsWith('--seed='));
+  let timeBudget = args.find((arg) => arg.startsWith('--timeBudget='));
+  let solverBudget = args.find((arg) => arg.startsWith('--solverBudget='));
+  let traceFlag = args.find((arg) => arg.startsWith('--trace'));
+  let workerFlag = args.find((arg) => arg.startsWith('--worker'));
+  let socketPath = args.find((arg) => arg.startsWith('--socket='));
 
+  if (workerFlag) {
+    await runWorker(socketPath?.split('=')[1]);
+    return;
+  }
   if (!diffFlag && !filePath) {
-    console.log('usage: npm run jse -- --file="path/to/file"');
+    console.log(
+      'usage: npm run jse -- --file="path/to/file" [--writecache] [--incremental] [--threads=N] [--outDir="path/to/resultDir"] [--solverCache="path/to/solverCache"] [--solverCacheSize=N] [--noSlicing] [--maxPending=N] [--search=dfs|bfs|random-path|coverage] [--seed=N] [--timeBudget=seconds] [--solverBudget=N] [--trace]',
+    );
+    console.log(
+      '       npm run jse -- --worker [--socket="path/to/socket"]  (reads newline-delimited JSON jobs)',
+    );
     return;
   }
   if (diffFlag && !(cachePath && diffPath)) {
     console.log(
-      'usage: npm run jse -- --diff --cache="path/to/cacheFile" --diffFile="path/to/diffFile"',
+      'usage: npm run jse -- --diff --cache="path/to/cacheFile" --diffFile="path/to/diffFile" [--writecache]',
     );
     return;
   }
-  let writeCache = false;
-  if (writeCacheFlag) writeCache = true;
+  const job: AnalysisJob = {
+    writeCache: writeCacheFlag ? true : false,
+    outDir: outDir?.split('=')[1],
+    incremental: incrementalFlag ? true : false,
+    threads: threads ? parseInt(threads.split('=')[1], 10) : 1,
+    solverCache: solverCachePath?.split('=')[1],
+    solverCacheSize: solverCacheSize
+      ? parseInt(solverCacheSize.split('=')[1], 10)
+      : undefined,
+    noSlicing: noSlicingFlag ? true : false,
+    maxPending: maxPending
+      ? parseInt(maxPending.split('=')[1], 10)
+      : undefined,
+    search: search?.split('=')[1] as SearchStrategy | undefined,
+    seed: seed ? parseInt(seed.split('=')[1], 10) : undefined,
+    timeBudget: timeBudget ? parseFloat(timeBudget.split('=')[1]) : undefined,
+    solverBudget: solverBudget
+      ? parseInt(solverBudget.split('=')[1], 10)
+      : undefined,
+    trace: traceFlag ? true : false,
+  };
+  if (!diffFlag) job.file = filePath!.split('=')[1];
+  else {
+    job.cache = cachePath!.split('=')[1];
+    job.diffFile = diffPath!.split('=')[1];
+  }
+
+  if (job.trace) tracer.start();
+  const start = tracer.begin();
+  const { Z3, em } = await initZ3();
+  tracer.end('z3.init', start);
+  await analyse(job, Z3, em);
+  process.exit();
+}
+
+async function initZ3() {
+  const { Context, em } = await init();
+  // @ts-ignore
+  const Z3: Context = new Context('main');
+  return { Z3, em };
+}
+
+// Runs one analysis job on an already initialised Z3 context and returns the
+// directory its results were written to, or undefined if the program could not
+// be read.
+async function analyse(job: AnalysisJob, Z3: Context, em: any) {
+  // In a worker, Z3 was initialised before the job arrived, so only the job
+  // itself is traced.
+  if (job.trace && !tracer.enabled) tracer.start();
+  let writeDir;
+  try {
+    const start = tracer.begin();
+    writeDir = await analyseProgram(job, Z3, em);
+    tracer.end('analyse', start);
+  } finally {
+    if (job.trace && writeDir)
+      tracer.write(`${writeDir}/${TRACE_FILE}`, { job });
+    else tracer.stop();
+  }
+  return writeDir;
+}
 
+async function analyseProgram(job: AnalysisJob, Z3: Context, em: any) {
+  const search = job.search ?? 'dfs';
+  if (SEARCH_STRATEGIES.indexOf(search) === -1)
+    throw Error(`unknown search strategy ${search}`);
   let ast: (Directive | Statement | ModuleDeclaration)[] | undefined;
-  let ctx: Ctx | undefined;
-  if (!diffFlag) {
-    filePath = filePath!;
+  let regions: DiffRegion[] | undefined;
+  let cached: (CachedStores | undefined)[] = [];
+  if (!job.diffFile) {
     // Normal analysis of program
-    filePath = filePath.split('=')[1];
-    const fileContents = await readFileContents(filePath);
-    if (!fileContents) return;
+    const fileContents = await readFileContents(job.file!);
+    if (!fileContents) return undefined;
+    const start = tracer.begin();
     ast = createAST(fileContents).body;
+    tracer.end('parse', start);
   } else {
-    cachePath = cachePath!;
-    diffPath = diffPath!;
     // Differential analysis of program
-    cachePath = cachePath.split('=')[1];
-    diffPath = diffPath.split('=')[1];
+    if (job.threads && job.threads > 1)
+      throw Error('--threads is not supported with --diff');
     // Read files and parse data
-    const cache = readCache(cachePath);
-    const diff = readDiff(diffPath);
-    // Get branch containing first diff
-    const analysisBranch = getBranchWithDiff(diff);
-    // Get the corresponding constraint and symbolic stores
-    const cacheLine = searchCache(
-      analysisBranch.lastConditional as IfStatement,
-      cache,
-    );
-    // construct context class
-    ctx = new Ctx(analysisBranch.diff, new Set(cacheLine.cstore), undefined);
-    ctx = undefined;
-    ast = analysisBranch.diff;
+    let start = tracer.begin();
+    const cache = openCache(job.cache!);
+    ast = readDiff(job.diffFile);
+    tracer.end('diff.read', start);
+    // Every region of the program with a change, and the constraint and
+    // symbolic stores the previous run had at its start, all from one read of
+    // the cache.
+    regions = findDiffRegions(ast);
+    start = tracer.begin();
+    try {
+      cached = regions.map(({ steps }) =>
+        cache.find(
+          steps.map(({ conditional, side }) => ({
+            test: (conditional as IfStatement).test,
+            side,
+          })),
+        ),
+      );
+    } finally {
+      cache.close();
+    }
+    tracer.end('cache.lookup', start, { regions: regions.length });
   }
   /* ------------------------ */
   /* Start symbolic execution */
   /* ------------------------ */
 
-  const { Context, em } = await init();
-  // @ts-ignore
-  const Z3: Context = new Context('main');
-  const engine = new SeEngine(ast, 'dfs', Z3, writeCache);
-  await engine.start(ctx, em);
-  while (!engine.finished()) {
-    await delay(1);
+  if (job.threads && job.threads > 1) {
+    if (job.writeCache)
+      throw Error('--writecache is not supported with --threads');
+    if (job.solverCache)
+      throw Error('--solverCache is not supported with --threads');
+    if (search !== 'dfs')
+      throw Error('--search is not supported with --threads');
+    if (job.timeBudget !== undefined || job.solverBudget !== undefined)
+      throw Error('budgets are not supported with --threads');
+    return await exploreParallel(ast, job.threads, {
+      writeDir: job.outDir,
+      incremental: job.incremental,
+      maxPending: job.maxPending,
+    });
   }
-  process.exit();
+  const solverCache = job.solverCache
+    ? new SolverCache(job.solverCache, job.solverCacheSize)
+    : undefined;
+  try {
+    const engine = new SeEngine(ast, search, Z3, {
+      writeCache: job.writeCache && !job.diffFile,
+      patchCache: job.writeCache && job.diffFile ? job.cache : undefined,
+      writeDir: job.outDir,
+      incremental: job.incremental,
+      solverCache,
+      slicing: !job.noSlicing,
+      maxPending: job.maxPending,
+      budget: { time: job.timeBudget, solverCalls: job.solverBudget },
+      seed: job.seed,
+    });
+    let seeds: Seed[] | undefined;
+    if (regions) {
+      // A region the cache has no state for (e.g. one the run that wrote it
+      // did not reach) is reached by running the program along its path
+      // instead. Its states cannot be added to a patched cache, which then
+      // has no states for it either.
+      seeds = regions.map(({ steps, pc }, i) => ({
+        steps,
+        ctx: cached[i] && Ctx.fromCached(engine, cached[i]!, pc),
+        cached: cached[i],
+      }));
+      const resumed = seeds.filter(({ ctx }) => ctx).length;
+      tracer.count('regions.resumed', resumed);
+      tracer.count('regions.rebuilt', seeds.length - resumed);
+    }
+    await engine.start(seeds, em);
+    while (!engine.finished()) {
+      await delay(1);
+    }
+    return engine.writeDir;
+  } finally {
+    solverCache?.close();
+  }
+}
+
+// Long-lived worker: Z3 is initialised once and newline-delimited JSON jobs are
+// read from stdin (or from connections to a local socket). One JSON result line
+// is written back per job, in the order the jobs were received.
+async function runWorker(socketPath?: string) {
+  const { Z3, em } = await initZ3();
+  // Results are the only thing written to the output stream, so the engine's
+  // own logging goes to stderr.
+  console.log = console.error;
+  // Jobs share one Z3 context, so they are run one at a time.
+  let queue: Promise<void> = Promise.resolve();
+
+  const serve = (input: Readable, output: Writable) => {
+    const rl = readline.createInterface({ input, crlfDelay: Infinity });
+    rl.on('line', (line) => {
+      if (!line.trim()) return;
+      queue = queue.then(async () => {
+        output.write(JSON.stringify(await runJob(line, Z3, em)) + '\n');
+      });
+    });
+    return rl;
+  };
+
+  if (socketPath) {
+    removeFile(socketPath);
+    net
+      .createServer((socket) => serve(socket, socket))
+      .listen(socketPath, () => {
+        process.stdout.write(JSON.stringify({ ready: true }) + '\n');
+      });
+    return;
+  }
+  process.stdout.write(JSON.stringify({ ready: true }) + '\n');
+  serve(process.stdin, process.stdout).on('close', async () => {
+    await queue;
+    process.exit();
+  });
 }
 
-function getBranchWithDiff(
+async function runJob(line: string, Z3: Context, em: any) {
+  let job: AnalysisJob = {};
+  const start = performance.now();
+  try {
+    job = JSON.parse(line) as AnalysisJob;
+    if (!job.file && !(job.cache && job.diffFile))
+      throw Error('a job needs either "file" or "cache" and "diffFile"');
+    const writeDir = await analyse(job, Z3, em);
+    if (!writeDir) throw Error(`${job.file} could not be read`);
+    return {
+      id: job.id,
+      status: 'ok',
+      time: (performance.now() - start) / 1000,
+      writeDir,
+    };
+  } catch (e: any) {
+    return {
+      id: job.id,
+      status: 'error',
+      time: (performance.now() - start) / 1000,
+      error: String(e?.message ?? e),
+    };
+  }
+}
+
+// A part of a diff AST with changes in it: the forks on the path to it and
+// the statement it starts at.
+interface DiffRegion {
+  steps: { conditional: Statement; side: number }[];
+  pc: Cursor | undefined;
+}
+
+// The regions of a diff AST, in the order a DFS reaches them. A path is split
+// at every fork before its first change, following only the branches with a
+// change in them, so each region starts at the deepest state the previous run
+// shares with this one.
+function findDiffRegions(
   diff: (Directive | Statement | ModuleDeclaration)[],
-  lastConditional?: Statement,
-): {
-  diff: (Directive | Statement | ModuleDeclaration)[];
-  lastConditional: Statement | undefined;
-} {
-  for (let line of diff) {
-    if (line.type === 'IfStatement') {
-      line = line as IfStatement;
-      const result = getBranchWithDiff(
-        line.consequent.type === 'BlockStatement'
-          ? line.consequent.body
-          : [line.consequent],
-        line,
-      );
-      if (result) return result;
-    }
-    if ((line as Diff).statements) {
-      return { diff, lastConditional };
+) {
+  const regions: DiffRegion[] = [];
+  const walk = (pc: Cursor | undefined, steps: DiffRegion['steps']) => {
+    for (let cursor = pc; cursor; cursor = nextLine(cursor)) {
+      const line = currentLine(cursor);
+      if ((line as Diff).statements) {
+        regions.push({ steps, pc });
+        return;
+      }
+      // As in the engine, a throw ends the path.
+      if (line.type === 'ThrowStatement') return;
+      if (line.type !== 'IfStatement') continue;
+      // Like the engine, a conditional without an alternate ends the path of
+      // its right branch.
+      const branches = [
+        enterBranch(line.consequent, nextLine(cursor)),
+        line.alternate
+          ? enterBranch(line.alternate, nextLine(cursor))
+          : undefined,
+      ];
+      branches.forEach((branch, side) => {
+        if (hasDiff(branch))
+          walk(branch, steps.concat({ conditional: line, side }));
+      });
+      return;
     }
+  };
+  walk(cursorAt(diff), []);
+  return regions;
+}
+
+// Whether a change is run from cursor on, before any throw ends the path.
+function hasDiff(cursor: Cursor | undefined) {
+  for (let c = cursor; c; c = nextLine(c)) {
+    const line = currentLine(c);
+    if (containsDiff(line)) return true;
+    if (line.type === 'ThrowStatement') return false;
   }
-  return { diff, lastConditional };
+  return false;
 }
 
-function searchCache(lastConditional: IfStatement | undefined, cache: Cache[]) {
-  for (const cacheLine of cache) {
-    if (
-      JSON.stringify((cacheLine.lastConditional as IfStatement)?.test) ===
-      JSON.stringify(lastConditional?.test)
-    ) {
-      return cacheLine;
-    }
+const diffs = new WeakMap<object, boolean>();
+
+function containsDiff(node: any): boolean {
+  if (!node || typeof node !== 'object') return false;
+  let result = diffs.get(node);
+  if (result === undefined) {
+    result =
+      (node as Diff).statements !== undefined ||
+      Object.keys(node).some((key) => containsDiff(node[key]));
+    diffs.set(node, result);
   }
-  throw Error('correct cache line could not be found.');
+  return result;
 }
 
 main();
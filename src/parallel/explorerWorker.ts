@@ -0,0 +1,44 @@
+import { Directive, ModuleDeclaration, Statement } from 'estree';
+import { parentPort, workerData } from 'worker_threads';
+import { Context, init } from 'z3-solver';
+import { SeEngine } from '../se.js';
+import { FromWorker, ToWorker } from './parallelExplorer.js';
+
+// Worker thread of the parallel explorer. It owns its own Z3 context and
+// explores the subtrees it is sent, posting each result back to the main thread
+// and donating pending states when asked to.
+async function main() {
+  const {
+    ast,
+    incremental,
+    maxPending,
+  }: {
+    ast: (Directive | Statement | ModuleDeclaration)[];
+    incremental: boolean;
+    maxPending?: number;
+  } = workerData;
+  const { Context } = await init();
+  // @ts-ignore
+  const Z3: Context = new Context('main');
+  const post = (message: FromWorker) => parentPort!.postMessage(message);
+  const engine = new SeEngine(ast, 'dfs', Z3, {
+    incremental,
+    maxPending,
+    onResult: (result, path) => post({ type: 'result', path, result }),
+  });
+
+  // Steal requests are answered between solver calls of a running exploration.
+  parentPort!.on('message', async (message: ToWorker) => {
+    if (message.type === 'explore') {
+      await engine.explore(message.prefix);
+      post({ type: 'done' });
+    } else if (message.type === 'steal') {
+      post({ type: 'donation', prefix: engine.donate() });
+    } else {
+      process.exit();
+    }
+  });
+  post({ type: 'done' });
+}
+
+main();
@@ -0,0 +1,162 @@
+import { Directive, ModuleDeclaration, Statement } from 'estree';
+import { Worker } from 'worker_threads';
+import { seResult } from '../se.js';
+import {
+  createResultDirectory,
+  NdjsonWriter,
+  RESULTS_FILE,
+} from '../utils/io.js';
+
+const STEAL_RETRY_MS = 2;
+
+// Messages exchanged with explorerWorker.js.
+export type ToWorker =
+  | { type: 'explore'; prefix: number[] }
+  | { type: 'steal' }
+  | { type: 'exit' };
+
+export type FromWorker =
+  | { type: 'result'; path: number[]; result: seResult }
+  | { type: 'donation'; prefix: number[] | undefined }
+  | { type: 'done' };
+
+// Explores the program on numThreads worker threads, each with its own Z3
+// context. The DFS frontier is handed out as branch-choice prefixes; whenever a
+// worker is idle, the busy workers are asked to donate their shallowest pending
+// state. Results are written to the result file of the result directory, whose
+// path is returned, in the order a sequential DFS would produce them. Each
+// worker sends the results of a subtree in that order, so a result is written
+// as soon as no subtree still being explored or queued can produce an earlier
+// one; only results that arrive ahead of such a subtree are held back.
+export async function exploreParallel(
+  ast: (Directive | Statement | ModuleDeclaration)[],
+  numThreads: number,
+  options: {
+    writeDir?: string;
+    incremental?: boolean;
+    maxPending?: number;
+  } = {},
+) {
+  const writeDir = createResultDirectory(options.writeDir);
+  const resultWriter = new NdjsonWriter(`${writeDir}/${RESULTS_FILE}`);
+  // Results waiting for earlier ones, sorted by path.
+  const held: { path: number[]; result: seResult }[] = [];
+  // The earliest path each busy worker can still produce a result for: the
+  // prefix it was sent, then the path of its last result.
+  const explored = new Map<Worker, number[]>();
+  const queue: number[][] = [[]];
+  const idle: Worker[] = [];
+  const busy = new Set<Worker>();
+  const stealing = new Set<Worker>();
+  const workers: Worker[] = [];
+
+  const send = (worker: Worker, message: ToWorker) =>
+    worker.postMessage(message);
+
+  // Write the held results that no queued or running subtree can precede.
+  const release = () => {
+    let bound: number[] | undefined;
+    for (const path of queue.concat(Array.from(explored.values())))
+      if (!bound || comparePaths(path, bound) < 0) bound = path;
+    while (
+      held.length > 0 &&
+      (!bound || comparePaths(held[0].path, bound) <= 0)
+    )
+      resultWriter.write(held.shift()!.result);
+  };
+
+  const hold = (path: number[], result: seResult) => {
+    let lo = 0;
+    let hi = held.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (comparePaths(held[mid].path, path) < 0) lo = mid + 1;
+      else hi = mid;
+    }
+    held.splice(lo, 0, { path, result });
+  };
+
+  try {
+    await new Promise<void>((resolve, reject) => {
+      let retryScheduled = false;
+
+      const dispatch = () => {
+        while (idle.length > 0 && queue.length > 0) {
+          const worker = idle.pop()!;
+          const prefix = queue.shift()!;
+          busy.add(worker);
+          explored.set(worker, prefix);
+          send(worker, { type: 'explore', prefix });
+        }
+        if (busy.size === 0 && queue.length === 0) {
+          resolve();
+          return;
+        }
+        // Ask as many busy workers as there are idle ones for work.
+        let wanted = idle.length - stealing.size;
+        for (const worker of busy) {
+          if (wanted <= 0) break;
+          if (stealing.has(worker)) continue;
+          stealing.add(worker);
+          send(worker, { type: 'steal' });
+          wanted--;
+        }
+      };
+
+      for (let i = 0; i < numThreads; i++) {
+        const worker = new Worker(
+          new URL('./explorerWorker.js', import.meta.url),
+          {
+            workerData: {
+              ast,
+              incremental: options.incremental ?? false,
+              maxPending: options.maxPending,
+            },
+          },
+        );
+        workers.push(worker);
+        worker.on('error', reject);
+        worker.on('message', (message: FromWorker) => {
+          if (message.type === 'result') {
+            explored.set(worker, message.path);
+            hold(message.path, message.result);
+            release();
+          } else if (message.type === 'done') {
+            busy.delete(worker);
+            explored.delete(worker);
+            idle.push(worker);
+            release();
+            dispatch();
+          } else if (message.type === 'donation') {
+            stealing.delete(worker);
+            if (message.prefix) {
+              queue.push(message.prefix);
+              dispatch();
+            } else if (!retryScheduled) {
+              // Nothing to steal yet (the worker is between forks); try again
+              // shortly rather than spinning on steal requests.
+              retryScheduled = true;
+              setTimeout(() => {
+                retryScheduled = false;
+                dispatch();
+              }, STEAL_RETRY_MS);
+            }
+          }
+        });
+      }
+    });
+  } finally {
+    resultWriter.close();
+  }
+
+  for (const worker of workers) send(worker, { type: 'exit' });
+  return writeDir;
+}
+
+// A sequential DFS explores the alternate (1) before the consequent (0).
+function comparePaths(a: number[], b: number[]) {
+  for (let i = 0; i < Math.min(a.length, b.length); i++) {
+    if (a[i] !== b[i]) return b[i] - a[i];
+  }
+  return a.length - b.length;
+}
@@ -1,94 +1,198 @@
-import { createWriteStream, existsSync, mkdirSync, rmSync } from 'fs';
+import { existsSync, mkdirSync, rmSync, writeFileSync } from 'fs';
+import { createRandom } from './utils/random.js';
 
 const average = (array: number[]) =>
   array.reduce((a, b) => a + b) / array.length;
 
-const MAX_BRANCH_LENGTH = 50;
-const MAX_CONDITIONALS_PER_BRANCH = Math.floor(Math.random() * 3) + 1;
-const MAX_AST_DEPTH = Math.floor(Math.random() * 5) + 1;
-const NUM_SYMBOLIC_VARS = Math.floor(Math.random() * 10) + 1;
+const DEFAULT_MAX_BRANCH_LENGTH = 50;
+// Candidates drawn per program when generating towards target stats, and how
+// far (relative) a candidate's stats may be from the targets to be accepted.
+const MAX_ATTEMPTS = 50;
+const TARGET_TOLERANCE = 0.1;
 
 const comparators = ['===', '>', '<', '<=', '>='];
-let lines: string[] = [];
-let addedLines: string[] = [];
-const outDir = 'randjs';
-let stats: Stats = {
-  NUM_SYMBOLIC_VARS: NUM_SYMBOLIC_VARS,
-  MAX_BRANCH_LENGTH: MAX_BRANCH_LENGTH,
-  MAX_CONDITIONALS_PER_BRANCH: MAX_CONDITIONALS_PER_BRANCH,
-  MAX_AST_DEPTH: MAX_AST_DEPTH,
-  AVE_BRANCH_LENGTH: 0,
-  AVE_CONDITIONALS_PER_BRANCH: 0,
-  AVE_AST_DEPTH: 0,
-  NUM_BRANCHES: 0,
-  NUM_CONDITIONALS: 0,
-};
-let branchLengthSum = 0;
-let astDepths: number[] = [];
-let conditionalsInBranch: number[] = [];
 
-main();
+interface Targets {
+  NUM_BRANCHES?: number;
+  AVE_AST_DEPTH?: number;
+  AVE_BRANCH_LENGTH?: number;
+}
+
+// Seed of program id in a corpus, independent of which other programs are
+// generated with it.
+function programSeed(seed: number, id: number) {
+  let h = (seed ^ Math.imul(id, 0x9e3779b9)) >>> 0;
+  h = Math.imul(h ^ (h >>> 16), 0x85ebca6b);
+  h = Math.imul(h ^ (h >>> 13), 0xc2b2ae35);
+  return (h ^ (h >>> 16)) >>> 0;
+}
 
 function main() {
   const args = process.argv.slice(2);
-  const makeDiff = args.find((arg) => arg.startsWith('--diff')) ? true : false;
-  let filename = args.find((arg) => arg.startsWith('--writeToFile='));
-  filename = filename ? filename.split('=')[1] : 'ranjs';
-  if (!existsSync(outDir)) mkdirSync(outDir);
-  let filePath = outDir + '/' + filename + '.jse.js';
+  const arg = (name: string) =>
+    args.find((a) => a.startsWith(`--${name}=`))?.split('=')[1];
+  const numberArg = (name: string) =>
+    arg(name) === undefined ? undefined : Number(arg(name));
+  const outDir = arg('outDir') ?? 'randjs';
+  const count = numberArg('count');
+  // Without a seed, one is drawn and written to the stats, so the program can
+  // still be regenerated.
+  const seed = numberArg('seed') ?? Math.floor(Math.random() * 2 ** 32);
+  const targets: Targets = {
+    NUM_BRANCHES: numberArg('numBranches'),
+    AVE_AST_DEPTH: numberArg('aveAstDepth'),
+    AVE_BRANCH_LENGTH: numberArg('aveBranchLength'),
+  };
+  if (!existsSync(outDir)) mkdirSync(outDir, { recursive: true });
 
-  // Create file for JSE
-  lines.push(
-    'import { SymbolicNumber } from "../build/instrumentation/symbols.js";',
-  );
-  for (let i = 0; i < NUM_SYMBOLIC_VARS; i++) {
-    let line = `let sym${i} = new SymbolicNumber();`;
-    lines.push(line);
+  if (count === undefined) {
+    const filename = arg('writeToFile') ?? 'ranjs';
+    const id = parseInt(filename, 10);
+    generate(seed, isNaN(id) ? 0 : id, targets).write(outDir, filename, true);
+    return;
   }
+  // Batch mode: programs start..start+count-1 from one process.
+  const start = numberArg('start') ?? 1;
+  for (let id = start; id < start + count; id++)
+    generate(seed, id, targets).write(outDir, String(id), false);
+}
 
-  const generatedLines = addBranch(
-    Math.floor(Math.random() * MAX_CONDITIONALS_PER_BRANCH) + 1,
-    0,
-  );
-  lines = lines.concat(generatedLines);
-  if (existsSync(filePath)) {
-    console.log(`${filePath} already exists. Overwriting...`);
-    rmSync(filePath);
+// Generate program id of the corpus given by seed. With targets, candidates are
+// drawn until one's stats are within TARGET_TOLERANCE of them, keeping the
+// closest one otherwise. The branch length target is steered towards by
+// scaling MAX_BRANCH_LENGTH with each candidate's error, as the average
+// branch length grows less than linearly with it.
+function generate(seed: number, id: number, targets: Targets) {
+  const random = createRandom(programSeed(seed, id));
+  let maxBranchLength =
+    targets.AVE_BRANCH_LENGTH === undefined
+      ? DEFAULT_MAX_BRANCH_LENGTH
+      : Math.max(1, Math.round(2 * targets.AVE_BRANCH_LENGTH));
+  let best: RandomProgram | undefined;
+  let bestDistance = Infinity;
+  for (let attempt = 0; attempt < MAX_ATTEMPTS; attempt++) {
+    const program = new RandomProgram(random, maxBranchLength);
+    program.stats.SEED = seed;
+    const branchLength = program.stats.AVE_BRANCH_LENGTH;
+    if (targets.AVE_BRANCH_LENGTH !== undefined && branchLength > 0)
+      maxBranchLength = Math.max(
+        1,
+        Math.round(
+          (maxBranchLength * targets.AVE_BRANCH_LENGTH) / branchLength,
+        ),
+      );
+    const distance = program.distance(targets);
+    if (distance < bestDistance) {
+      best = program;
+      bestDistance = distance;
+    }
+    if (bestDistance <= TARGET_TOLERANCE) break;
   }
-  var stream = createWriteStream(filePath, { flags: 'a' });
-  for (let line of lines) {
-    stream.write(line + '\n');
+  return best!;
+}
+
+class RandomProgram {
+  private random: () => number;
+  private MAX_BRANCH_LENGTH: number;
+  private MAX_CONDITIONALS_PER_BRANCH: number;
+  private MAX_AST_DEPTH: number;
+  private NUM_SYMBOLIC_VARS: number;
+  public stats: Stats;
+  public lines: string[] = [];
+  public diffLines: string[] = [];
+  public jazzerLines: string[] = [];
+  private addedLines: string[] = [];
+  private branchLengthSum = 0;
+  private astDepths: number[] = [];
+  private conditionalsInBranch: number[] = [];
+
+  constructor(random: () => number, maxBranchLength: number) {
+    this.random = random;
+    this.MAX_BRANCH_LENGTH = maxBranchLength;
+    this.MAX_CONDITIONALS_PER_BRANCH = Math.floor(random() * 3) + 1;
+    this.MAX_AST_DEPTH = Math.floor(random() * 5) + 1;
+    this.NUM_SYMBOLIC_VARS = Math.floor(random() * 10) + 1;
+    this.stats = {
+      NUM_SYMBOLIC_VARS: this.NUM_SYMBOLIC_VARS,
+      MAX_BRANCH_LENGTH: this.MAX_BRANCH_LENGTH,
+      MAX_CONDITIONALS_PER_BRANCH: this.MAX_CONDITIONALS_PER_BRANCH,
+      MAX_AST_DEPTH: this.MAX_AST_DEPTH,
+      AVE_BRANCH_LENGTH: 0,
+      AVE_CONDITIONALS_PER_BRANCH: 0,
+      AVE_AST_DEPTH: 0,
+      NUM_BRANCHES: 0,
+      NUM_CONDITIONALS: 0,
+    };
+    this.build();
   }
-  stream.end();
-  // create diff file for jazzer
-  let max_iter = 100;
-  while (max_iter > 0) {
-    const idx = Math.floor(Math.random() * lines.length);
-    let line = lines[idx];
-    if (
-      line.includes('const') ||
-      (line.includes('let') && !line.includes('new'))
-    ) {
-      line = line.slice(0, -1) + '0' + line.slice(-1);
-      lines[idx] = line;
-      break;
+
+  // Largest relative difference between the program's stats and the targets.
+  public distance(targets: Targets) {
+    let distance = 0;
+    for (const key of Object.keys(targets) as (keyof Targets)[]) {
+      const target = targets[key];
+      if (target === undefined) continue;
+      distance = Math.max(
+        distance,
+        Math.abs(this.stats[key] - target) / Math.max(Math.abs(target), 1),
+      );
     }
-    max_iter--;
+    return distance;
   }
-  filePath = filePath.slice(0, -3) + '.diff' + filePath.slice(-3);
-  if (existsSync(filePath)) {
-    console.log(`${filePath} already exists. Overwriting...`);
-    rmSync(filePath);
-  }
-  var stream = createWriteStream(filePath, { flags: 'a' });
-  for (let line of lines) {
-    stream.write(line + '\n');
+
+  public write(outDir: string, filename: string, log: boolean) {
+    const writeLines = (filePath: string, lines: string[]) => {
+      if (existsSync(filePath)) {
+        if (log) console.log(`${filePath} already exists. Overwriting...`);
+        rmSync(filePath);
+      }
+      writeFileSync(filePath, lines.map((line) => line + '\n').join(''));
+    };
+    writeLines(`${outDir}/${filename}.jse.js`, this.lines);
+    // diff file for targeted analysis
+    writeLines(`${outDir}/${filename}.jse.diff.js`, this.diffLines);
+    writeLines(`${outDir}/${filename}.jazzer.js`, this.jazzerLines);
+    const statsPath = `${outDir}/${filename}.stats.json`;
+    if (existsSync(statsPath)) rmSync(statsPath);
+    writeFileSync(statsPath, JSON.stringify(this.stats));
   }
-  stream.end();
 
-  // Create file for Jazzer
-  lines = [];
-  lines.push(`export function fuzz(data) {
+  private build() {
+    const random = this.random;
+    // Create file for JSE
+    this.lines.push(
+      'import { SymbolicNumber } from "../build/instrumentation/symbols.js";',
+    );
+    for (let i = 0; i < this.NUM_SYMBOLIC_VARS; i++) {
+      let line = `let sym${i} = new SymbolicNumber();`;
+      this.lines.push(line);
+    }
+
+    const generatedLines = this.addBranch(
+      Math.floor(random() * this.MAX_CONDITIONALS_PER_BRANCH) + 1,
+      0,
+    );
+    this.lines = this.lines.concat(generatedLines);
+
+    // create diff file
+    this.diffLines = this.lines.slice();
+    let max_iter = 100;
+    while (max_iter > 0) {
+      const idx = Math.floor(random() * this.diffLines.length);
+      let line = this.diffLines[idx];
+      if (
+        line.includes('const') ||
+        (line.includes('let') && !line.includes('new'))
+      ) {
+        line = line.slice(0, -1) + '0' + line.slice(-1);
+        this.diffLines[idx] = line;
+        break;
+      }
+      max_iter--;
+    }
+
+    // Create file for Jazzer
+    this.jazzerLines.push(`export function fuzz(data) {
     main(data);
 }
 
@@ -104,159 +208,117 @@ function splitBuffer(buffer, n) {
 
 function main(data){
     const [${Array.from(
-      { length: NUM_SYMBOLIC_VARS },
+      { length: this.NUM_SYMBOLIC_VARS },
       (_, i) => `sym${i}`,
-    ).join(', ')}] = splitBuffer(data, ${NUM_SYMBOLIC_VARS});`);
-  lines = lines.concat(generatedLines);
-  lines.push('}');
-  filePath = outDir + '/' + filename + '.jazzer.js';
-  if (existsSync(filePath)) {
-    console.log(`${filePath} already exists. Overwriting...`);
-    rmSync(filePath);
-  }
-  var stream = createWriteStream(filePath, { flags: 'a' });
-  for (let line of lines) {
-    stream.write(line + '\n');
-  }
-  stream.end();
+    ).join(', ')}] = splitBuffer(data, ${this.NUM_SYMBOLIC_VARS});`);
+    this.jazzerLines = this.jazzerLines.concat(generatedLines);
+    this.jazzerLines.push('}');
 
-  // Write stats
-  stats.AVE_CONDITIONALS_PER_BRANCH = average(conditionalsInBranch);
-  stats.AVE_BRANCH_LENGTH = branchLengthSum / stats.NUM_BRANCHES;
-  stats.AVE_AST_DEPTH = average(astDepths);
-  filePath = outDir + '/' + filename + '.stats.json';
-  if (existsSync(filePath)) {
-    rmSync(filePath);
+    // Stats
+    this.stats.AVE_CONDITIONALS_PER_BRANCH = average(this.conditionalsInBranch);
+    this.stats.AVE_BRANCH_LENGTH =
+      this.branchLengthSum / this.stats.NUM_BRANCHES;
+    this.stats.AVE_AST_DEPTH = average(this.astDepths);
   }
-  var stream = createWriteStream(filePath, { flags: 'a' });
-  stream.write(JSON.stringify(stats));
-  stream.end();
-}
 
-function addBranch(numConditionalsInBranch: number, branchDepth: number) {
-  let conditionalsAdded = 0;
-  astDepths.push(branchDepth);
-  stats.NUM_CONDITIONALS++;
-  stats.NUM_BRANCHES += 2;
-  if (branchDepth === 0) addedLines.push('let num_branches = 0;');
-  addedLines.push(
-    `${'   '.repeat(branchDepth)}if (sym${Math.floor(
-      Math.random() * NUM_SYMBOLIC_VARS,
-    )} ${comparators[Math.floor(Math.random() * comparators.length)]} ${
-      Math.random() < 0 ? '-' : '' // no negatives.
-    }${Math.floor(Math.random() * Number.MAX_SAFE_INTEGER)}) {`,
-  );
-  addedLines.push(`${'   '.repeat(branchDepth + 1)}num_branches++;`);
-  addedLines.push(
-    `${'   '.repeat(
-      branchDepth + 1,
-    )}console.log("branch: " + num_branches.toString());`,
-  );
-  for (let i = 0; i < numConditionalsInBranch; i++) {
-    for (
-      let j = 0;
-      j <
-      Math.floor(
-        (Math.random() * MAX_BRANCH_LENGTH) / (2 * numConditionalsInBranch),
-      );
-      j++
-    ) {
-      branchLengthSum++;
-      const line = `${'   '.repeat(branchDepth + 1)}${createLine()}`;
-      addedLines.push(line);
-    }
-    if (branchDepth <= MAX_AST_DEPTH && Math.random() < 0.5) {
+  private addBranch(numConditionalsInBranch: number, branchDepth: number) {
+    const random = this.random;
+    let conditionalsAdded = 0;
+    this.astDepths.push(branchDepth);
+    this.stats.NUM_CONDITIONALS++;
+    this.stats.NUM_BRANCHES += 2;
+    if (branchDepth === 0) this.addedLines.push('let num_branches = 0;');
+    this.addedLines.push(
+      `${'   '.repeat(branchDepth)}if (sym${Math.floor(
+        random() * this.NUM_SYMBOLIC_VARS,
+      )} ${comparators[Math.floor(random() * comparators.length)]} ${
+        random() < 0 ? '-' : '' // no negatives.
+      }${Math.floor(random() * Number.MAX_SAFE_INTEGER)}) {`,
+    );
+    this.addBranchBody(numConditionalsInBranch, branchDepth, () => {
       conditionalsAdded++;
-      // reduce the number of conditionals.
-      addBranch(
-        Math.floor(Math.random() * MAX_CONDITIONALS_PER_BRANCH) + 1,
-        branchDepth + 1,
-      );
-    }
-    for (
-      let j = 0;
-      j <
-      Math.floor(
-        (Math.random() * MAX_BRANCH_LENGTH) / (2 * numConditionalsInBranch),
-      );
-      j++
-    ) {
-      branchLengthSum++;
-      const line = `${'   '.repeat(branchDepth + 1)}${createLine()}`;
-      addedLines.push(line);
-    }
-  }
-  conditionalsInBranch.push(conditionalsAdded);
-  conditionalsAdded = 0;
-  addedLines.push(`${'   '.repeat(branchDepth)}} else {`);
-  addedLines.push(`${'   '.repeat(branchDepth + 1)}num_branches++;`);
-  addedLines.push(
-    `${'   '.repeat(
-      branchDepth + 1,
-    )}console.log("branch: " + num_branches.toString());`,
-  );
-  for (let i = 0; i < numConditionalsInBranch; i++) {
-    for (
-      let j = 0;
-      j <
-      Math.floor(
-        (Math.random() * MAX_BRANCH_LENGTH) / (2 * numConditionalsInBranch),
-      );
-      j++
-    ) {
-      branchLengthSum++;
-      const line = `${'   '.repeat(branchDepth + 1)}${createLine()}`;
-      addedLines.push(line);
-    }
-    if (branchDepth <= MAX_AST_DEPTH && Math.random() < 0.5) {
+    });
+    this.conditionalsInBranch.push(conditionalsAdded);
+    conditionalsAdded = 0;
+    this.addedLines.push(`${'   '.repeat(branchDepth)}} else {`);
+    this.addBranchBody(numConditionalsInBranch, branchDepth, () => {
       conditionalsAdded++;
-      addBranch(
-        Math.floor(Math.random() * MAX_CONDITIONALS_PER_BRANCH) + 1,
+    });
+    this.addedLines.push(`${'   '.repeat(branchDepth)}}`);
+    this.conditionalsInBranch.push(conditionalsAdded);
+    return this.addedLines;
+  }
+
+  // Lines of one side of a conditional, with nested conditionals between runs
+  // of plain statements.
+  private addBranchBody(
+    numConditionalsInBranch: number,
+    branchDepth: number,
+    onConditional: () => void,
+  ) {
+    const random = this.random;
+    this.addedLines.push(`${'   '.repeat(branchDepth + 1)}num_branches++;`);
+    this.addedLines.push(
+      `${'   '.repeat(
         branchDepth + 1,
-      );
+      )}console.log("branch: " + num_branches.toString());`,
+    );
+    for (let i = 0; i < numConditionalsInBranch; i++) {
+      this.addPlainLines(numConditionalsInBranch, branchDepth);
+      if (branchDepth <= this.MAX_AST_DEPTH && random() < 0.5) {
+        onConditional();
+        // reduce the number of conditionals.
+        this.addBranch(
+          Math.floor(random() * this.MAX_CONDITIONALS_PER_BRANCH) + 1,
+          branchDepth + 1,
+        );
+      }
+      this.addPlainLines(numConditionalsInBranch, branchDepth);
     }
+  }
+
+  private addPlainLines(numConditionalsInBranch: number, branchDepth: number) {
     for (
       let j = 0;
       j <
       Math.floor(
-        (Math.random() * MAX_BRANCH_LENGTH) / (2 * numConditionalsInBranch),
+        (this.random() * this.MAX_BRANCH_LENGTH) /
+          (2 * numConditionalsInBranch),
       );
       j++
     ) {
-      branchLengthSum++;
-      const line = `${'   '.repeat(branchDepth + 1)}${createLine()}`;
-      addedLines.push(line);
+      this.branchLengthSum++;
+      const line = `${'   '.repeat(branchDepth + 1)}${this.createLine()}`;
+      this.addedLines.push(line);
     }
   }
-  addedLines.push(`${'   '.repeat(branchDepth)}}`);
-  conditionalsInBranch.push(conditionalsAdded);
-  return addedLines;
-}
 
-function createLine() {
-  const lines = [
-    `console.log('${generateRandomString(10)}');`,
-    `let ${generateRandomString(10)} = ${Math.floor(
-      Math.random() * Number.MAX_SAFE_INTEGER,
-    )};`,
-    `const ${generateRandomString(10)} = ${Math.floor(
-      Math.random() * Number.MAX_SAFE_INTEGER,
-    )};`,
-  ]; // need to add more operation statements here. If env interation is implemented, can add func calls like trig or other Math functions
-  let line = lines[Math.floor(Math.random() * lines.length)];
-  return line;
-}
+  private createLine() {
+    const random = this.random;
+    const lines = [
+      `console.log('${this.generateRandomString(10)}');`,
+      `let ${this.generateRandomString(10)} = ${Math.floor(
+        random() * Number.MAX_SAFE_INTEGER,
+      )};`,
+      `const ${this.generateRandomString(10)} = ${Math.floor(
+        random() * Number.MAX_SAFE_INTEGER,
+      )};`,
+    ]; // need to add more operation statements here. If env interation is implemented, can add func calls like trig or other Math functions
+    let line = lines[Math.floor(random() * lines.length)];
+    return line;
+  }
 
-function generateRandomString(length: number): string {
-  const alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ';
-  let result = '';
+  private generateRandomString(length: number): string {
+    const alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ';
+    let result = '';
 
-  for (let i = 0; i < length; i++) {
-    const randomIndex = Math.floor(Math.random() * alphabet.length);
-    result += alphabet[randomIndex];
-  }
+    for (let i = 0; i < length; i++) {
+      const randomIndex = Math.floor(this.random() * alphabet.length);
+      result += alphabet[randomIndex];
+    }
 
-  return result;
+    return result;
+  }
 }
 
 interface Stats {
@@ -269,4 +331,7 @@ interface Stats {
   AVE_AST_DEPTH: number;
   NUM_BRANCHES: number;
   NUM_CONDITIONALS: number;
+  SEED?: number;
 }
+
+main();
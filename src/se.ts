@@ -5,56 +5,101 @@ import {
   Statement,
   VariableDeclaration,
 } from 'estree';
-import fs, { existsSync } from 'fs';
-import { Context, IntNum } from 'z3-solver';
+import * as fs from 'fs';
+import { performance } from 'perf_hooks';
+import { Context, IntNum, Solver } from 'z3-solver';
+import {
+  CachedStores,
+  CacheParent,
+  CacheWriter,
+  patchCache,
+} from './cache/cache.js';
 import { BooleanConstraint } from './constraint/booleanConstraint.js';
 import { Constraint } from './constraint/constraint.js';
+import { Diff } from './createDiffAST.js';
+import { BranchCoverage, Trail } from './search/coverage.js';
+import {
+  createWorklist,
+  SearchStrategy,
+  Worklist,
+} from './search/worklist.js';
+import { IncrementalSolver } from './solver/incrementalSolver.js';
+import { SlicingSolver } from './solver/slicingSolver.js';
+import { SolverCache } from './solver/solverCache.js';
 import { SNumber, SVar } from './symbolicVars/svars.js';
-import { ASTBranch } from './utils/ast.js';
-import { appendToFile, getNextFileIndex, writeFile } from './utils/io.js';
+import {
+  ASTBranch,
+  currentLine,
+  Cursor,
+  cursorAt,
+  enterBranch,
+  nextLine,
+} from './utils/ast.js';
+import {
+  COVERAGE_FILE,
+  createResultDirectory,
+  NdjsonWriter,
+  RESULTS_FILE,
+  SOLVER_CACHE_STATS_FILE,
+} from './utils/io.js';
 import { getConstraintSymbolicVar } from './utils/seUtils.js';
+import { SpillStack } from './utils/spillStack.js';
+import { ConstraintStore, SymbolStore } from './utils/stores.js';
+import { tracer } from './utils/trace.js';
 
-interface seResult {
+export interface seResult {
   svars: { name: string; value: any }[];
   finalLine: HandleLineReturnObject;
 }
 
 export class Ctx {
-  cstore: Set<Constraint>;
-  sstore: Set<SVar>;
-  lines: (Directive | Statement | ModuleDeclaration)[];
+  cstore: ConstraintStore;
+  sstore: SymbolStore;
+  // Next statement to run, undefined once the path has run to the end.
+  pc: Cursor | undefined;
 
   constructor(
-    lines: (Directive | Statement | ModuleDeclaration)[],
-    cstore?: Set<Constraint>,
-    sstore?: Set<SVar>,
+    pc: Cursor | undefined,
+    cstore?: ConstraintStore,
+    sstore?: SymbolStore,
+  ) {
+    this.cstore = cstore ?? new ConstraintStore();
+    this.sstore = sstore ?? new SymbolStore();
+    this.pc = pc;
+  }
+
+  // A context continuing at pc that starts from this context's stores. The
+  // stores are persistent, so this does not copy them.
+  public fork(pc: Cursor | undefined) {
+    return new Ctx(pc, this.cstore.fork(), this.sstore.fork());
+  }
+
+  // A context continuing at pc from stores read from a cache, with the Z3
+  // terms of its symbolic variables and constraints rebuilt for engine.
+  public static fromCached(
+    engine: SeEngine,
+    stores: CachedStores,
+    pc: Cursor | undefined,
   ) {
-    this.cstore = cstore ?? new Set<Constraint>();
-    this.sstore = sstore ?? new Set<SVar>();
-    this.lines = lines;
+    const ctx = new Ctx(pc);
+    for (const name of stores.sstore)
+      ctx.sstore.add(new SNumber(engine, name, true));
+    // The cached store is already the result of any assignments, so the
+    // constraints are added as they are.
+    for (const cached of stores.cstore)
+      ctx.cstore.add(BooleanConstraint.fromCached(engine, ctx, cached));
+    return ctx;
   }
 
   public addConstraint(c: Constraint) {
     if (c.getType() === 'assignment') {
-      this.removeAssignmentConstraintFor(getConstraintSymbolicVar(c));
+      this.cstore.deleteFor(getConstraintSymbolicVar(c));
     }
     this.cstore.add(c);
   }
 
   public searchSstore(varName: string) {
-    for (const svar of this.sstore) {
-      if (svar.name === varName) {
-        return svar;
-      }
-    }
-    return undefined; // Object not found
-  }
-
-  private removeAssignmentConstraintFor(symbolicVarName: string) {
-    this.cstore.forEach((constraint) => {
-      if (getConstraintSymbolicVar(constraint) === symbolicVarName)
-        this.cstore.delete(constraint);
-    });
+    return this.sstore.get(varName);
   }
 }
 
@@ -83,86 +128,305 @@ class HandleLineReturnObject {
   }
 }
 
+export interface SeEngineOptions {
+  writeCache?: boolean;
+  // Cache of the previous version of the program to patch instead of writing
+  // a new one: the subtrees of the seeds that come with their cached stores
+  // replace theirs in it, so it holds the states of this version.
+  patchCache?: string;
+  // Directory results (and the cache) are written to. Defaults to the next
+  // free results/JSE<n> directory.
+  writeDir?: string;
+  // Reuse one solver along the DFS path (push/pop) and prune subtrees whose
+  // path condition is already unsatisfiable at the fork.
+  incremental?: boolean;
+  // Verdicts and models of previously solved path conditions. Paths whose
+  // condition is in it are not solved again.
+  solverCache?: SolverCache;
+  // Solve each path condition as slices of constraints that share no
+  // variables, reusing the verdicts of slices solved on other paths (default
+  // true). Not used with incremental, which keeps one solver along the path.
+  slicing?: boolean;
+  // Number of pending states kept in memory, at least 1. Beyond it, the states
+  // the search would explore last are spilled to a temporary file as their
+  // branch choices and rebuilt once the states in memory have been explored.
+  // For a DFS that is exactly when it would have got back to them, and
+  // batches are refilled newest first. Other searches refill them oldest
+  // first, so a BFS still takes spilled states shallowest first, but after
+  // the deeper states pushed while they were spilled.
+  maxPending?: number;
+  // Stop exploring once either budget is used up: seconds since exploration
+  // started, or solver checks (solver cache hits are free). The results found
+  // until then are kept, and coverage.json records how far the search got.
+  budget?: { time?: number; solverCalls?: number };
+  // Seed of the random-path search.
+  seed?: number;
+  // Receives results instead of them being written to writeDir. Each result
+  // comes with the branch choices (0 = consequent, 1 = alternate) of its path.
+  onResult?: (result: seResult, path: number[]) => void;
+}
+
+interface StackEntry {
+  ctx: Ctx;
+  lastConditional: Statement | undefined;
+  depth: number;
+  path: number[];
+  trail: Trail | undefined;
+  cacheParent?: CacheParent;
+  // The entry's own state, if it is in the cache already.
+  cacheState?: CacheParent;
+}
+
+// A state to start exploring from, given by the forks on the path to it from
+// the start of the program, and its context if known, e.g. from the cache of a
+// previous run. Otherwise the context is rebuilt by running the program along
+// the path.
+export interface Seed {
+  steps: { conditional: Statement; side: number }[];
+  ctx?: Ctx;
+  // The cached stores ctx was made from.
+  cached?: CachedStores;
+}
+
+// A spilled stack entry. Its context is rebuilt from the branch choices.
+interface SpilledEntry {
+  path: number[];
+  cacheParent?: Omit<CacheParent, 'cstore'>;
+  cacheState?: Omit<CacheParent, 'cstore'>;
+}
+
 export class SeEngine {
   public ast: (Directive | Statement | ModuleDeclaration)[];
   public Z3: Context;
-  private searchStrategy: 'dfs' | 'bfs';
-  private writeDir: string;
-  private writeCache = false;
+  private searchStrategy: SearchStrategy;
+  private seed: number;
+  public writeDir: string;
+  private cacheWriter: CacheWriter | undefined;
+  private resultWriter: NdjsonWriter | undefined;
+  private incrementalSolver: IncrementalSolver | undefined;
+  private solverCache: SolverCache | undefined;
+  private slicingSolver: SlicingSolver | undefined;
+  private onResult: SeEngineOptions['onResult'];
+  private worklist: Worklist<StackEntry>;
+  public coverage: BranchCoverage;
+  private budget: NonNullable<SeEngineOptions['budget']>;
+  private deadline = Infinity;
+  private solverCalls = 0;
+  // False if the budget ran out before every path was explored.
+  public complete = true;
+  private maxPending: number;
+  private spill: SpillStack<SpilledEntry> | undefined;
   public threadsRunning: boolean[] = [];
 
   constructor(
     ast: (Directive | Statement | ModuleDeclaration)[],
-    searchStrategy: 'dfs' | 'bfs',
+    searchStrategy: SearchStrategy,
     Z3: Context,
-    writeCache?: boolean,
+    options: SeEngineOptions = {},
   ) {
     this.ast = ast;
     this.searchStrategy = searchStrategy;
+    this.seed = options.seed ?? 1;
+    this.coverage = new BranchCoverage(ast);
+    this.worklist = createWorklist(searchStrategy, this.coverage, this.seed);
+    this.budget = options.budget ?? {};
     this.Z3 = Z3;
-    if (writeCache) this.writeCache = true;
-    // create result directory
-    if (!existsSync('results')) fs.mkdirSync('results');
-    const existingDirectories = fs.readdirSync(process.cwd() + '/results'); // List existing directories in the current directory
-    const existingIds = existingDirectories
-      .map((dir: string) => parseInt(dir.replace('JSE', ''), 10)) // Extract and parse the numeric part of directory names
-      .filter((id: number) => !isNaN(id));
-
-    const nextId = existingIds.length > 0 ? Math.max(...existingIds) + 1 : 1; // Calculate the next ID
-
-    const newDirectory = `results/JSE${nextId}`;
-    fs.mkdirSync(newDirectory); // Create the new directory
-    this.writeDir = newDirectory;
+    if (options.incremental)
+      this.incrementalSolver = new IncrementalSolver(Z3);
+    this.solverCache = options.solverCache;
+    if (!options.incremental && options.slicing !== false)
+      this.slicingSolver = new SlicingSolver(Z3, this.solverCache);
+    this.onResult = options.onResult;
+    if (options.maxPending !== undefined && !(options.maxPending >= 1))
+      throw Error(`maxPending must be at least 1, not ${options.maxPending}`);
+    this.maxPending = options.maxPending ?? Infinity;
+    if (options.maxPending !== undefined) this.spill = new SpillStack();
+    this.writeDir = this.onResult
+      ? ''
+      : createResultDirectory(options.writeDir);
+    if (!this.onResult)
+      this.resultWriter = new NdjsonWriter(
+        `${this.writeDir}/${RESULTS_FILE}`,
+      );
+    if (options.patchCache) this.cacheWriter = patchCache(options.patchCache);
+    else if (options.writeCache)
+      this.cacheWriter = new CacheWriter(`${this.writeDir + '/'}cache`);
   }
 
-  public async start(ctx: Ctx | undefined, em: any) {
+  // Explore the program, or only the subtrees of the given seeds.
+  public async start(seeds: Seed[] | undefined, em: any) {
     // console.log(JSON.stringify(this.ast)); // debug
     // start program analysis
-    await this.exploreBranchIter(ctx ?? new Ctx(this.ast));
+    const start = tracer.begin();
+    const startTime = performance.now();
+    if (this.budget.time !== undefined)
+      this.deadline = startTime + this.budget.time * 1000;
+    try {
+      await this.exploreBranchIter(
+        seeds
+          ? this.seedEntries(seeds)
+          : [
+              {
+                ctx: new Ctx(cursorAt(this.ast)),
+                lastConditional: undefined,
+                depth: 0,
+                path: [],
+                trail: undefined,
+              },
+            ],
+      );
+    } finally {
+      // Also when exploration fails, so a worker does not keep the files
+      // open, the cache keeps the states written so far and no spill file is
+      // left behind.
+      this.resultWriter?.close();
+      this.cacheWriter?.close();
+      this.spill?.close();
+    }
+    tracer.end('explore', start);
+    tracer.count('bytes.results', this.resultWriter?.bytesWritten ?? 0);
+    tracer.count('bytes.cache', this.cacheWriter?.size ?? 0);
+    if (this.solverCache && !this.onResult)
+      fs.writeFileSync(
+        `${this.writeDir}/${SOLVER_CACHE_STATS_FILE}`,
+        JSON.stringify(this.solverCache.stats),
+      );
+    if (!this.onResult)
+      fs.writeFileSync(
+        `${this.writeDir}/${COVERAGE_FILE}`,
+        JSON.stringify({
+          search: this.searchStrategy,
+          complete: this.complete,
+          ...this.coverage.summary(),
+          solverCalls: this.solverCalls,
+          time: (performance.now() - startTime) / 1000,
+        }),
+      );
+  }
+
+  // Explore the subtree reached by following the branch choices in prefix.
+  public async explore(prefix: number[]) {
+    try {
+      await this.exploreBranchIter(this.rebuild([{ path: prefix }]));
+    } finally {
+      this.spill?.close();
+    }
+  }
+
+  // Give away the shallowest pending state (the largest unexplored subtree) as
+  // the branch choices leading to it, keeping at least one state for this
+  // engine.
+  public donate() {
+    if (this.spill && this.spill.size > 0) return this.spill.shift()!.path;
+    if (this.worklist.size < 2) return undefined;
+    return this.worklist.evict(1)[0].path;
   }
 
   public finished() {
     return this.threadsRunning.length === 0;
   }
 
-  private async exploreBranchIter(ctx: Ctx) {
-    let stack: { ctx: Ctx; lastConditional: Statement | undefined }[] = [
-      { ctx, lastConditional: undefined },
-    ];
+  private seedEntries(seeds: Seed[]) {
+    const paths = seeds.map(({ steps }) => steps.map(({ side }) => side));
+    const missing = seeds
+      .map((seed, i) => i)
+      .filter((i) => seeds[i].ctx === undefined);
+    const rebuilt = this.rebuild(missing.map((i) => ({ path: paths[i] })));
+    return seeds.map(({ steps, ctx, cached }, i): StackEntry => {
+      if (!ctx) return rebuilt[missing.indexOf(i)];
+      let trail: Trail | undefined;
+      for (const { conditional, side } of steps)
+        trail = { conditional, side, next: trail };
+      return {
+        ctx,
+        lastConditional: steps[steps.length - 1]?.conditional,
+        depth: steps.length,
+        path: paths[i],
+        trail,
+        cacheState: cached && this.cacheWriter?.replaceState(ctx, cached),
+      };
+    });
+  }
+
+  // Explore from entries. A DFS takes them in order.
+  private async exploreBranchIter(entries: StackEntry[]) {
+    this.worklist = createWorklist(
+      this.searchStrategy,
+      this.coverage,
+      this.seed,
+    );
+    for (let i = entries.length - 1; i >= 0; i--)
+      this.worklist.push(entries[i]);
 
-    while (stack.length > 0) {
-      const { ctx, lastConditional } = stack.pop()!;
-      this.saveToCache(ctx, lastConditional);
+    while (this.worklist.size > 0 || (this.spill && this.spill.size > 0)) {
+      if (this.budgetSpent()) {
+        this.complete = false;
+        break;
+      }
+      if (this.worklist.size === 0) {
+        const batch =
+          this.searchStrategy === 'dfs'
+            ? this.spill!.pop()
+            : this.spill!.shiftBatch();
+        this.rebuild(batch!).forEach((e) => this.worklist.push(e));
+      }
+      const entry = this.worklist.pop()!;
+      const { ctx, lastConditional, depth, path, trail, cacheParent } = entry;
+      if (
+        this.incrementalSolver &&
+        !(await this.branchFeasible(ctx.cstore, depth))
+      ) {
+        tracer.count('paths.pruned');
+        continue;
+      }
+      const cacheState =
+        entry.cacheState ??
+        this.saveToCache(
+          ctx,
+          lastConditional,
+          path[path.length - 1],
+          cacheParent,
+        );
       let handledLine: HandleLineReturnObject = new HandleLineReturnObject(
         'Empty',
       );
       let terminalBranch = true;
-      for (const line of ctx.lines) {
-        handledLine = this.handleLine(line, ctx);
+      for (let pc = ctx.pc; pc; pc = nextLine(pc)) {
+        const line = statementAt(pc);
+        handledLine = this.handleLine(line, pc, ctx);
         if (handledLine.type === 'IfStatement') {
           const { leftConstraint, rightConstraint, astBranch } =
             handledLine.ifStatement!;
           terminalBranch = false;
+          tracer.count('forks');
           // create a new context
-          const leftCtx = new Ctx(
-            astBranch.left,
-            new Set(ctx.cstore),
-            new Set(ctx.sstore),
-          );
+          const leftCtx = ctx.fork(astBranch.left);
           // add the left constraint
           leftCtx.addConstraint(leftConstraint);
           // explore next branch
-          stack.push({ ctx: leftCtx, lastConditional: line as Statement });
+          this.worklist.push({
+            ctx: leftCtx,
+            lastConditional: line as Statement,
+            depth: depth + 1,
+            path: path.concat(0),
+            trail: { conditional: line as Statement, side: 0, next: trail },
+            cacheParent: cacheState,
+          });
 
-          const rightCtx = new Ctx(
-            astBranch.right,
-            new Set(ctx.cstore),
-            new Set(ctx.sstore),
-          );
+          const rightCtx = ctx.fork(astBranch.right);
           // add the right constraint
           rightCtx.addConstraint(rightConstraint);
           // explore the next branch
-          stack.push({ ctx: rightCtx, lastConditional: line as Statement });
+          this.worklist.push({
+            ctx: rightCtx,
+            lastConditional: line as Statement,
+            depth: depth + 1,
+            path: path.concat(1),
+            trail: { conditional: line as Statement, side: 1, next: trail },
+            cacheParent: cacheState,
+          });
+          tracer.max('stack.peak', this.worklist.size);
+          if (this.worklist.size > this.maxPending) this.spillOldest();
           terminalBranch = false;
           break;
         } else if (handledLine.type === 'ThrowStatement') {
@@ -173,16 +437,138 @@ export class SeEngine {
       if (terminalBranch) {
         await this.solveConstraintsAndOutputResults(
           handledLine,
-          new Ctx(
-            structuredClone(ctx.lines),
-            new Set(ctx.cstore),
-            new Set(ctx.sstore),
-          ),
+          ctx,
+          depth + 1,
+          path,
+          trail,
         );
       }
     }
   }
 
+  private budgetSpent() {
+    return (
+      this.solverCalls >= (this.budget.solverCalls ?? Infinity) ||
+      performance.now() >= this.deadline
+    );
+  }
+
+  // Move the pending states the search would explore last to the spill file,
+  // keeping half of the budget in memory so that the next spill is some forks
+  // away.
+  private spillOldest() {
+    const keep = Math.max(1, Math.floor(this.maxPending / 2));
+    const spilled = this.worklist.evict(this.worklist.size - keep);
+    this.spill!.push(
+      spilled.map(({ path, cacheParent, cacheState }) => ({
+        path,
+        cacheParent: cacheParent && {
+          id: cacheParent.id,
+          key: cacheParent.key,
+          sstoreSize: cacheParent.sstoreSize,
+        },
+        cacheState: cacheState && {
+          id: cacheState.id,
+          key: cacheState.key,
+          sstoreSize: cacheState.sstoreSize,
+        },
+      })),
+    );
+    tracer.count('states.spilled', spilled.length);
+  }
+
+  // Rebuild the stack entries of spilled states or seeds by running the
+  // program along their branch choices. The paths are walked together, so a
+  // prefix they share is run once. Nothing is solved on the way: a spilled
+  // state's ancestors were explored before it was spilled, and a seed's are
+  // only the way to it.
+  private rebuild(spilled: SpilledEntry[]) {
+    const start = tracer.begin();
+    const entries: StackEntry[] = new Array(spilled.length);
+    const walks: {
+      ctx: Ctx;
+      lastConditional: Statement | undefined;
+      depth: number;
+      trail: Trail | undefined;
+      // Constraint store of the state the walk forked from, as it was when
+      // that state was saved to the cache.
+      parentCstore: ConstraintStore | undefined;
+      indices: number[];
+    }[] = [
+      {
+        ctx: new Ctx(cursorAt(this.ast)),
+        lastConditional: undefined,
+        depth: 0,
+        trail: undefined,
+        parentCstore: undefined,
+        indices: spilled.map((_, i) => i),
+      },
+    ];
+    while (walks.length > 0) {
+      const { ctx, lastConditional, depth, trail, parentCstore, indices } =
+        walks.pop()!;
+      const branches: number[][] = [[], []];
+      for (const i of indices) {
+        const { path, cacheParent, cacheState } = spilled[i];
+        if (path.length > depth) {
+          branches[path[depth]].push(i);
+          continue;
+        }
+        entries[i] = {
+          ctx,
+          lastConditional,
+          depth,
+          path,
+          trail,
+          cacheParent: cacheParent && {
+            ...cacheParent,
+            cstore: parentCstore!,
+          },
+          cacheState: cacheState && {
+            ...cacheState,
+            cstore: ctx.cstore.fork(),
+          },
+        };
+      }
+      if (branches[0].length === 0 && branches[1].length === 0) continue;
+      // Running the lines changes the context, which may be an entry's.
+      const run = ctx.fork(ctx.pc);
+      for (let pc = run.pc; pc; pc = nextLine(pc)) {
+        const line = statementAt(pc);
+        const handledLine = this.handleLine(line, pc, run);
+        // As in exploreBranchIter, a throw ends the path.
+        if (handledLine.type === 'ThrowStatement') break;
+        if (handledLine.type !== 'IfStatement') continue;
+        const { leftConstraint, rightConstraint, astBranch } =
+          handledLine.ifStatement!;
+        const children = [
+          { pc: astBranch.left, constraint: leftConstraint },
+          { pc: astBranch.right, constraint: rightConstraint },
+        ];
+        children.forEach(({ pc, constraint }, branch) => {
+          if (branches[branch].length === 0) return;
+          const child = run.fork(pc);
+          child.addConstraint(constraint);
+          walks.push({
+            ctx: child,
+            lastConditional: line as Statement,
+            depth: depth + 1,
+            trail: {
+              conditional: line as Statement,
+              side: branch,
+              next: trail,
+            },
+            parentCstore: ctx.cstore,
+            indices: branches[branch],
+          });
+        });
+        break;
+      }
+    }
+    tracer.end('rebuild', start, { states: spilled.length });
+    return entries;
+  }
+
   // private async exploreBranch(ctx: Ctx, lastConditional?: Statement) {
   //   this.threadsRunning.push(true);
   //   this.saveToCache(ctx, lastConditional);
@@ -248,40 +634,9 @@ export class SeEngine {
   //   }
   // }
 
-  private exploreBranchBFS(
-    lines: (Directive | Statement | ModuleDeclaration)[],
-  ) {
-    // To implement
-    return new HandleLineReturnObject('Empty');
-
-    // let handledLines: HandleLineReturnObject[] = [];
-    // for (const line of lines) {
-    //     const handledLine = this.handleLine(line, lines as Statement[]);
-    //     if (handledLine.type == "IfStatement") handledLines.push(handledLine);
-    // }
-    // for (const handledLine of handledLines) {
-    //     const {leftConstraint, rightConstraint, astBranch} = handledLine.ifStatement!;
-    //     // save the constraints here first
-    //     let savedConstraints = new Set(this.cstore); // deep clone
-    //     // add the left constraints
-    //     this.addConstraintToCStore(leftConstraint!);
-    //     // explore next branch
-    //     this.exploreBranch(astBranch.left);
-    //     // restore the saved constraints.
-    //     this.cstore = savedConstraints;
-
-    //     // add the right constraints
-    //     this.addConstraintToCStore(rightConstraint!);
-    //     // explore the next branch
-    //     this.exploreBranch(astBranch.right);
-    //     // restore the saved constraints.
-    //     this.cstore = savedConstraints;
-    // }
-    // return this.handleLine;
-  }
-
   private handleLine(
     line: Directive | Statement | ModuleDeclaration,
+    pc: Cursor,
     ctx: Ctx,
   ): HandleLineReturnObject {
     if (line.type === 'VariableDeclaration') {
@@ -302,29 +657,18 @@ export class SeEngine {
         line.test.operator,
       );
       const rightConstraint = leftConstraint.negate();
-      // Create ASTBranch object that contains the divergent paths
-      let astBranch: ASTBranch = { left: [], right: [] };
-      const linesAfterConditionalBlock = ctx.lines.slice(
-        ctx.lines.findIndex((l) => l === line) + 1,
-      );
-      if (line.consequent.type === 'BlockStatement')
-        astBranch.left = (
-          line.consequent.body as (Directive | Statement | ModuleDeclaration)[]
-        ).concat(linesAfterConditionalBlock);
-      else
-        astBranch.left = [
-          line.consequent as Directive | Statement | ModuleDeclaration,
-        ].concat(linesAfterConditionalBlock);
-      if (line.alternate) {
-        if (line.alternate.type === 'BlockStatement')
-          astBranch.right = (
-            line.alternate.body as (Directive | Statement | ModuleDeclaration)[]
-          ).concat(linesAfterConditionalBlock);
-        else
-          astBranch.right = [
-            line.alternate as Directive | Statement | ModuleDeclaration,
-          ].concat(linesAfterConditionalBlock);
-      }
+      // Create ASTBranch object that contains the divergent paths. Both
+      // continue at the statement after the conditional.
+      const linesAfterConditionalBlock = nextLine(pc);
+      let astBranch: ASTBranch = {
+        left: enterBranch(line.consequent, linesAfterConditionalBlock),
+        right: undefined,
+      };
+      if (line.alternate)
+        astBranch.right = enterBranch(
+          line.alternate,
+          linesAfterConditionalBlock,
+        );
       return new HandleLineReturnObject('IfStatement', {
         leftConstraint,
         rightConstraint,
@@ -352,6 +696,9 @@ export class SeEngine {
       return new HandleLineReturnObject('Empty');
     } else if (line.type === 'ThrowStatement') {
       return new HandleLineReturnObject('ThrowStatement', undefined, line);
+    } else if (line.type === 'EmptyStatement') {
+      // Nothing to run, e.g. the side of a Diff for an added or removed line.
+      return new HandleLineReturnObject('Empty');
     } else {
       console.log(`${line.type} not implemented in handleLine`);
     }
@@ -401,13 +748,28 @@ export class SeEngine {
     }
   }
 
-  private async branchFeasible(cstore: Set<Constraint>) {
-    const solver = new this.Z3.Solver();
-    for (const constraint of cstore) {
-      const booleanConstraint = constraint as BooleanConstraint;
-      if (booleanConstraint) solver.add(booleanConstraint.constraint!);
+  private async branchFeasible(cstore: ConstraintStore, depth?: number) {
+    const key = this.solverCache?.key(cstore);
+    const cached = this.solverCache?.get(key, false);
+    if (cached) return cached.sat;
+    let check;
+    this.solverCalls++;
+    tracer.count('solver.calls');
+    const start = tracer.begin();
+    if (this.incrementalSolver) {
+      this.incrementalSolver.sync(cstore, depth ?? 0);
+      check = await this.incrementalSolver.check();
+    } else {
+      const solver = new this.Z3.Solver();
+      for (const constraint of cstore) {
+        const booleanConstraint = constraint as BooleanConstraint;
+        if (booleanConstraint) solver.add(booleanConstraint.constraint!);
+      }
+      check = await solver.check();
     }
-    const check = await solver.check();
+    tracer.accumulate('solver.check', start);
+    if (check !== 'unknown')
+      this.solverCache?.set(key, { sat: check === 'sat' });
 
     return check === 'sat' ? true : false;
   }
@@ -415,15 +777,69 @@ export class SeEngine {
   private async solveConstraintsAndOutputResults(
     handledLine: HandleLineReturnObject,
     ctx: Ctx,
+    depth: number,
+    path: number[],
+    trail: Trail | undefined,
   ) {
-    const solver = new this.Z3.Solver();
-    // printConstraints(ctx.cstore);
-    for (const constraint of ctx.cstore) {
-      const booleanConstraint = constraint as BooleanConstraint;
-      if (booleanConstraint && booleanConstraint.constraint)
-        solver.add(booleanConstraint.constraint!);
+    if (this.slicingSolver) {
+      tracer.count('paths');
+      const calls = this.slicingSolver.calls;
+      const { check, model } = await this.slicingSolver.solve(
+        ctx.cstore,
+        ctx.sstore,
+      );
+      this.solverCalls += this.slicingSolver.calls - calls;
+      if (check !== 'sat') return;
+      let results: { name: string; value: any }[] = [];
+      for (const svar of ctx.sstore) {
+        const value = model![svar.name];
+        if (value !== undefined) results.push({ name: svar.name, value });
+      }
+      this.outputResults(
+        { svars: results, finalLine: handledLine },
+        path,
+        trail,
+      );
+      return;
+    }
+    const key = this.solverCache?.key(ctx.cstore);
+    const cached = this.solverCache?.get(key, true);
+    if (cached) {
+      tracer.count('paths');
+      if (cached.sat) {
+        let results: { name: string; value: any }[] = [];
+        for (const svar of ctx.sstore) {
+          const value = cached.model![svar.name];
+          if (value !== undefined) results.push({ name: svar.name, value });
+        }
+        this.outputResults(
+          { svars: results, finalLine: handledLine },
+          path,
+          trail,
+        );
+      }
+      return;
+    }
+    let solver: Solver<'main'>;
+    this.solverCalls++;
+    tracer.count('solver.calls');
+    tracer.count('paths');
+    const start = tracer.begin();
+    if (this.incrementalSolver) {
+      // Only the constraints added since the last fork are asserted.
+      this.incrementalSolver.sync(ctx.cstore, depth);
+      solver = this.incrementalSolver.solver;
+    } else {
+      solver = new this.Z3.Solver();
+      // printConstraints(ctx.cstore);
+      for (const constraint of ctx.cstore) {
+        const booleanConstraint = constraint as BooleanConstraint;
+        if (booleanConstraint && booleanConstraint.constraint)
+          solver.add(booleanConstraint.constraint!);
+      }
     }
     const check = await solver.check();
+    tracer.accumulate('solver.check', start);
     if (check === 'sat') {
       // console.log('Execution branch reachable!');
       const model = solver.model();
@@ -436,28 +852,57 @@ export class SeEngine {
           continue;
         }
       }
-      this.outputResults({ svars: results, finalLine: handledLine });
-    } else {
+      this.outputResults(
+        { svars: results, finalLine: handledLine },
+        path,
+        trail,
+      );
+      const values: { [name: string]: string } = {};
+      results.forEach(({ name, value }) => (values[name] = value));
+      this.solverCache?.set(key, { sat: true, model: values });
+    } else if (check === 'unsat') {
       // console.log("execution branch unreachable.")
+      this.solverCache?.set(key, { sat: false });
     }
   }
 
-  private outputResults(result: seResult) {
-    const index = getNextFileIndex(process.cwd() + '/' + this.writeDir);
-    const jsonFileName = `${this.writeDir + '/' + index}.json`;
-    writeFile(JSON.stringify(result, null, 2), jsonFileName); // Write the result object to the JSON file
+  private outputResults(
+    result: seResult,
+    path: number[],
+    trail: Trail | undefined,
+  ) {
+    this.coverage.cover(trail);
+    if (this.onResult) {
+      this.onResult(result, path);
+      return;
+    }
+    const start = tracer.begin();
+    this.resultWriter!.write(result);
+    tracer.accumulate('results.write', start);
   }
 
-  private saveToCache(ctx: Ctx, lastConditional: Statement | undefined) {
-    if (!this.writeCache) return;
-    // There is probably a much more space efficient way to cache these constraints
-    appendToFile(
-      JSON.stringify({
-        lastConditional: lastConditional,
-        cstore: Array.from(ctx.cstore),
-        sstore: Array.from(ctx.sstore),
-      }) + '\n',
-      `${this.writeDir + '/'}cache`,
+  private saveToCache(
+    ctx: Ctx,
+    lastConditional: Statement | undefined,
+    side: number | undefined,
+    parent: CacheParent | undefined,
+  ) {
+    if (!this.cacheWriter) return undefined;
+    const start = tracer.begin();
+    const state = this.cacheWriter.saveState(
+      ctx,
+      lastConditional,
+      side,
+      parent,
     );
+    tracer.accumulate('cache.write', start);
+    return state;
   }
 }
+
+// The statement to run at pc. In the AST of a diff, a changed line is a Diff
+// holding the line before and after the change, and the line after is run.
+function statementAt(pc: Cursor) {
+  const line = currentLine(pc);
+  return (line as Diff).statements ? (line as Diff).statements[1] : line;
+}
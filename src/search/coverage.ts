@@ -0,0 +1,68 @@
+import { Directive, ModuleDeclaration, Statement } from 'estree';
+
+// The branch choices of a path, newest first. Paths share the trail of their
+// common prefix.
+export interface Trail {
+  conditional: Statement;
+  // 0 = consequent, 1 = alternate.
+  side: number;
+  next: Trail | undefined;
+}
+
+export interface CoverageSummary {
+  // Branches (sides of a conditional) on the path of at least one result.
+  covered: number;
+  total: number;
+  // Most branches on the path of one result. RandJS programs log a running
+  // count of the branches they enter, which is what Jazzer's coverage is.
+  maxBranches: number;
+  paths: number;
+}
+
+// Branch coverage of the results found so far.
+export class BranchCoverage {
+  private covered = [new Set<Statement>(), new Set<Statement>()];
+  private numCovered = 0;
+  private maxBranches = 0;
+  private paths = 0;
+  public total: number;
+
+  constructor(ast: (Directive | Statement | ModuleDeclaration)[]) {
+    this.total = 2 * countConditionals(ast);
+  }
+
+  public has(conditional: Statement, side: number) {
+    return this.covered[side].has(conditional);
+  }
+
+  // Record the path of a result.
+  public cover(trail: Trail | undefined) {
+    let branches = 0;
+    for (let t = trail; t; t = t.next) {
+      branches++;
+      if (this.covered[t.side].has(t.conditional)) continue;
+      this.covered[t.side].add(t.conditional);
+      this.numCovered++;
+    }
+    this.maxBranches = Math.max(this.maxBranches, branches);
+    this.paths++;
+  }
+
+  public summary(): CoverageSummary {
+    return {
+      covered: this.numCovered,
+      total: this.total,
+      maxBranches: this.maxBranches,
+      paths: this.paths,
+    };
+  }
+}
+
+function countConditionals(node: any): number {
+  if (Array.isArray(node))
+    return node.reduce((sum, child) => sum + countConditionals(child), 0);
+  if (!node || typeof node !== 'object') return 0;
+  let count = node.type === 'IfStatement' ? 1 : 0;
+  for (const key of Object.keys(node)) count += countConditionals(node[key]);
+  return count;
+}
@@ -0,0 +1,218 @@
+import { Statement } from 'estree';
+import { createRandom } from '../utils/random.js';
+import { BranchCoverage } from './coverage.js';
+
+// Order in which the engine explores pending states:
+//   dfs:         newest first
+//   bfs:         oldest first, i.e. shallowest first
+//   random-path: walk down the execution tree from the root, taking a random
+//                side at every fork that has pending states on both sides, so
+//                a state's chance halves with every fork above it (KLEE's
+//                random-path selection)
+//   coverage:    states entering a branch no result has covered yet first,
+//                newest first among them
+export type SearchStrategy = 'dfs' | 'bfs' | 'random-path' | 'coverage';
+
+export const SEARCH_STRATEGIES: SearchStrategy[] = [
+  'dfs',
+  'bfs',
+  'random-path',
+  'coverage',
+];
+
+// What a worklist needs to know about a pending state.
+export interface WorklistEntry {
+  // Branch choices leading to the state.
+  path: number[];
+  // Conditional of the last of them.
+  lastConditional: Statement | undefined;
+}
+
+export interface Worklist<T extends WorklistEntry> {
+  readonly size: number;
+  push(entry: T): void;
+  pop(): T | undefined;
+  // Remove the n entries that would be popped last. Pushing them back, in the
+  // order they are returned, restores them.
+  evict(n: number): T[];
+}
+
+export function createWorklist<T extends WorklistEntry>(
+  strategy: SearchStrategy,
+  coverage: BranchCoverage,
+  seed = 1,
+): Worklist<T> {
+  if (strategy === 'bfs') return new BreadthFirst<T>();
+  if (strategy === 'random-path') return new RandomPath<T>(seed);
+  if (strategy === 'coverage') return new CoverageFirst<T>(coverage);
+  return new DepthFirst<T>();
+}
+
+class DepthFirst<T extends WorklistEntry> implements Worklist<T> {
+  private stack: T[] = [];
+
+  public get size() {
+    return this.stack.length;
+  }
+
+  public push(entry: T) {
+    this.stack.push(entry);
+  }
+
+  public pop() {
+    return this.stack.pop();
+  }
+
+  public evict(n: number) {
+    return this.stack.splice(0, n);
+  }
+}
+
+class BreadthFirst<T extends WorklistEntry> implements Worklist<T> {
+  private queue: T[] = [];
+  private head = 0;
+
+  public get size() {
+    return this.queue.length - this.head;
+  }
+
+  public push(entry: T) {
+    this.queue.push(entry);
+  }
+
+  public pop() {
+    if (this.head === this.queue.length) return undefined;
+    const entry = this.queue[this.head];
+    this.head++;
+    // Drop the popped prefix once it is most of the array.
+    if (this.head > 1024 && this.head * 2 > this.queue.length) {
+      this.queue = this.queue.slice(this.head);
+      this.head = 0;
+    }
+    return entry;
+  }
+
+  public evict(n: number) {
+    return this.queue.splice(Math.max(this.head, this.queue.length - n));
+  }
+}
+
+interface TreeNode<T> {
+  entry: T | undefined;
+  children: (TreeNode<T> | undefined)[];
+  // Pending entries at or below this node.
+  pending: number;
+}
+
+class RandomPath<T extends WorklistEntry> implements Worklist<T> {
+  private root: TreeNode<T> = { entry: undefined, children: [], pending: 0 };
+  // Pending entries in the order they were pushed, for evict().
+  private order = new Map<T, true>();
+  private random: () => number;
+
+  constructor(seed: number) {
+    this.random = createRandom(seed);
+  }
+
+  public get size() {
+    return this.root.pending;
+  }
+
+  public push(entry: T) {
+    let node = this.root;
+    node.pending++;
+    for (const side of entry.path) {
+      if (!node.children[side])
+        node.children[side] = { entry: undefined, children: [], pending: 0 };
+      node = node.children[side]!;
+      node.pending++;
+    }
+    node.entry = entry;
+    this.order.set(entry, true);
+  }
+
+  public pop() {
+    if (this.root.pending === 0) return undefined;
+    // A pending entry has no pending entries below it: they are only pushed
+    // once it has been popped.
+    let node = this.root;
+    while (!node.entry) {
+      const [left, right] = node.children;
+      const side =
+        left?.pending && right?.pending
+          ? this.random() < 0.5
+            ? 0
+            : 1
+          : left?.pending
+            ? 0
+            : 1;
+      node = node.children[side]!;
+    }
+    const entry = node.entry;
+    this.remove(entry);
+    return entry;
+  }
+
+  public evict(n: number) {
+    // The most recently pushed entries are the deepest, the least likely to
+    // be picked.
+    const evicted = Array.from(this.order.keys()).slice(-n);
+    evicted.forEach((entry) => this.remove(entry));
+    return evicted;
+  }
+
+  private remove(entry: T) {
+    let node = this.root;
+    node.pending--;
+    for (const side of entry.path) {
+      const child = node.children[side]!;
+      child.pending--;
+      // Drop subtrees without pending entries.
+      if (child.pending === 0) node.children[side] = undefined;
+      node = child;
+    }
+    node.entry = undefined;
+    this.order.delete(entry);
+  }
+}
+
+class CoverageFirst<T extends WorklistEntry> implements Worklist<T> {
+  private uncovered: T[] = [];
+  private covered: T[] = [];
+  private coverage: BranchCoverage;
+
+  constructor(coverage: BranchCoverage) {
+    this.coverage = coverage;
+  }
+
+  public get size() {
+    return this.uncovered.length + this.covered.length;
+  }
+
+  public push(entry: T) {
+    if (this.isCovered(entry)) this.covered.push(entry);
+    else this.uncovered.push(entry);
+  }
+
+  public pop() {
+    // Branches get covered while their entries wait, so an entry is checked
+    // again when it comes up.
+    while (this.uncovered.length > 0) {
+      const entry = this.uncovered.pop()!;
+      if (!this.isCovered(entry)) return entry;
+      this.covered.push(entry);
+    }
+    return this.covered.pop();
+  }
+
+  public evict(n: number) {
+    const evicted = this.covered.splice(0, n);
+    return evicted.concat(this.uncovered.splice(0, n - evicted.length));
+  }
+
+  private isCovered(entry: T) {
+    const { path, lastConditional } = entry;
+    if (!lastConditional) return false;
+    return this.coverage.has(lastConditional, path[path.length - 1]);
+  }
+}
@@ -0,0 +1,55 @@
+import { Context, Solver } from 'z3-solver';
+import { Constraint } from '../constraint/constraint.js';
+import { ConstraintStore } from '../utils/stores.js';
+
+// Keeps one Z3 solver in step with the path condition of the state being
+// explored. Each solver scope holds the constraints that were new at one fork
+// depth, so sibling paths share the scopes of their common prefix and only the
+// constraints below the fork are popped and re-asserted.
+export class IncrementalSolver {
+  public solver: Solver<'main'>;
+  private scopes: Constraint[][] = [];
+
+  constructor(Z3: Context) {
+    this.solver = new Z3.Solver();
+  }
+
+  // Make the asserted constraints equal to cstore. depth is the number of forks
+  // on the path to the state; scopes at or below it belong to other branches.
+  public sync(cstore: ConstraintStore, depth: number) {
+    let keep = Math.min(depth, this.scopes.length);
+    // Assignments can remove constraints from a store, in which case the scope
+    // that asserted them (and every scope after it) is no longer valid.
+    for (let i = 0; i < keep; i++) {
+      if (!this.scopes[i].every((c) => cstore.has(c))) {
+        keep = i;
+        break;
+      }
+    }
+    this.popTo(keep);
+    const asserted = new Set<Constraint>();
+    for (const scope of this.scopes) scope.forEach((c) => asserted.add(c));
+    const added: Constraint[] = [];
+    for (const constraint of cstore) {
+      if (constraint.constraint && !asserted.has(constraint))
+        added.push(constraint);
+    }
+    this.solver.push();
+    for (const constraint of added) this.solver.add(constraint.constraint!);
+    this.scopes.push(added);
+  }
+
+  public check() {
+    return this.solver.check();
+  }
+
+  public model() {
+    return this.solver.model();
+  }
+
+  private popTo(numScopes: number) {
+    if (this.scopes.length <= numScopes) return;
+    this.solver.pop(this.scopes.length - numScopes);
+    this.scopes.length = numScopes;
+  }
+}
@@ -0,0 +1,196 @@
+import { Context, IntNum } from 'z3-solver';
+import { Constraint } from '../constraint/constraint.js';
+import { SVar } from '../symbolicVars/svars.js';
+import { tracer } from '../utils/trace.js';
+import {
+  constraintsKey,
+  SolverCache,
+  SolverCacheEntry,
+} from './solverCache.js';
+
+export interface SlicedResult {
+  check: 'sat' | 'unsat' | 'unknown';
+  // Symbolic variable name -> value, for satisfiable path conditions.
+  model?: { [name: string]: string };
+}
+
+// Solves a path condition as independent slices: sets of constraints that
+// share no symbolic variable, directly or through other constraints, so none
+// affects another's verdict or model. Verdicts and models are remembered per
+// slice and only the slices no earlier path had are sent to the solver. Paths
+// that fork at a conditional differ only in the slice of the variables it
+// compares, so that is usually the only one solved.
+export class SlicingSolver {
+  private Z3: Context;
+  private solverCache: SolverCache | undefined;
+  // Map iteration follows insertion order, which is kept as recency order.
+  private slices = new Map<string, SolverCacheEntry>();
+  private maxSlices: number;
+  // Solver checks made, for the engine's solver budget.
+  public calls = 0;
+
+  constructor(Z3: Context, solverCache?: SolverCache, maxSlices = 100000) {
+    this.Z3 = Z3;
+    this.solverCache = solverCache;
+    this.maxSlices = maxSlices;
+  }
+
+  public async solve(
+    constraints: Iterable<Constraint>,
+    svars: Iterable<SVar>,
+  ): Promise<SlicedResult> {
+    const model: { [name: string]: string } = {};
+    const unsolved: Slice[] = [];
+    for (const slice of slices(constraints)) {
+      const entry = this.lookup(slice.key);
+      if (!entry) unsolved.push(slice);
+      else if (!entry.sat) return { check: 'unsat' };
+      else Object.assign(model, entry.model);
+    }
+    if (unsolved.length === 0) return { check: 'sat', model };
+
+    // The slices not solved before are solved in one query. They share no
+    // variables, so it is satisfiable if and only if each of them is, and its
+    // model gives each slice a model of its own. If it is not, which slice is
+    // unsatisfiable is not known, so the verdict is kept for the whole query.
+    const unsolvedKey =
+      unsolved.length === 1
+        ? unsolved[0].key
+        : constraintsKey(
+            ([] as Constraint[]).concat(
+              ...unsolved.map((slice) => slice.constraints),
+            ),
+          );
+    const known = unsolved.length > 1 ? this.lookup(unsolvedKey) : undefined;
+    if (known && !known.sat) return { check: 'unsat' };
+    this.calls++;
+    tracer.count('solver.calls');
+    tracer.count('slices.solved', unsolved.length);
+    const start = tracer.begin();
+    const solver = new this.Z3.Solver();
+    let size = 0;
+    for (const slice of unsolved)
+      for (const constraint of slice.constraints) {
+        solver.add(constraint.constraint!);
+        size++;
+      }
+    const check = await solver.check();
+    tracer.accumulate('solver.check', start);
+    tracer.count('solver.constraints', size);
+    if (check === 'unknown') return { check };
+    if (check === 'unsat') {
+      this.remember(unsolvedKey, { sat: false });
+      return { check };
+    }
+    const byName = new Map<string, SVar>();
+    for (const svar of svars) byName.set(svar.name, svar);
+    const z3Model = solver.model();
+    for (const slice of unsolved) {
+      const entry: SolverCacheEntry = { sat: true, model: {} };
+      for (const name of slice.variables ?? Array.from(byName.keys())) {
+        const svar = byName.get(name);
+        if (!svar) continue;
+        try {
+          entry.model![name] = (
+            z3Model.eval(svar.z3var) as IntNum
+          ).asString();
+        } catch {
+          continue;
+        }
+      }
+      this.remember(slice.key, entry);
+      Object.assign(model, entry.model);
+    }
+    return { check, model };
+  }
+
+  // Verdict of a slice solved before, in this run or, through the solver
+  // cache, in an earlier one.
+  private lookup(key: string | undefined) {
+    if (key === undefined) return undefined;
+    const known = this.slices.get(key);
+    if (known) {
+      this.slices.delete(key);
+      this.slices.set(key, known);
+      tracer.count('slices.reused');
+      return known;
+    }
+    const cached = this.solverCache?.get(key, true);
+    if (cached) {
+      this.remember(key, cached, false);
+      tracer.count('slices.reused');
+    }
+    return cached;
+  }
+
+  private remember(
+    key: string | undefined,
+    entry: SolverCacheEntry,
+    persist = true,
+  ) {
+    if (key === undefined) return;
+    this.slices.set(key, entry);
+    if (persist) this.solverCache?.set(key, entry);
+    while (this.slices.size > this.maxSlices)
+      this.slices.delete(this.slices.keys().next().value!);
+  }
+}
+
+interface Slice {
+  constraints: Constraint[];
+  // Key of the constraints in the solver cache, see constraintsKey.
+  key: string | undefined;
+  // Names of the variables of the constraints, undefined if not known.
+  variables: string[] | undefined;
+}
+
+// Split constraints into groups connected by shared variables (union-find on
+// variable names). A constraint whose variables are not known could relate
+// any of them, so then everything is one slice.
+function slices(constraints: Iterable<Constraint>): Slice[] {
+  const all: Constraint[] = [];
+  for (const constraint of constraints)
+    if (constraint.constraint) all.push(constraint);
+  const parent = new Map<string, string>();
+  const find = (name: string): string => {
+    let root = name;
+    while (parent.get(root) !== root) root = parent.get(root)!;
+    return root;
+  };
+  const variables: string[][] = [];
+  for (const constraint of all) {
+    const names = constraint.variables();
+    if (!names)
+      return [
+        { constraints: all, key: constraintsKey(all), variables: undefined },
+      ];
+    names.forEach((name) => {
+      if (!parent.has(name)) parent.set(name, name);
+    });
+    for (let i = 1; i < names.length; i++) {
+      const a = find(names[0]);
+      const b = find(names[i]);
+      if (a !== b) parent.set(b, a);
+    }
+    variables.push(names);
+  }
+  const groups = new Map<string, Slice>();
+  all.forEach((constraint, i) => {
+    const names = variables[i];
+    // A constraint on no variable is a slice of its own.
+    const root = names.length > 0 ? find(names[0]) : `#${constraint.id}`;
+    let slice = groups.get(root);
+    if (!slice) {
+      slice = { constraints: [], key: undefined, variables: [] };
+      groups.set(root, slice);
+    }
+    slice.constraints.push(constraint);
+    const sliceVariables = slice.variables!;
+    names.forEach((name) => {
+      if (sliceVariables.indexOf(name) === -1) sliceVariables.push(name);
+    });
+  });
+  const result = Array.from(groups.values());
+  result.forEach((slice) => (slice.key = constraintsKey(slice.constraints)));
+  return result;
+}
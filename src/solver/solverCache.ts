@@ -0,0 +1,161 @@
+import { createHash } from 'crypto';
+import * as fs from 'fs';
+import * as path from 'path';
+import { Constraint } from '../constraint/constraint.js';
+import { appendToFile } from '../utils/io.js';
+
+// Solver verdicts that outlive a run. A constraint store is keyed by the hash
+// of its constraints' solver-relevant parts (see Constraint.toCached), sorted,
+// so the same path condition maps to the same entry whatever order it was
+// built in and whichever run built it. Satisfiable entries also hold the
+// values the model gave the symbolic variables.
+//
+// The file is newline-delimited JSON: a header line, then one entry per line.
+// Entries are appended as they are solved, so a run that is killed keeps what
+// it solved, and later lines for a key replace earlier ones. On close, the
+// file is rewritten with only the live entries, least recently used first, so
+// a killed run loses only the recency of its cache hits.
+export const SOLVER_CACHE_FORMAT = 'jse-solver-cache';
+export const SOLVER_CACHE_VERSION = 1;
+
+export interface SolverCacheEntry {
+  sat: boolean;
+  // Symbolic variable name -> value, for satisfiable entries that were solved
+  // for a model rather than only checked.
+  model?: { [name: string]: string };
+}
+
+// Key of a set of constraints, or undefined if one of them cannot be described
+// independently of the solver.
+export function constraintsKey(constraints: Iterable<Constraint>) {
+  const parts: string[] = [];
+  for (const constraint of constraints) {
+    if (!constraint.constraint) continue;
+    const cached = constraint.toCached();
+    if (!cached) return undefined;
+    parts.push(JSON.stringify(cached));
+  }
+  return createHash('sha1').update(parts.sort().join('\n')).digest('hex');
+}
+
+export interface SolverCacheStats {
+  hits: number;
+  misses: number;
+  evictions: number;
+  entries: number;
+}
+
+export class SolverCache {
+  private filePath: string;
+  private maxEntries: number;
+  // Map iteration follows insertion order, which is kept as recency order.
+  private entries = new Map<string, SolverCacheEntry>();
+  public stats: SolverCacheStats = {
+    hits: 0,
+    misses: 0,
+    evictions: 0,
+    entries: 0,
+  };
+
+  constructor(filePath: string, maxEntries = 100000) {
+    this.filePath = filePath;
+    this.maxEntries = maxEntries;
+    if (fs.existsSync(filePath)) this.load();
+    else {
+      fs.mkdirSync(path.dirname(filePath), { recursive: true });
+      this.writeHeader();
+    }
+    this.stats.entries = this.entries.size;
+  }
+
+  // Key of a constraint store, see constraintsKey.
+  public key(cstore: Iterable<Constraint>) {
+    return constraintsKey(cstore);
+  }
+
+  public get(key: string | undefined, needModel: boolean) {
+    const entry = key === undefined ? undefined : this.entries.get(key);
+    if (!entry || (needModel && entry.sat && !entry.model)) {
+      this.stats.misses++;
+      return undefined;
+    }
+    this.stats.hits++;
+    this.entries.delete(key!);
+    this.entries.set(key!, entry);
+    return entry;
+  }
+
+  public set(key: string | undefined, entry: SolverCacheEntry) {
+    if (key === undefined) return;
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.evict();
+    this.stats.entries = this.entries.size;
+    appendToFile(JSON.stringify({ key, ...entry }) + '\n', this.filePath);
+  }
+
+  // Rewrite the file with the live entries, dropping replaced and evicted
+  // ones.
+  public close() {
+    const tmpPath = this.filePath + '.tmp';
+    const lines = [this.header()];
+    this.entries.forEach((entry, key) =>
+      lines.push(JSON.stringify({ key, ...entry })),
+    );
+    fs.writeFileSync(tmpPath, lines.join('\n') + '\n');
+    fs.renameSync(tmpPath, this.filePath);
+  }
+
+  private evict() {
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value!);
+      this.stats.evictions++;
+    }
+  }
+
+  private header() {
+    return JSON.stringify({
+      format: SOLVER_CACHE_FORMAT,
+      version: SOLVER_CACHE_VERSION,
+    });
+  }
+
+  private writeHeader() {
+    fs.writeFileSync(this.filePath, this.header() + '\n');
+  }
+
+  private load() {
+    const contents = fs.readFileSync(this.filePath, 'utf-8');
+    // Entries appended from here on must not join a partial last line.
+    if (contents && !contents.endsWith('\n'))
+      appendToFile('\n', this.filePath);
+    const lines = contents.split(/\r?\n/);
+    let header;
+    try {
+      header = JSON.parse(lines[0]);
+    } catch {}
+    if (
+      header?.format !== SOLVER_CACHE_FORMAT ||
+      header?.version !== SOLVER_CACHE_VERSION
+    ) {
+      // A stale or foreign file only costs the verdicts it held.
+      this.writeHeader();
+      return;
+    }
+    for (const line of lines.slice(1)) {
+      if (!line) continue;
+      let record;
+      try {
+        record = JSON.parse(line);
+      } catch {
+        // The last line of a killed run may be partial.
+        continue;
+      }
+      const { key, ...entry } = record;
+      this.entries.delete(key);
+      this.entries.set(key, entry);
+    }
+    this.evict();
+    this.stats.evictions = 0;
+  }
+}
@@ -1,40 +1,113 @@
+import { createHash } from 'crypto';
 import * as esprima from 'esprima';
 import { Directive, ModuleDeclaration, Statement } from 'estree';
 
+// Position of the next statement to run: an index into a block, and where to
+// continue once the block is done. Frames are never modified, so paths that
+// fork at a conditional share the frame of the code after it instead of each
+// copying the rest of the program.
+export interface Cursor {
+  block: (Directive | Statement | ModuleDeclaration)[];
+  index: number;
+  parent: Cursor | undefined;
+}
+
 export interface ASTBranch {
-  left: (Directive | Statement | ModuleDeclaration)[];
-  right: (Directive | Statement | ModuleDeclaration)[];
+  left: Cursor | undefined;
+  right: Cursor | undefined;
+}
+
+// Cursor at block[index], or at the next statement after it if the block has
+// no statements left. undefined once the whole program has run.
+export function cursorAt(
+  block: (Directive | Statement | ModuleDeclaration)[],
+  index = 0,
+  parent?: Cursor,
+): Cursor | undefined {
+  let cursor: Cursor | undefined = { block, index, parent };
+  while (cursor && cursor.index >= cursor.block.length) cursor = cursor.parent;
+  return cursor;
+}
+
+export function currentLine(cursor: Cursor) {
+  return cursor.block[cursor.index];
+}
+
+export function nextLine(cursor: Cursor) {
+  return cursorAt(cursor.block, cursor.index + 1, cursor.parent);
+}
+
+// Cursor at the start of the consequent or alternate of a conditional, which
+// continues at after.
+export function enterBranch(statement: Statement, after: Cursor | undefined) {
+  return statement.type === 'BlockStatement'
+    ? cursorAt(
+        statement.body as (Directive | Statement | ModuleDeclaration)[],
+        0,
+        after,
+      )
+    : cursorAt([statement], 0, after);
 }
 
 export function createAST(program: string) {
   return esprima.parseModule(program);
 }
 
-export function areObjectsEqual(objA: any, objB: any): boolean {
-  // Check if the objects are of the same type
-  if (typeof objA !== typeof objB) {
-    return false;
-  }
+// Keys that only describe where or how a node was written in the source.
+const POSITION_KEYS = new Set(['loc', 'range', 'raw']);
 
-  if (typeof objA !== 'object' || objA === null || objB === null) {
-    return objA === objB;
+// JSON of an AST node with sorted keys and without position information, so
+// structurally equal nodes always produce the same string.
+export function canonicalJSON(node: any): string {
+  if (typeof node !== 'object' || node === null) {
+    return JSON.stringify(node) ?? 'null';
   }
+  if (Array.isArray(node)) {
+    return '[' + node.map((item) => canonicalJSON(item)).join(',') + ']';
+  }
+  const keys = Object.keys(node)
+    .filter((key) => !POSITION_KEYS.has(key) && node[key] !== undefined)
+    .sort();
+  return (
+    '{' +
+    keys
+      .map((key) => JSON.stringify(key) + ':' + canonicalJSON(node[key]))
+      .join(',') +
+    '}'
+  );
+}
 
-  // Get the keys of both objects
-  const keysA = Object.keys(objA);
-  const keysB = Object.keys(objB);
+export function canonicalHash(node: any) {
+  return createHash('sha1').update(canonicalJSON(node)).digest('hex');
+}
 
-  // Check if the number of keys is the same
-  if (keysA.length !== keysB.length) {
-    return false;
-  }
+const structuralHashes = new WeakMap<object, string>();
 
-  // Recursively compare the values of each property
-  for (const key of keysA) {
-    if (!areObjectsEqual(objA[key], objB[key])) {
-      return false;
+// Hash of an AST node that, like canonicalHash, is the same for structurally
+// equal nodes, but is built from the hashes of the node's children and
+// remembered for every subtree, so hashing a tree once makes comparing any two
+// of its subtrees a string comparison.
+export function structuralHash(node: any): string {
+  if (typeof node !== 'object' || node === null) {
+    return JSON.stringify(node) ?? 'null';
+  }
+  let hash = structuralHashes.get(node);
+  if (hash === undefined) {
+    const h = createHash('sha1');
+    if (Array.isArray(node)) {
+      h.update('[');
+      node.forEach((item) => h.update(structuralHash(item) + ','));
+    } else {
+      Object.keys(node)
+        .filter((key) => !POSITION_KEYS.has(key) && node[key] !== undefined)
+        .sort()
+        .forEach((key) =>
+          h.update(JSON.stringify(key) + ':' + structuralHash(node[key]) + ','),
+        );
     }
+    // Marked so it is never equal to the JSON of a primitive.
+    hash = '#' + h.digest('hex');
+    structuralHashes.set(node, hash);
   }
-
-  return true;
+  return hash;
 }
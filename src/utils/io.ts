@@ -1,14 +1,6 @@
 import { Directive, ModuleDeclaration, Statement } from 'estree';
 import * as fs from 'fs';
 import { promisify } from 'util';
-import { Constraint } from '../constraint/constraint.js';
-import { SVar } from '../symbolicVars/svars.js';
-
-export type Cache = {
-  lastConditional: Statement;
-  cstore: Constraint[];
-  sstore: SVar[];
-};
 
 export async function readFileContents(filePath: string) {
   const readFile = promisify(fs.readFile);
@@ -21,10 +13,6 @@ export async function readFileContents(filePath: string) {
   }
 }
 
-export function writeFile(data: string, filePath: string) {
-  return fs.writeFileSync(filePath, JSON.stringify(data, null, 2), 'utf-8');
-}
-
 export function removeFile(filePath: string) {
   try {
     fs.unlinkSync(filePath);
@@ -35,40 +23,115 @@ export function appendToFile(data: string, filePath: string) {
   return fs.appendFileSync(filePath, data);
 }
 
-export function getNextFileIndex(filePath: string) {
-  const files = fs.readdirSync(filePath); // List existing files
-  const existingIndexes = new Set<number>();
+// Create the directory a run writes its results to: writeDir if given,
+// otherwise the next free results/JSE<n> directory.
+export function createResultDirectory(writeDir?: string) {
+  if (writeDir) {
+    // An explicit directory is owned by this run, so stale results and
+    // caches from a previous run into it are removed.
+    prepareOutputDirectory(writeDir);
+    return writeDir;
+  }
+  if (!fs.existsSync('results')) fs.mkdirSync('results');
+  const existingDirectories = fs.readdirSync(process.cwd() + '/results'); // List existing directories in the current directory
+  const existingIds = existingDirectories
+    .map((dir: string) => parseInt(dir.replace('JSE', ''), 10)) // Extract and parse the numeric part of directory names
+    .filter((id: number) => !isNaN(id));
 
-  // Loop through the files and extract the numeric part of the filename
-  for (const file of files) {
-    const match = /^(\d+)\.json$/.exec(file);
-    if (match) {
-      const index = parseInt(match[1], 10);
-      existingIndexes.add(index);
+  let nextId = existingIds.length > 0 ? Math.max(...existingIds) + 1 : 1; // Calculate the next ID
+
+  // mkdir fails if another run claimed the id since the directory was listed,
+  // in which case the next id is tried.
+  for (; ; nextId++) {
+    const newDirectory = `results/JSE${nextId}`;
+    try {
+      fs.mkdirSync(newDirectory); // Create the new directory
+      return newDirectory;
+    } catch (e: any) {
+      if (e.code !== 'EEXIST') throw e;
     }
   }
+}
 
-  let index = 1;
-  while (existingIndexes.has(index)) {
-    index++; // Increment the index until it's not in use
+export function prepareOutputDirectory(dirPath: string) {
+  fs.mkdirSync(dirPath, { recursive: true });
+  for (const file of fs.readdirSync(dirPath)) {
+    if (
+      file === 'cache' ||
+      file === 'cache.index' ||
+      file === RESULTS_FILE ||
+      file === SOLVER_CACHE_STATS_FILE ||
+      file === TRACE_FILE ||
+      file === COVERAGE_FILE ||
+      /^\d+\.json$/.test(file)
+    )
+      removeFile(dirPath + '/' + file);
   }
-  return index;
 }
 
-export function readCache(filePath: string) {
-  const cacheFileContents = fs.readFileSync(filePath, 'utf-8');
-  const cache: Cache[] = [];
-  cacheFileContents.split(/\r?\n/).forEach((line) => {
-    if (!line) return;
-    try {
-      const cacheLine = JSON.parse(line) as Cache;
-      if (!cacheLine) throw Error(`"${line}" could not be parsed as Cache`);
-      cache.push(cacheLine);
-    } catch (e: any) {
-      throw Error('cache file could not be read: ' + e);
-    }
-  });
-  return cache;
+// Name of the file, inside a run's result directory, holding one JSON line per
+// satisfiable path.
+export const RESULTS_FILE = 'results.ndjson';
+
+// Hit/miss counters of the solver cache, when a run uses one.
+export const SOLVER_CACHE_STATS_FILE = 'solver-cache-stats.json';
+
+// Branch coverage reached by a run and whether it explored every path.
+export const COVERAGE_FILE = 'coverage.json';
+
+// Timing trace of a run, when it is traced (--trace).
+export const TRACE_FILE = 'trace.json';
+
+// Buffered, append-only writer of newline-delimited JSON records. Records are
+// written once flushBytes of them have built up, and at most flushMs after
+// they were written, so a run killed by a timeout loses at most the last
+// flushMs of its records.
+export class NdjsonWriter {
+  private fd: number;
+  private buffer: string[] = [];
+  private bufferedBytes = 0;
+  private flushBytes: number;
+  private flushMs: number;
+  private timer: ReturnType<typeof setTimeout> | undefined;
+  // When the oldest buffered record was written. Writes check it too, since
+  // the timer only fires when the engine yields to the event loop.
+  private bufferedSince = 0;
+  public bytesWritten = 0;
+
+  constructor(filePath: string, flushBytes = 1 << 16, flushMs = 100) {
+    this.fd = fs.openSync(filePath, 'a');
+    this.flushBytes = flushBytes;
+    this.flushMs = flushMs;
+  }
+
+  public write(record: any) {
+    const line = JSON.stringify(record) + '\n';
+    this.buffer.push(line);
+    this.bufferedBytes += Buffer.byteLength(line);
+    if (this.buffer.length === 1) this.bufferedSince = Date.now();
+    if (
+      this.bufferedBytes >= this.flushBytes ||
+      Date.now() - this.bufferedSince >= this.flushMs
+    )
+      this.flush();
+    else if (!this.timer)
+      this.timer = setTimeout(() => this.flush(), this.flushMs);
+  }
+
+  public flush() {
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = undefined;
+    if (this.buffer.length === 0) return;
+    fs.writeSync(this.fd, this.buffer.join(''));
+    this.bytesWritten += this.bufferedBytes;
+    this.buffer = [];
+    this.bufferedBytes = 0;
+  }
+
+  public close() {
+    this.flush();
+    fs.closeSync(this.fd);
+  }
 }
 
 export function readDiff(filePath: string) {
@@ -0,0 +1,172 @@
+// Immutable, balanced (AVL) search tree map. Updates return a new map that
+// shares every untouched node with the old one, so copies are O(1) and
+// get/set/delete are O(log n).
+interface Node<K, V> {
+  key: K;
+  value: V;
+  left: Node<K, V> | undefined;
+  right: Node<K, V> | undefined;
+  height: number;
+  size: number;
+}
+
+export class PersistentMap<K extends string | number, V> {
+  private root: Node<K, V> | undefined;
+
+  constructor(root?: Node<K, V>) {
+    this.root = root;
+  }
+
+  public get size() {
+    return size(this.root);
+  }
+
+  public get(key: K): V | undefined {
+    let node = this.root;
+    while (node) {
+      if (key === node.key) return node.value;
+      node = key < node.key ? node.left : node.right;
+    }
+    return undefined;
+  }
+
+  public has(key: K) {
+    return this.get(key) !== undefined;
+  }
+
+  public set(key: K, value: V) {
+    return new PersistentMap(insert(this.root, key, value));
+  }
+
+  public delete(key: K) {
+    if (!this.has(key)) return this;
+    return new PersistentMap(remove(this.root, key));
+  }
+
+  // In key order.
+  public *entries(): Generator<[K, V]> {
+    const stack: Node<K, V>[] = [];
+    let node = this.root;
+    while (node || stack.length > 0) {
+      while (node) {
+        stack.push(node);
+        node = node.left;
+      }
+      node = stack.pop()!;
+      yield [node.key, node.value];
+      node = node.right;
+    }
+  }
+
+  public *values(): Generator<V> {
+    for (const [, value] of this.entries()) yield value;
+  }
+}
+
+function height<K, V>(node: Node<K, V> | undefined) {
+  return node ? node.height : 0;
+}
+
+function size<K, V>(node: Node<K, V> | undefined) {
+  return node ? node.size : 0;
+}
+
+function create<K, V>(
+  key: K,
+  value: V,
+  left: Node<K, V> | undefined,
+  right: Node<K, V> | undefined,
+): Node<K, V> {
+  return {
+    key,
+    value,
+    left,
+    right,
+    height: Math.max(height(left), height(right)) + 1,
+    size: size(left) + size(right) + 1,
+  };
+}
+
+// Build a node from its parts, rotating once or twice if the two subtrees'
+// heights differ by more than one.
+function balance<K, V>(
+  key: K,
+  value: V,
+  left: Node<K, V> | undefined,
+  right: Node<K, V> | undefined,
+): Node<K, V> {
+  if (height(left) > height(right) + 1) {
+    const l = left!;
+    if (height(l.left) >= height(l.right))
+      return create(
+        l.key,
+        l.value,
+        l.left,
+        create(key, value, l.right, right),
+      );
+    const lr = l.right!;
+    return create(
+      lr.key,
+      lr.value,
+      create(l.key, l.value, l.left, lr.left),
+      create(key, value, lr.right, right),
+    );
+  }
+  if (height(right) > height(left) + 1) {
+    const r = right!;
+    if (height(r.right) >= height(r.left))
+      return create(
+        r.key,
+        r.value,
+        create(key, value, left, r.left),
+        r.right,
+      );
+    const rl = r.left!;
+    return create(
+      rl.key,
+      rl.value,
+      create(key, value, left, rl.left),
+      create(r.key, r.value, rl.right, r.right),
+    );
+  }
+  return create(key, value, left, right);
+}
+
+function insert<K extends string | number, V>(
+  node: Node<K, V> | undefined,
+  key: K,
+  value: V,
+): Node<K, V> {
+  if (!node) return create(key, value, undefined, undefined);
+  if (key === node.key) return create(key, value, node.left, node.right);
+  if (key < node.key)
+    return balance(
+      node.key,
+      node.value,
+      insert(node.left, key, value),
+      node.right,
+    );
+  return balance(
+    node.key,
+    node.value,
+    node.left,
+    insert(node.right, key, value),
+  );
+}
+
+function remove<K extends string | number, V>(
+  node: Node<K, V> | undefined,
+  key: K,
+): Node<K, V> | undefined {
+  if (!node) return undefined;
+  if (key < node.key)
+    return balance(node.key, node.value, remove(node.left, key), node.right);
+  if (key > node.key)
+    return balance(node.key, node.value, node.left, remove(node.right, key));
+  if (!node.left) return node.right;
+  if (!node.right) return node.left;
+  // Replace the node with the smallest node of its right subtree.
+  let min = node.right;
+  while (min.left) min = min.left;
+  return balance(min.key, min.value, node.left, remove(node.right, min.key));
+}
@@ -0,0 +1,15 @@
+// Seeded PRNG (mulberry32), so a RandJS corpus or a random-path search can be
+// reproduced exactly from its seed. Each draw combines two 32-bit outputs into
+// a 53-bit double, so large integers drawn from it are not limited to 2^32
+// distinct values.
+export function createRandom(seed: number) {
+  let state = seed >>> 0;
+  const next32 = () => {
+    state = (state + 0x6d2b79f5) >>> 0;
+    let t = state;
+    t = Math.imul(t ^ (t >>> 15), t | 1);
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+    return (t ^ (t >>> 14)) >>> 0;
+  };
+  return () => ((next32() >>> 5) * 67108864 + (next32() >>> 6)) / 2 ** 53;
+}
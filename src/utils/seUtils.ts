@@ -1,11 +1,14 @@
 import { Constraint } from '../constraint/constraint.js';
 
-export function printConstraints(cset: Set<Constraint>) {
+export function printConstraints(cset: Iterable<Constraint>) {
   for (const constraint of cset) {
     console.log(constraint.constraint?.sexpr());
   }
 }
 
+// Computed once per constraint, as sexpr() goes through Z3.
 export function getConstraintSymbolicVar(constraint: Constraint) {
-  return constraint.constraint?.sexpr().split(' ')[1]!;
+  if (constraint.symbolicVar === undefined)
+    constraint.symbolicVar = constraint.constraint?.sexpr().split(' ')[1] ?? '';
+  return constraint.symbolicVar;
 }
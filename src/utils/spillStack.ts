@@ -0,0 +1,113 @@
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+
+interface Batch {
+  offset: number;
+  length: number;
+  count: number;
+  // Values already taken from the front of the batch by shift().
+  taken: number;
+}
+
+// A stack of batches of JSON values kept in a temporary file, for values that
+// do not fit a memory budget. Batches come back last in, first out, or first
+// in, first out through shiftBatch(). The file is truncated as batches are
+// popped and once it is emptied, so popping keeps it to what is spilled. The
+// file is created on the first push.
+export class SpillStack<T> {
+  private dir: string | undefined;
+  private fd: number | undefined;
+  private batches: Batch[] = [];
+  // The values of the oldest batch, once shift() has read them.
+  private oldest: T[] | undefined;
+  private end = 0;
+  public size = 0;
+
+  public push(values: T[]) {
+    if (values.length === 0) return;
+    if (this.fd === undefined) {
+      this.dir = fs.mkdtempSync(path.join(os.tmpdir(), 'jse-spill-'));
+      this.fd = fs.openSync(path.join(this.dir, 'spill.ndjson'), 'w+');
+    }
+    const data = Buffer.from(
+      values.map((value) => JSON.stringify(value)).join('\n') + '\n',
+    );
+    fs.writeSync(this.fd, data, 0, data.length, this.end);
+    this.batches.push({
+      offset: this.end,
+      length: data.length,
+      count: values.length,
+      taken: 0,
+    });
+    this.end += data.length;
+    this.size += values.length;
+  }
+
+  // Remove and return the most recently pushed batch.
+  public pop() {
+    const batch = this.batches.pop();
+    if (!batch) return undefined;
+    const read =
+      this.batches.length === 0 && this.oldest ? this.oldest : this.read(batch);
+    if (this.batches.length === 0) this.oldest = undefined;
+    const values = read.slice(batch.taken);
+    this.size -= values.length;
+    this.truncate(batch.offset);
+    return values;
+  }
+
+  // Remove and return what is left of the oldest batch.
+  public shiftBatch() {
+    const batch = this.batches.shift();
+    if (!batch) return undefined;
+    const values = (this.oldest ?? this.read(batch)).slice(batch.taken);
+    this.oldest = undefined;
+    this.size -= values.length;
+    if (this.batches.length === 0) this.truncate(0);
+    return values;
+  }
+
+  // Remove and return the first value of the oldest batch.
+  public shift() {
+    const batch = this.batches[0];
+    if (!batch) return undefined;
+    if (!this.oldest) this.oldest = this.read(batch);
+    const value = this.oldest[batch.taken++];
+    this.size--;
+    if (batch.taken === batch.count) {
+      this.batches.shift();
+      this.oldest = undefined;
+      if (this.batches.length === 0) this.truncate(0);
+    }
+    return value;
+  }
+
+  // Delete the file. The stack can be pushed to again afterwards.
+  public close() {
+    if (this.fd === undefined) return;
+    fs.closeSync(this.fd);
+    fs.rmSync(this.dir!, { recursive: true, force: true });
+    this.fd = undefined;
+    this.dir = undefined;
+    this.batches = [];
+    this.oldest = undefined;
+    this.end = 0;
+    this.size = 0;
+  }
+
+  private read(batch: Batch): T[] {
+    const data = Buffer.alloc(batch.length);
+    fs.readSync(this.fd!, data, 0, batch.length, batch.offset);
+    return data
+      .toString('utf-8')
+      .split('\n')
+      .slice(0, batch.count)
+      .map((line) => JSON.parse(line));
+  }
+
+  private truncate(end: number) {
+    this.end = end;
+    fs.ftruncateSync(this.fd!, end);
+  }
+}
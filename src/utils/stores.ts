@@ -0,0 +1,106 @@
+import { Constraint } from '../constraint/constraint.js';
+import { SVar } from '../symbolicVars/svars.js';
+import { PersistentMap } from './persistentMap.js';
+import { getConstraintSymbolicVar } from './seUtils.js';
+
+// Constraint store of a Ctx. Constraints are kept by id and also grouped by the
+// symbolic variable they start with, so the constraints on a variable can be
+// dropped when it is reassigned without scanning the whole store. The maps are
+// persistent, so fork() is O(1) and forked stores share all unchanged nodes.
+export class ConstraintStore {
+  private constraints: PersistentMap<number, Constraint>;
+  private groups: PersistentMap<string, PersistentMap<number, Constraint>>;
+
+  constructor(
+    constraints = new PersistentMap<number, Constraint>(),
+    groups = new PersistentMap<string, PersistentMap<number, Constraint>>(),
+  ) {
+    this.constraints = constraints;
+    this.groups = groups;
+  }
+
+  public get size() {
+    return this.constraints.size;
+  }
+
+  public has(constraint: Constraint) {
+    return this.constraints.get(constraint.id) === constraint;
+  }
+
+  public add(constraint: Constraint) {
+    this.constraints = this.constraints.set(constraint.id, constraint);
+    const group = getConstraintSymbolicVar(constraint);
+    this.groups = this.groups.set(
+      group,
+      (this.groups.get(group) ?? new PersistentMap()).set(
+        constraint.id,
+        constraint,
+      ),
+    );
+  }
+
+  public deleteFor(symbolicVarName: string) {
+    const group = this.groups.get(symbolicVarName);
+    if (!group) return;
+    for (const [id] of group.entries())
+      this.constraints = this.constraints.delete(id);
+    this.groups = this.groups.delete(symbolicVarName);
+  }
+
+  public fork() {
+    return new ConstraintStore(this.constraints, this.groups);
+  }
+
+  public [Symbol.iterator]() {
+    return this.constraints.values();
+  }
+}
+
+interface SVarList {
+  svar: SVar;
+  next: SVarList | undefined;
+}
+
+// Symbolic store of a Ctx: symbolic variables by name, plus a shared list of
+// them in declaration order (newest first). fork() is O(1).
+export class SymbolStore {
+  private svars: PersistentMap<string, SVar>;
+  private order: SVarList | undefined;
+
+  constructor(svars = new PersistentMap<string, SVar>(), order?: SVarList) {
+    this.svars = svars;
+    this.order = order;
+  }
+
+  public get size() {
+    return this.svars.size;
+  }
+
+  public get(name: string) {
+    return this.svars.get(name);
+  }
+
+  // A redeclared name keeps its first symbolic variable, which is the one
+  // lookups have always resolved to.
+  public add(svar: SVar) {
+    if (this.svars.has(svar.name)) return;
+    this.svars = this.svars.set(svar.name, svar);
+    this.order = { svar, next: this.order };
+  }
+
+  // The n most recently declared symbolic variables, in declaration order.
+  public newest(n: number) {
+    const svars: SVar[] = [];
+    for (let l = this.order; l && svars.length < n; l = l.next)
+      svars.push(l.svar);
+    return svars.reverse();
+  }
+
+  public fork() {
+    return new SymbolStore(this.svars, this.order);
+  }
+
+  public [Symbol.iterator]() {
+    return this.newest(this.size)[Symbol.iterator]();
+  }
+}
@@ -0,0 +1,104 @@
+import * as fs from 'fs';
+import { performance } from 'perf_hooks';
+
+// Opt-in tracing of where a run spends its time. Coarse phases are recorded as
+// Chrome trace "complete" events (load the file in chrome://tracing or
+// Perfetto). Fine-grained phases, which run once per constraint, solver check
+// or write, only add to a count and total time (<name>.count, <name>.ms), so
+// tracing them costs no memory per call. Counters are written as counter
+// events, plus their totals under otherData. While the tracer is off,
+// begin/end/accumulate/count are a single flag check.
+interface TraceEvent {
+  name: string;
+  ph: 'X' | 'C';
+  ts: number;
+  dur?: number;
+  pid: number;
+  tid: number;
+  args?: { [key: string]: any };
+}
+
+export class Tracer {
+  public enabled = false;
+  private events: TraceEvent[] = [];
+  private counters: { [name: string]: number } = {};
+  private origin = 0;
+
+  // Start recording, dropping anything recorded before.
+  public start() {
+    this.enabled = true;
+    this.events = [];
+    this.counters = {};
+    this.origin = performance.now();
+  }
+
+  // Start time of a span, to be passed to end().
+  public begin() {
+    return this.enabled ? performance.now() : 0;
+  }
+
+  public end(name: string, start: number, args?: TraceEvent['args']) {
+    if (!this.enabled) return;
+    const now = performance.now();
+    this.events.push({
+      name,
+      ph: 'X',
+      ts: (start - this.origin) * 1000,
+      dur: (now - start) * 1000,
+      pid: process.pid,
+      tid: 0,
+      args,
+    });
+  }
+
+  // Add a call to the fine-grained phase name, which started at start.
+  public accumulate(name: string, start: number) {
+    if (!this.enabled) return;
+    this.count(`${name}.count`);
+    this.count(`${name}.ms`, performance.now() - start);
+  }
+
+  public count(name: string, n = 1) {
+    if (!this.enabled) return;
+    this.counters[name] = (this.counters[name] ?? 0) + n;
+  }
+
+  // Keep the largest value seen for name, e.g. a peak depth.
+  public max(name: string, value: number) {
+    if (!this.enabled) return;
+    if (value > (this.counters[name] ?? -Infinity)) this.counters[name] = value;
+  }
+
+  // Stop recording and drop what was recorded.
+  public stop() {
+    this.enabled = false;
+    this.events = [];
+  }
+
+  // Write the trace to filePath and stop recording.
+  public write(filePath: string, metadata: { [key: string]: any } = {}) {
+    if (!this.enabled) return;
+    const ts = (performance.now() - this.origin) * 1000;
+    const counterEvents: TraceEvent[] = Object.keys(this.counters).map(
+      (name) => ({
+        name,
+        ph: 'C',
+        ts,
+        pid: process.pid,
+        tid: 0,
+        args: { value: this.counters[name] },
+      }),
+    );
+    fs.writeFileSync(
+      filePath,
+      JSON.stringify({
+        traceEvents: this.events.concat(counterEvents),
+        displayTimeUnit: 'ms',
+        otherData: { ...metadata, counters: this.counters },
+      }),
+    );
+    this.stop();
+  }
+}
+
+export const tracer = new Tracer();